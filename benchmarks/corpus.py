@@ -0,0 +1,127 @@
+import os
+import random
+from typing import List, Iterator
+from langchain_core.documents import Document
+
+# Domain terms mixed into the generated text, so lexical and dense retrieval have something to find
+DOMAIN_TERMS = [
+    "oil", "change", "interval", "brake", "fluid", "DSG", "transmission", "timing", "belt", "filter",
+    "spark", "plug", "coolant", "tyre", "pressure", "inspection", "service", "warranty", "battery",
+    "30,000 km", "60,000 km", "VW 504 00", "VW 507 00", "5Q0-129-620", "04E-115-561", "G13",
+]
+VOCABULARY_SIZE = 5000
+WORDS_PER_PAGE = 250
+PAGE_BREAK = "\f"
+
+
+def _vocabulary(seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def generate_pages(index: int, pages: int, vocabulary: List[str]) -> List[str]:
+    """Deterministic pages of document `index`: vocabulary words with domain terms sprinkled in."""
+    rng = random.Random(index)
+    result = []
+    for _ in range(pages):
+        words = [rng.choice(DOMAIN_TERMS) if rng.random() < 0.08 else rng.choice(vocabulary)
+                 for _ in range(WORDS_PER_PAGE)]
+        sentences = [" ".join(words[start:start + 12]).capitalize() + "." for start in range(0, len(words), 12)]
+        result.append(" ".join(sentences))
+    return result
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], line_words: int = 12) -> None:
+    """Write a minimal PDF with one page of Helvetica text per page string."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        words = text.split()
+        lines = [" ".join(words[start:start + line_words]) for start in range(0, len(words), line_words)]
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_pdf_string(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output.encode("latin-1")))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output.encode("latin-1"))
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "wb") as f:
+        f.write(output.encode("latin-1"))
+
+
+def write_corpus(directory: str, documents: int, kind: str = "pdf", pages: int = 3) -> List[str]:
+    """
+    Write a synthetic corpus.
+    
+    Args:
+        directory (str): Directory to write the documents to
+        documents (int): Number of documents
+        kind (str): "pdf" for PDF files parsed by PyPDFLoader, "text" for text files read by `TextPageLoader`
+        pages (int): Pages per document
+        
+    Returns:
+        List[str]: Paths of the documents
+    """
+    os.makedirs(directory, exist_ok=True)
+    vocabulary = _vocabulary()
+    paths = []
+    for index in range(documents):
+        path = os.path.join(directory, f"doc-{index:05d}.{'pdf' if kind == 'pdf' else 'txt'}")
+        document_pages = generate_pages(index, pages, vocabulary)
+        if kind == "pdf":
+            write_pdf(path, document_pages)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(PAGE_BREAK.join(document_pages))
+        paths.append(path)
+    return paths
+
+
+def sample_queries(count: int, documents: int, pages: int = 3, seed: int = 1) -> List[str]:
+    """Questions made of a few words of random pages of the corpus, plus identifier lookups."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary()
+    queries = []
+    for number in range(count):
+        if number % 5 == 4:
+            queries.append(rng.choice(["VW 504 00", "5Q0-129-620", "30,000 km", "G13"]))
+            continue
+        words = rng.choice(generate_pages(rng.randrange(documents), pages, vocabulary)).split()
+        start = rng.randrange(max(len(words) - 8, 1))
+        queries.append("What does the manual say about " + " ".join(words[start:start + 6]).strip(".") + "?")
+    return queries
+
+
+# Loader of the text corpora, with the interface of PyPDFLoader: one document per page
+class TextPageLoader:
+    def __init__(self, file_path: str, mode: str = "page", **kwargs):
+        self.file_path = file_path
+        self.mode = mode
+
+    def lazy_load(self) -> Iterator[Document]:
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            pages = f.read().split(PAGE_BREAK)
+        if self.mode == "single":
+            yield Document(page_content="\n".join(pages), metadata={"source": self.file_path})
+            return
+        for number, text in enumerate(pages):
+            yield Document(page_content=text, metadata={"source": self.file_path, "page": number})
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
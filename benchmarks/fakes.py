@@ -0,0 +1,111 @@
+import re
+import hashlib
+from typing import Any, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.tokens import count_tokens
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+# Deterministic feature-hashing embeddings: every word adds a fixed pseudo-random
+# direction, so texts sharing words are similar and no network call is made
+class HashEmbeddings(Embeddings):
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            seed = int.from_bytes(digest, "little")
+            vector[seed % self.dimensions] += 1.0 if seed & (1 << 63) else -1.0
+            vector[(seed >> 16) % self.dimensions] += 0.5
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# Chat model answering instantly with canned replies, picked from the system prompt of each call.
+# Replies carry usage metadata counted with the local tokenizer, like the OpenAI responses.
+class CannedChatModel(BaseChatModel):
+    answer: str = (
+        "According to the context, the maintenance service includes an oil change, a brake inspection "
+        "and a check of the DSG transmission, as described in the documents."
+    )
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        instructions = str(messages[0].content).lower() if messages else ""
+        if "confidence score" in instructions:
+            return "85 - The question is clearly about topics covered in the documents"
+        if "running summary" in instructions:
+            return "The user asked about maintenance intervals and the assistant answered from the documents."
+        if "summarize" in instructions:
+            text = str(messages[-1].content)
+            return f"Synthetic summary of a {len(text.split())}-word text about vehicle maintenance."
+        return self.answer
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], reply: str) -> dict:
+        input_tokens = sum(count_tokens(str(message.content)) for message in messages)
+        output_tokens = count_tokens(reply)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        reply = self._reply(messages)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages)
+        for token in re.findall(r"\S+\s*", reply):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, reply)))
+
+
+_chat_model = CannedChatModel()
+
+
+def fake_chat_model(model_name: str, **params: Any) -> CannedChatModel:
+    """Stand-in for `get_chat_model`."""
+    return _chat_model
+
+
+def fake_embeddings(model_name: str, **params: Any) -> HashEmbeddings:
+    """Stand-in for `get_embeddings`."""
+    return HashEmbeddings()
+
+
+def install(loader: Any = None) -> None:
+    """
+    Replace the OpenAI clients used by VectorDB, ChatBot and utils with the offline stand-ins.
+    
+    Args:
+        loader: Document loader class to use instead of PyPDFLoader (e.g. for text corpora), None keeps PyPDFLoader
+    """
+    import src.db
+    import src.chatbot
+    import src.utils
+    import src.ingest
+    src.db.get_embeddings = fake_embeddings
+    src.chatbot.get_chat_model = fake_chat_model
+    src.utils.get_chat_model = fake_chat_model
+    if loader is not None:
+        src.db.PyPDFLoader = loader
+        src.ingest.PyPDFLoader = loader
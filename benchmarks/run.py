@@ -0,0 +1,218 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from functools import partial
+from datetime import datetime, timezone
+import numpy as np
+
+# Runs fully offline: the OpenAI clients are replaced before anything calls them
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from benchmarks import fakes
+from benchmarks.corpus import write_corpus, sample_queries, TextPageLoader
+import src.core
+from src.db import get_vector_db
+from src.config import VECTOR_BACKEND
+from src.observability import configure_logging
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+QUERIES = 50  # retrieve_context / process_message calls per corpus
+REPEATS = 20  # list_documents calls per corpus
+DELETES = 10  # delete_document calls per corpus (at most the corpus size)
+
+
+def summarize(seconds):
+    """Latency statistics in milliseconds."""
+    values = np.asarray(seconds) * 1000
+    if not len(values):
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def mean_stages(timings_list):
+    """Mean milliseconds of each stage over several runs."""
+    stages = {}
+    for timings in timings_list:
+        for stage, seconds in timings.items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+    return {stage: float(np.mean(values)) for stage, values in stages.items()}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "src"], cwd=project_root, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def bench_retrieval(db, queries):
+    """retrieve_context with cold caches (every query computed) and warm ones (the same queries again)."""
+    cold, cold_timings = [], []
+    for query in queries:
+        db._retrieval_cache.clear()
+        db._chunk_index_cache.clear()
+        timings = {}
+        seconds, _ = timed(db.retrieve_context, query, timings=timings)
+        cold.append(seconds)
+        cold_timings.append(timings)
+    for query in queries:
+        db.retrieve_context(query)
+    warm = [timed(db.retrieve_context, query)[0] for query in queries]
+    return {"cold": {**summarize(cold), "stages_ms": mean_stages(cold_timings)}, "warm": summarize(warm)}
+
+
+def bench_nearby_chunks(db, queries, window=2):
+    """_search_nearby_chunks on retrieved hits, fetching the document's chunks (cold) or from the chunk cache (warm)."""
+    hits = []
+    for query in queries:
+        _, sources = db.retrieve_context(query)
+        hits.extend({"metadata": source["metadata"]} for source in sources)
+    if not hits:
+        return {}
+    cold = []
+    for hit in hits:
+        db._chunk_index_cache.clear()
+        cold.append(timed(db._search_nearby_chunks, hit, window)[0])
+    warm = [timed(db._search_nearby_chunks, hit, window)[0] for hit in hits]
+    return {"cold": summarize(cold), "warm": summarize(warm)}
+
+
+def bench_process_message(chat, queries):
+    """End-to-end process_message with the canned chat model: the pipeline's own overhead."""
+    answer_cache = chat.answer_cache
+    chat.answer_cache = None
+    latencies, timings_list, tokens = [], [], []
+    for query in queries:
+        seconds, _ = timed(chat.process_message, query, history=[])
+        latencies.append(seconds)
+        timings_list.append(dict(chat.last_timings))
+        tokens.append(chat.last_usage.get("total_tokens", 0))
+    result = {"uncached": {**summarize(latencies), "stages_ms": mean_stages(timings_list), "mean_llm_tokens": float(np.mean(tokens))}}
+
+    # The same queries twice through the answer cache: the second pass is served from it
+    chat.answer_cache = answer_cache
+    if answer_cache is not None:
+        for query in queries:
+            chat.process_message(query, history=[])
+        result["answer_cache_hit"] = summarize([timed(chat.process_message, query, history=[])[0] for query in queries])
+    return result
+
+
+def bench_corpus(kind, documents, args):
+    """Ingest a synthetic corpus into a fresh store and measure every operation on it."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{kind}-{documents}-")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # db/ and cache/ are relative to the working directory
+    try:
+        paths = write_corpus("corpus", documents, kind=kind, pages=args.pages)
+        fakes.install(loader=TextPageLoader if kind == "text" else None)
+        # An absolute path per corpus: Chroma shares one client per path within a process
+        src.core.get_vector_db = partial(get_vector_db, persist_directory=os.path.join(workdir, "db"), backend=args.backend)
+        chat = src.core.GalteaChat(documents_dir="empty")
+        db = chat.vector_db
+
+        report = db.ingest_documents(paths)
+        result = {
+            "kind": kind,
+            "documents": documents,
+            "ingest": {
+                "seconds": report["seconds"],
+                "documents_per_s": report["documents_per_s"],
+                "chunks_per_s": report["chunks_per_s"],
+                "chunks": report["chunks"],
+                "stages": report["stages"],
+                "usage": report["usage"],
+            },
+        }
+
+        queries = sample_queries(args.queries, documents, pages=args.pages)
+        result["retrieve_context"] = bench_retrieval(db, queries)
+        result["search_nearby_chunks"] = bench_nearby_chunks(db, queries[:10])
+        result["list_documents"] = summarize([timed(db.list_documents)[0] for _ in range(REPEATS)])
+        result["process_message"] = bench_process_message(chat, queries)
+
+        filenames = db.list_documents()[:min(DELETES, documents)]
+        result["delete_document"] = summarize([timed(db.delete_document, filename)[0] for filename in filenames])
+        chat.router.flush_cache()  # Save the pending routing decisions before the store is removed
+        return result
+    finally:
+        os.chdir(previous_dir)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_summary(result):
+    retrieval = result["retrieve_context"]
+    print(
+        f"{result['kind']:<5} {result['documents']:>6} docs | "
+        f"ingest {result['ingest']['documents_per_s']:8.1f} docs/s {result['ingest']['chunks_per_s']:9.1f} chunks/s | "
+        f"retrieve p50 {retrieval['cold']['p50_ms']:7.2f} ms p99 {retrieval['cold']['p99_ms']:7.2f} ms "
+        f"(warm p50 {retrieval['warm']['p50_ms']:6.3f} ms) | "
+        f"process_message p50 {result['process_message']['uncached']['p50_ms']:7.2f} ms | "
+        f"delete p50 {result['delete_document']['p50_ms']:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks with fake embeddings and a canned chat model.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes, in documents")
+    parser.add_argument("--kinds", nargs="+", choices=["pdf", "text"], default=["pdf", "text"], help="Corpus formats")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per document")
+    parser.add_argument("--queries", type=int, default=QUERIES, help="Queries per corpus")
+    parser.add_argument("--backend", default=VECTOR_BACKEND, help="Vector backend (chroma or numpy)")
+    parser.add_argument("--output", help="JSON results file, defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary corpora and stores")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's output")
+    args = parser.parse_args()
+
+    configure_logging("INFO" if args.verbose else "ERROR")
+    commit, dirty = git_commit()
+    results = []
+    for kind in args.kinds:
+        for documents in args.sizes:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = bench_corpus(kind, documents, args)
+            results.append(result)
+            print_summary(result)
+
+    output_file = args.output or os.path.join(project_root, "benchmarks", "results", f"{commit[:12]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump({
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "settings": {"backend": args.backend, "pages": args.pages, "queries": args.queries},
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults saved as '{os.path.relpath(output_file, project_root)}'")
+
+
+if __name__ == "__main__":
+    main()
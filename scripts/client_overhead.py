@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from langchain_openai import ChatOpenAI
+from langchain.schema import HumanMessage
+from src.config import OPENAI_API_KEY, RAG_DECISION_MODEL_NAME
+from src.clients import get_chat_model
+
+def time_calls(fn, n):
+    """Return the latency of each of n calls to fn, in milliseconds."""
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(label, latencies):
+    print(f"{label:<40} mean={statistics.mean(latencies):8.2f} ms  median={statistics.median(latencies):8.2f} ms")
+
+def main(live=False, n=20):
+    print("\n=== Client construction overhead ===")
+    report("New ChatOpenAI per call", time_calls(
+        lambda: ChatOpenAI(model_name=RAG_DECISION_MODEL_NAME, api_key=OPENAI_API_KEY), n
+    ))
+    report("Shared client (get_chat_model)", time_calls(
+        lambda: get_chat_model(RAG_DECISION_MODEL_NAME), n
+    ))
+
+    if not live:
+        print("\nRun with --live to also measure real API round trips (uses the OpenAI API).")
+        return
+
+    print("\n=== API round trip (max_tokens=1) ===")
+    messages = [HumanMessage(content="Reply with 1")]
+    report("New ChatOpenAI per call", time_calls(
+        lambda: ChatOpenAI(model_name=RAG_DECISION_MODEL_NAME, api_key=OPENAI_API_KEY, max_tokens=1).invoke(messages), n
+    ))
+    report("Shared client (get_chat_model)", time_calls(
+        lambda: get_chat_model(RAG_DECISION_MODEL_NAME, max_tokens=1).invoke(messages), n
+    ))
+
+if __name__ == "__main__":
+    main(live="--live" in sys.argv)
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.insert(0, project_root)
+
+from src.db import VectorDB
+from src.backends import NumpyBackend
+
+# Search index settings compared with the full-precision search: (dimensions, quantization, rescore factor)
+CONFIGURATIONS = [
+    (None, "none", 0),
+    (1024, "none", 0),
+    (512, "none", 0),
+    (256, "none", 0),
+    (1024, "none", 4),
+    (512, "none", 4),
+    (256, "none", 4),
+    (None, "int8", 0),
+    (1024, "int8", 0),
+    (512, "int8", 4),
+    (256, "int8", 4),
+    (None, "binary", 0),
+    (None, "binary", 4),
+    (1024, "binary", 10),
+]
+K_VALUES = [3, 10]
+REPEATS = 20  # Timed searches per question
+
+# VW questions of test_1.py, plus the questions of the routing ground truths that should use RAG
+TEST_QUESTIONS = [
+    "What does the 30,000 km maintenance service include?",
+    "How often should the DSG transmission oil be changed?",
+]
+
+def load_questions():
+    ground_truths = pd.read_csv(os.path.join(project_root, "scripts", "rag_ground_truths.csv"))
+    rag_questions = ground_truths[ground_truths["Decision"] == "Use RAG"]["Question"].tolist()
+    return list(dict.fromkeys(TEST_QUESTIONS + rag_questions))
+
+def chunk_key(doc):
+    return (doc.metadata.get("source"), doc.metadata.get("chunk_idx"))
+
+def time_searches(backend, query_embeddings, k):
+    """Return the hits of each query and the per-query latencies in milliseconds."""
+    hits, latencies = [], []
+    for query_embedding in query_embeddings:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            results = backend.search(query_embedding, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        hits.append([chunk_key(doc) for doc, _ in results])
+    return hits, latencies
+
+def index_bytes(directory, tag):
+    """Bytes of the search index and of the full vectors of a NumPy backend directory."""
+    index_size, full_size = 0, 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".npy") and name.count(".") == 1:
+            full_size += os.path.getsize(path)
+        elif f".{tag}." in name:
+            index_size += os.path.getsize(path)
+    return index_size or full_size, full_size
+
+def main():
+    db = VectorDB()
+    chunks = db.vector_store.get(include=["documents", "metadatas", "embeddings"])
+    if not chunks["ids"]:
+        print("The vector store is empty, upload the VW documents first.")
+        return
+    n_chunks = len(chunks["ids"])
+
+    questions = load_questions()
+    print(f"Embedding {len(questions)} questions...")
+    query_embeddings = [np.asarray(db.embed_query(question), dtype=np.float32) for question in questions]
+
+    # Copy the chunks into a NumPy backend that keeps the full vectors, so every index can be built from it
+    directory = tempfile.mkdtemp(prefix="embedding_recall_")
+    try:
+        full_backend = NumpyBackend(directory)
+        full_backend.add(chunks["ids"], chunks["documents"], chunks["embeddings"], chunks["metadatas"])
+        full_dimensions = len(chunks["embeddings"][0])
+
+        rows = []
+        for k in K_VALUES:
+            # Reference: the configured full-precision store
+            truth, latencies = time_searches(db.vector_store, query_embeddings, k)
+            rows.append({
+                "k": k, "index": f"{type(db.vector_store).__name__} (full precision)", "dimensions": full_dimensions,
+                "quantization": "none", "rescore_factor": 0, "recall": 1.0,
+                "mean_ms": np.mean(latencies), "p95_ms": np.percentile(latencies, 95),
+                "index_bytes_per_chunk": full_dimensions * 4,
+            })
+
+            for dimensions, quantization, rescore_factor in CONFIGURATIONS:
+                backend = NumpyBackend(directory, dimensions=dimensions, quantization=quantization, rescore_factor=rescore_factor)
+                hits, latencies = time_searches(backend, query_embeddings, k)
+                recall = np.mean([len(set(found) & set(expected)) / len(expected) for found, expected in zip(hits, truth) if expected])
+                size, _ = index_bytes(directory, backend.index_tag)
+                rows.append({
+                    "k": k, "index": "NumpyBackend", "dimensions": min(dimensions or full_dimensions, full_dimensions),
+                    "quantization": quantization, "rescore_factor": rescore_factor, "recall": recall,
+                    "mean_ms": np.mean(latencies), "p95_ms": np.percentile(latencies, 95),
+                    "index_bytes_per_chunk": size / n_chunks,
+                })
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = pd.DataFrame(rows)
+    report.to_csv(os.path.join(project_root, "scripts", "embedding_recall_report.csv"), index=False)
+
+    print(f"\n=== Recall vs latency ({n_chunks} chunks, {len(questions)} questions) ===")
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    print("\nRecall is measured against the full-precision top-k. Rescoring reads the full vectors of")
+    print("k * rescore_factor candidates, which stay on disk (INDEX_KEEP_FULL_VECTORS).")
+    print("\nReport saved as 'scripts/embedding_recall_report.csv'")
+
+if __name__ == "__main__":
+    main()
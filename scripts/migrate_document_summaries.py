@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from src.db import VectorDB
+
+# Hits returned by retrieve_context (its default k)
+K = 3
+# Timed neighbor fetches, averaged
+FETCH_REPEATS = 10
+
+def summary_storage(db_dir):
+    """Return (chunks carrying a summary copy, bytes of the copies) stored in Chroma's SQLite."""
+    connection = sqlite3.connect(f"file:{os.path.join(db_dir, 'chroma.sqlite3')}?mode=ro", uri=True)
+    try:
+        count, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(string_value AS BLOB))), 0) "
+            "FROM embedding_metadata WHERE key = 'document_summary'"
+        ).fetchone()
+        return count, size
+    finally:
+        connection.close()
+
+def vacuum(db_dir):
+    """Reclaim the space of deleted metadata rows."""
+    connection = sqlite3.connect(os.path.join(db_dir, "chroma.sqlite3"))
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+def payloads(db):
+    """
+    Measure what a query reads and returns:
+    - the source dicts of K hits, as returned by retrieve_context
+    - the chunks of one document, as fetched for neighbor expansion
+    """
+    sample = db.vector_store.get(include=["documents", "metadatas"], limit=K)
+    sources = [
+        {"source": os.path.basename(metadata.get("source", "Unknown")), "content": text[:500] + "...", "metadata": metadata}
+        for text, metadata in zip(sample["documents"], sample["metadatas"])
+    ]
+
+    source = sample["metadatas"][0].get("source")
+    start = time.perf_counter()
+    for _ in range(FETCH_REPEATS):
+        document = db.vector_store.get(sources=[source], include=["documents", "metadatas"])
+    elapsed = (time.perf_counter() - start) / FETCH_REPEATS
+    return {
+        "sources_bytes": len(json.dumps(sources).encode("utf-8")),
+        "neighbor_fetch_bytes": len(json.dumps(document["metadatas"]).encode("utf-8"))
+            + sum(len(text.encode("utf-8")) for text in document["documents"]),
+        "neighbor_fetch_ms": elapsed * 1000,
+        "neighbor_fetch_chunks": len(document["ids"]),
+    }
+
+def report(label, before, after, digits=0):
+    saved = before - after
+    percent = 100 * saved / before if before else 0.0
+    print(f"{label:<40} before={before:>12,.{digits}f}  after={after:>12,.{digits}f}  saved={saved:>12,.{digits}f} ({percent:.1f}%)")
+
+def main(db_dir="db"):
+    db_file = os.path.join(db_dir, "chroma.sqlite3")
+    if not os.path.exists(db_file):
+        print(f"No vector store found in {db_dir}")
+        return
+
+    db = VectorDB(persist_directory=db_dir)
+    if not db.count_chunks():
+        print("The vector store is empty, nothing to migrate.")
+        return
+
+    copies_before, summary_bytes_before = summary_storage(db_dir)
+    file_before = os.path.getsize(db_file)
+    payload_before = payloads(db)
+
+    print(f"Migrating {copies_before} chunks carrying a document summary copy...")
+    result = db.migrate_document_summaries()
+    print(f"Migrated {result['chunks']} chunks")
+
+    try:
+        vacuum(db_dir)
+    except sqlite3.Error as e:
+        print(f"Could not vacuum {db_file}, the file size is measured before reclaiming space: {str(e)}")
+
+    copies_after, summary_bytes_after = summary_storage(db_dir)
+    file_after = os.path.getsize(db_file)
+    payload_after = payloads(db)
+
+    print("\n=== Storage ===")
+    report("Summary copies (rows)", copies_before, copies_after)
+    report("Summary copies (bytes)", summary_bytes_before, summary_bytes_after)
+    report("chroma.sqlite3 size (bytes)", file_before, file_after)
+
+    print(f"\n=== Per-query payload (k={K}) ===")
+    report("retrieve_context sources (bytes)", payload_before["sources_bytes"], payload_after["sources_bytes"])
+    report(f"Neighbor fetch, {payload_after['neighbor_fetch_chunks']} chunks (bytes)",
+           payload_before["neighbor_fetch_bytes"], payload_after["neighbor_fetch_bytes"])
+    report("Neighbor fetch (ms)", payload_before["neighbor_fetch_ms"], payload_after["neighbor_fetch_ms"], digits=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "db")
@@ -7,6 +7,10 @@ sys.path.insert(0, project_root)
 
 from src.core import GalteaChat
 
+def format_timings(timings):
+    """Format per-stage timings in milliseconds."""
+    return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items())
+
 def main():
     # Initialize the chat system
     chat = GalteaChat()
@@ -21,18 +25,29 @@ def main():
     response, sources = chat.process_message("What does the 30,000 km maintenance service include?")
     print(f"Response: {response}")
     print(f"Sources: {sources}")
+    print(f"Timings: {format_timings(chat.last_timings)}")
+    print(f"Prompt tokens: {chat.last_prompt_tokens}")
+    print(f"LLM tokens: {chat.last_usage['total_tokens']} (${chat.last_usage['cost_usd']:.4f})")
 
     # Test another relevant query
     print("\nTesting DSG transmission query:")
     response, sources = chat.process_message("How often should the DSG transmission oil be changed?")
     print(f"Response: {response}")
     print(f"Sources: {sources}")
+    print(f"Timings: {format_timings(chat.last_timings)}")
+    print(f"Prompt tokens: {chat.last_prompt_tokens}")
+    print(f"LLM tokens: {chat.last_usage['total_tokens']} (${chat.last_usage['cost_usd']:.4f})")
 
     # Optional general query to ensure separation
     print("\nTesting general query (should not be related to VW):")
     response, sources = chat.process_message("What vaccines are needed to travel to Africa?")
     print(f"Response: {response}")
     print(f"Sources: {sources}") # should be empty
+    print(f"Timings: {format_timings(chat.last_timings)}")
+    print(f"Prompt tokens: {chat.last_prompt_tokens}")
+    print(f"LLM tokens: {chat.last_usage['total_tokens']} (${chat.last_usage['cost_usd']:.4f})")
+
+    print(f"\nSession usage: {chat.usage_stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
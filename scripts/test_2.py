@@ -3,12 +3,14 @@ import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import time
+from collections import Counter
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 
 from src.core import GalteaChat
-from src.utils import should_use_rag
+from src.utils import should_use_rag, rag_decision
 
 def calculate_metrics(ground_truths, predictions, confidence_scores):
     """Calculate accuracy metrics."""
@@ -129,5 +131,62 @@ def test_rag_worthy():
     print("\nPerformance plot has been saved as 'scripts/rag_performance_metrics.png'")
     print("\n=== End of RAG-Worthy Tests ===")
 
+def test_router_paths():
+    """Compare the embedding router against the LLM-only decision on the ground-truth questions."""
+    chat = GalteaChat(documents_dir="docs")
+    summaries = chat.vector_db.get_all_summaries()
+    chat.router.clear_cache()  # Measure cold decisions
+    
+    ground_truths_df = pd.read_csv('scripts/rag_ground_truths.csv')
+    
+    print("\n=== Testing RAG Router Paths ===")
+    print(f"Thresholds: skip <= {chat.router.skip_threshold}, use >= {chat.router.use_threshold}\n")
+    
+    rows = []
+    for question, truth in zip(ground_truths_df['Question'], ground_truths_df['Decision']):
+        # Baseline: LLM-only decision
+        start = time.perf_counter()
+        llm_use_rag, _ = rag_decision(question, summaries)
+        llm_latency = time.perf_counter() - start
+        
+        # Router: the query embedding is shared with retrieval, so it is timed separately
+        start = time.perf_counter()
+        query_embedding = chat.vector_db.embed_query(question)
+        embedding_latency = time.perf_counter() - start
+        decision = chat.router.route(question, summaries, query_embedding=query_embedding)
+        
+        rows.append({
+            'Question': question,
+            'Decision': truth,
+            'Router Decision': 'Use RAG' if decision.use_rag else 'Skip RAG',
+            'LLM Decision': 'Use RAG' if llm_use_rag else 'Skip RAG',
+            'Path': decision.path,
+            'Similarity': decision.similarity,
+            'Router Latency (ms)': decision.elapsed * 1000,
+            'Embedding Latency (ms)': embedding_latency * 1000,
+            'LLM Latency (ms)': llm_latency * 1000,
+        })
+        print(f"{decision.path:>9} | sim={decision.similarity if decision.similarity is not None else float('nan'):.3f} "
+              f"| {rows[-1]['Router Decision']} (truth: {truth}) | {question}")
+    
+    report = pd.DataFrame(rows)
+    report.to_csv('scripts/rag_router_report.csv', index=False)
+    
+    # Path usage and latency saved
+    path_counts = Counter(report['Path'])
+    print("\nPath usage:")
+    for path, count in path_counts.items():
+        print(f"  {path}: {count} ({count / len(report) * 100:.0f}%)")
+    
+    llm_total = report['LLM Latency (ms)'].sum()
+    router_total = report['Router Latency (ms)'].sum()
+    print(f"\nLLM-only routing time: {llm_total:.0f} ms")
+    print(f"Router routing time: {router_total:.0f} ms (saved {llm_total - router_total:.0f} ms)")
+    print(f"Router accuracy: {(report['Router Decision'] == report['Decision']).mean() * 100:.0f}%")
+    print(f"LLM-only accuracy: {(report['LLM Decision'] == report['Decision']).mean() * 100:.0f}%")
+    print("\nPer-question report saved as 'scripts/rag_router_report.csv'")
+    print("\n=== End of RAG Router Tests ===")
+
 if __name__ == "__main__":
-    test_rag_worthy() 
\ No newline at end of file
+    test_rag_worthy()
+    test_router_paths() 
\ No newline at end of file
@@ -0,0 +1,148 @@
+import weakref
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Dict, Tuple, Optional, Any
+import numpy as np
+from .config import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD
+
+
+# Answers keyed by query embedding: a paraphrase of a cached question gets the cached answer.
+# Entries belong to one version of the document collection and are dropped when it changes.
+class AnswerCache:
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size (int): Maximum number of answers kept before evicting the least recently used one
+            threshold (float): Minimum cosine similarity between two queries to reuse an answer
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self._lock = Lock()
+        self._entries = OrderedDict()  # row -> (answer, sources, seconds it took), least recently used first
+        self._vectors: Optional[np.ndarray] = None  # Normalized query embeddings, one row per entry
+        self._free: List[int] = list(range(max_size))
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def _check_version(self, version: int) -> bool:
+        """Drop every entry if the collection changed. Returns False for a version older than the cached one."""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self._entries.clear()
+            self._free = list(range(self.max_size))
+            self._version = version
+        return True
+
+    def get(self, query_embedding: List[float], version: int) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Look up the answer of the most similar cached query.
+
+        Args:
+            query_embedding (List[float]): Embedding of the query
+            version (int): Current version of the document collection
+
+        Returns:
+            Optional[Tuple[str, List[Dict[str, Any]]]]: (answer, sources), or None on a miss
+        """
+        query = _normalize(query_embedding)
+        with self._lock:
+            if not self._check_version(version) or not self._entries or self._vectors.shape[1] != len(query):
+                self.misses += 1
+                return None
+            rows = np.fromiter(self._entries, dtype=np.int64, count=len(self._entries))
+            similarities = self._vectors[rows] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            row = int(rows[best])
+            self._entries.move_to_end(row)
+            answer, sources, seconds = self._entries[row]
+            self.hits += 1
+            self.seconds_saved += seconds
+            return answer, sources
+
+    def put(self, query_embedding: List[float], version: int, answer: str,
+            sources: List[Dict[str, Any]], seconds: float) -> None:
+        """
+        Store an answer, evicting the least recently used one if the cache is full.
+
+        Args:
+            query_embedding (List[float]): Embedding of the query
+            version (int): Version of the document collection the answer was generated from
+            answer (str): The answer
+            sources (List[Dict[str, Any]]): Sources of the answer
+            seconds (float): Seconds it took to answer, counted as saved on every hit
+        """
+        if self.max_size <= 0:
+            return
+        query = _normalize(query_embedding)
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                self._vectors = np.zeros((self.max_size, len(query)), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_size))
+            if self._free:
+                row = self._free.pop()
+            else:
+                row, _ = self._entries.popitem(last=False)
+            self._vectors[row] = query
+            self._entries[row] = (answer, sources, seconds)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._free = list(range(self.max_size))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries, hits, misses, hit rate and seconds saved by hits."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# One answer cache per VectorDB, shared by every GalteaChat (e.g. every Streamlit session) on it,
+# so a paraphrase asked in one session is answered from another's cached answer
+_answer_caches: "weakref.WeakKeyDictionary[Any, AnswerCache]" = weakref.WeakKeyDictionary()
+_answer_caches_lock = Lock()
+
+
+def get_answer_cache(vector_db: Any) -> AnswerCache:
+    """
+    Return the answer cache shared by the users of a vector database, creating it on first use.
+
+    Args:
+        vector_db: The vector database the cached answers come from (its version invalidates them)
+
+    Returns:
+        AnswerCache: The shared cache
+    """
+    with _answer_caches_lock:
+        answer_cache = _answer_caches.get(vector_db)
+        if answer_cache is None:
+            answer_cache = _answer_caches[vector_db] = AnswerCache()
+        return answer_cache
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,539 @@
+import os
+import json
+import glob
+from abc import ABC, abstractmethod
+from threading import RLock
+from typing import List, Dict, Tuple, Optional, Any, Iterable, Sequence
+import numpy as np
+from langchain.schema import Document
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from .config import (
+    NUMPY_COMPACT_RATIO,
+    NUMPY_MERGE_FACTOR,
+    INDEX_DIMENSIONS,
+    INDEX_QUANTIZATION,
+    INDEX_KEEP_FULL_VECTORS,
+    INDEX_RESCORE_FACTOR,
+)
+
+# Fields a `get` can return besides the ids
+GET_FIELDS = ("documents", "metadatas", "embeddings")
+
+
+# Storage and search of chunk vectors used by VectorDB.
+# `get` results are Chroma-style dicts: {"ids": [...], "documents": [...], "metadatas": [...], "embeddings": [...]}
+# holding only the requested fields. Search scores are squared L2 distances (lower is closer), as in Chroma.
+class VectorBackend(ABC):
+    @abstractmethod
+    def add(self, ids: List[str], texts: List[str], embeddings: Sequence[Sequence[float]],
+            metadatas: List[Dict[str, Any]]) -> None:
+        """Insert chunks, replacing the chunks that already have one of the ids."""
+
+    @abstractmethod
+    def search(self, query_embedding: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        """Return the k chunks closest to the query embedding with their distance, closest first."""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, sources: Optional[List[str]] = None,
+            include: Iterable[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, List[Any]]:
+        """Return the chunks with the given ids and/or from the given sources (all chunks if neither is given)."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """Delete chunks by id. Unknown ids are ignored."""
+
+    @abstractmethod
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Merge metadata into existing chunks. Keys set to None are removed."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of chunks stored."""
+
+
+# Backend storing the chunks in a persistent Chroma collection
+class ChromaBackend(VectorBackend):
+    def __init__(self, persist_directory: str, embeddings: Embeddings, collection_name: str = "example_collection"):
+        """
+        Initialize the backend.
+
+        Args:
+            persist_directory (str): Directory of the Chroma database
+            embeddings (Embeddings): Embedding function of the collection
+            collection_name (str): Name of the Chroma collection
+        """
+        self.store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=persist_directory
+        )
+
+    def add(self, ids: List[str], texts: List[str], embeddings: Sequence[Sequence[float]],
+            metadatas: List[Dict[str, Any]]) -> None:
+        self.store._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+
+    def search(self, query_embedding: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        return self.store.similarity_search_by_vector_with_relevance_scores([float(x) for x in query_embedding], k=k)
+
+    def get(self, ids: Optional[List[str]] = None, sources: Optional[List[str]] = None,
+            include: Iterable[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, List[Any]]:
+        where = None
+        if sources:
+            where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": list(sources)}}
+        kwargs = {"limit": limit, "offset": offset} if limit is not None else {}
+        return self.store.get(ids=ids, where=where, include=list(include), **kwargs)
+
+    def delete(self, ids: List[str]) -> None:
+        if ids:
+            self.store.delete(ids=ids)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.store._collection.update(ids=ids, metadatas=metadatas)
+
+    def count(self) -> int:
+        return self.store._collection.count()
+
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Number of set bits of every byte value, to count the differing bits of binary codes
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix."""
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def encode_vectors(vectors: np.ndarray, dimensions: Optional[int], quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Build the search codes of full-precision vectors: keep the first `dimensions` components
+    (Matryoshka truncation), re-normalize and quantize.
+
+    Args:
+        vectors (np.ndarray): Full-precision vectors, one per row
+        dimensions (int, optional): Number of leading components kept, None keeps all of them
+        quantization (str): "none" (float32), "int8" (one scale per row) or "binary" (sign bits)
+
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: The codes, and the per-row scales for int8
+    """
+    truncated = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)[:, :dimensions])
+    if quantization == "int8":
+        scales = np.maximum(np.abs(truncated).max(axis=1), 1e-12) / 127.0
+        return np.round(truncated / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if quantization == "binary":
+        return np.packbits(truncated > 0, axis=1), None
+    return truncated.astype(np.float32), None
+
+
+def decode_vectors(codes: np.ndarray, scales: Optional[np.ndarray], dimensions: int, quantization: str) -> np.ndarray:
+    """Approximate the (truncated, normalized) vectors of search codes."""
+    if quantization == "int8":
+        return codes.astype(np.float32) * scales[:, None]
+    if quantization == "binary":
+        signs = np.unpackbits(codes, axis=1, count=dimensions).astype(np.float32) * 2.0 - 1.0
+        return signs / np.sqrt(dimensions)
+    return np.asarray(codes, dtype=np.float32)
+
+
+# Backend keeping the vectors in memory-mapped float32 segment files searched with NumPy.
+# Writes append a new segment (vectors .npy + records .jsonl) and never modify existing ones:
+# deleted or replaced rows are tombstoned. Segments are merged by size tier, as in an LSM tree:
+# once `merge_factor` segments hold a similar number of rows they are merged into one of the
+# next tier, so each row is rewritten O(log n) times. A segment with too many tombstoned rows
+# is rewritten on its own.
+# The search can run on a reduced index instead of the full vectors: the leading `dimensions`
+# components, optionally quantized to int8 or to sign bits. The top candidates are then
+# rescored with the full vectors, which stay on disk and are only read for those rows.
+class NumpyBackend(VectorBackend):
+    def __init__(self, directory: str, compact_ratio: float = NUMPY_COMPACT_RATIO, merge_factor: int = NUMPY_MERGE_FACTOR,
+                 dimensions: Optional[int] = INDEX_DIMENSIONS, quantization: str = INDEX_QUANTIZATION,
+                 keep_full: bool = INDEX_KEEP_FULL_VECTORS, rescore_factor: int = INDEX_RESCORE_FACTOR):
+        """
+        Initialize the backend, loading the segments found in the directory.
+
+        Args:
+            directory (str): Directory holding the segment files
+            compact_ratio (float): Fraction of tombstoned rows of a segment that triggers its rewrite
+            merge_factor (int): Number of segments of the same size tier that are merged together
+            dimensions (int, optional): Leading vector components kept in the search index, None keeps all of them
+            quantization (str): Search index precision: "none", "int8" or "binary"
+            keep_full (bool): Keep the full-precision vectors on disk (required to rescore or change the index)
+            rescore_factor (int): Candidates rescored with the full vectors per requested hit, 0 disables rescoring
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.indexed = bool(dimensions) or quantization != "none"
+        if not (keep_full or self.indexed):
+            raise ValueError("Full vectors can only be dropped when searching a reduced index")
+        self.keep_full = keep_full
+        self.rescore_factor = rescore_factor if keep_full else 0
+        self.index_tag = f"d{dimensions or 'all'}-{quantization}"
+
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        if merge_factor < 2:
+            raise ValueError("merge_factor must be at least 2")
+        self.merge_factor = merge_factor
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        self._lock = RLock()
+
+        # Per segment: name, full vectors (memory-mapped) and their squared norms,
+        # search codes and int8 scales (if indexed), records and live-row mask
+        self._segments: List[Dict[str, Any]] = []
+        self._locations: Dict[str, Tuple[int, int]] = {}  # chunk id -> (segment position, row)
+        self._ids_by_source: Dict[str, set] = {}
+        self._next_segment = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Load the manifest, the segments and the tombstones."""
+        if not os.path.exists(self.manifest_file):
+            return
+        with open(self.manifest_file, 'r') as f:
+            manifest = json.load(f)
+        self._next_segment = manifest["next_segment"]
+        tombstones = manifest.get("tombstones", {})
+        for name in manifest["segments"]:
+            self._open_segment(name, set(tombstones.get(name, [])))
+
+        # Drop files of segments that were not committed to the manifest (interrupted writes)
+        for path in glob.glob(os.path.join(self.directory, "seg-*")):
+            if os.path.basename(path).split(".")[0] not in manifest["segments"]:
+                os.remove(path)
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def _open_segment(self, name: str, deleted: Optional[set] = None) -> None:
+        """Memory-map a segment (building its search index if missing) and index its live rows."""
+        vectors = np.load(self._path(name, ".npy"), mmap_mode="r") if os.path.exists(self._path(name, ".npy")) else None
+        with open(self._path(name, ".jsonl"), 'r') as f:
+            records = [json.loads(line) for line in f]
+
+        codes, scales = None, None
+        if self.indexed:
+            codes_path = self._path(name, f".{self.index_tag}.npy")
+            scales_path = self._path(name, f".{self.index_tag}.scales.npy")
+            if not os.path.exists(codes_path):
+                # Index settings changed: build the index from the full vectors
+                if vectors is None:
+                    raise ValueError(f"Segment {name} has no full vectors to build a {self.index_tag} index from")
+                self._write_index(name, *encode_vectors(vectors, self.dimensions, self.quantization))
+            codes = np.load(codes_path, mmap_mode="r")
+            scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        elif vectors is None:
+            raise ValueError(f"Segment {name} has no full vectors to search")
+
+        alive = np.ones(len(records), dtype=bool)
+        for row in deleted or ():
+            alive[row] = False
+        segment = {
+            "name": name,
+            "vectors": vectors,
+            "norms": np.einsum("ij,ij->i", vectors, vectors) if vectors is not None and not self.indexed else None,
+            "codes": codes,
+            "scales": scales,
+            "records": records,
+            "alive": alive,
+        }
+        self._segments.append(segment)
+        position = len(self._segments) - 1
+        for row in np.flatnonzero(alive):
+            self._index_row(records[row], position, int(row))
+
+    def _index_row(self, record: Dict[str, Any], position: int, row: int) -> None:
+        self._locations[record["id"]] = (position, row)
+        self._ids_by_source.setdefault(record["metadata"].get("source"), set()).add(record["id"])
+
+    def _save_manifest(self) -> None:
+        """Atomically save the list of segments and their tombstones."""
+        manifest = {
+            "next_segment": self._next_segment,
+            "segments": [segment["name"] for segment in self._segments],
+            "tombstones": {
+                segment["name"]: np.flatnonzero(~segment["alive"]).tolist()
+                for segment in self._segments if not segment["alive"].all()
+            },
+        }
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def _write_index(self, name: str, codes: np.ndarray, scales: Optional[np.ndarray]) -> None:
+        np.save(self._path(name, f".{self.index_tag}.npy"), np.ascontiguousarray(codes))
+        if scales is not None:
+            np.save(self._path(name, f".{self.index_tag}.scales.npy"), scales)
+
+    def _write_segment(self, records: List[Dict[str, Any]], vectors: Optional[np.ndarray],
+                       codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None) -> str:
+        """
+        Write a new segment's files and return its name. It is committed by the next manifest save.
+        The search codes are computed from the full vectors unless given.
+        """
+        name = f"seg-{self._next_segment:08d}"
+        self._next_segment += 1
+        if vectors is not None and self.keep_full:
+            np.save(self._path(name, ".npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+        if self.indexed:
+            if codes is None:
+                codes, scales = encode_vectors(vectors, self.dimensions, self.quantization)
+            self._write_index(name, codes, scales)
+        with open(self._path(name, ".jsonl"), 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return name
+
+    def _rows(self, segment: Dict[str, Any], rows: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]:
+        """Return the (full vectors, codes, scales) of some rows of a segment, None for what it does not store."""
+        return tuple(segment[key][rows] if segment[key] is not None else None for key in ("vectors", "codes", "scales"))
+
+    def _tombstone(self, chunk_id: str) -> bool:
+        """Mark the live row of a chunk as deleted. Returns False if the chunk does not exist."""
+        location = self._locations.pop(chunk_id, None)
+        if location is None:
+            return False
+        segment = self._segments[location[0]]
+        segment["alive"][location[1]] = False
+        source = segment["records"][location[1]]["metadata"].get("source")
+        self._ids_by_source.get(source, set()).discard(chunk_id)
+        return True
+
+    def _append(self, records: List[Dict[str, Any]], vectors: Optional[np.ndarray],
+                codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None) -> None:
+        """Tombstone the previous rows of the records' ids and append them as a new segment."""
+        name = self._write_segment(records, vectors, codes, scales)
+        for record in records:
+            self._tombstone(record["id"])
+        self._open_segment(name)
+        self._save_manifest()
+        self._maybe_compact()
+
+    def add(self, ids: List[str], texts: List[str], embeddings: Sequence[Sequence[float]],
+            metadatas: List[Dict[str, Any]]) -> None:
+        if not ids:
+            return
+        # Keep the last copy of an id added twice in the same call
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        rows = sorted(last.values())
+        records = [{"id": ids[i], "text": texts[i], "metadata": metadatas[i]} for i in rows]
+        vectors = np.asarray(embeddings, dtype=np.float32)[rows]
+        with self._lock:
+            self._append(records, vectors)
+
+    def search(self, query_embedding: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(query @ query)
+        if self.indexed:
+            # The query stays in float32 (asymmetric search), only binary codes are compared bit by bit
+            dimensions = self.dimensions or len(query)
+            query_codes = _normalize(query[:dimensions])
+            if self.quantization == "binary":
+                query_codes = np.packbits(query_codes > 0)
+        # Candidates per segment: k, or k * rescore_factor when they are rescored with the full vectors
+        candidates_per_segment = k * self.rescore_factor if self.indexed and self.rescore_factor else k
+        
+        candidates = []  # (distance, segment position, row)
+        with self._lock:
+            for position, segment in enumerate(self._segments):
+                alive = segment["alive"]
+                if not alive.any():
+                    continue
+                if self.indexed:
+                    distances = self._approximate_distances(segment, query_codes, dimensions)
+                else:
+                    # Squared L2 distance: |q|^2 + |x|^2 - 2 q.x
+                    distances = query_norm + segment["norms"] - 2.0 * (segment["vectors"] @ query)
+                distances[~alive] = np.inf
+                top = min(candidates_per_segment, int(alive.sum()))
+                rows = np.argpartition(distances, top - 1)[:top] if top < len(distances) else np.arange(len(distances))
+                rows = rows[alive[rows]]
+                
+                if self.indexed and self.rescore_factor:
+                    # Exact squared L2 distance on the candidates' full vectors
+                    rows = np.sort(rows)
+                    full = np.asarray(segment["vectors"][rows], dtype=np.float32)
+                    distances = np.full(len(alive), np.inf, dtype=np.float32)
+                    distances[rows] = query_norm + np.einsum("ij,ij->i", full, full) - 2.0 * (full @ query)
+                candidates.extend((float(distances[row]), position, int(row)) for row in rows)
+
+            candidates.sort()
+            results = []
+            for distance, position, row in candidates[:k]:
+                record = self._segments[position]["records"][row]
+                results.append((Document(id=record["id"], page_content=record["text"], metadata=dict(record["metadata"])), distance))
+        return results
+
+    def _approximate_distances(self, segment: Dict[str, Any], query_codes: np.ndarray, dimensions: int) -> np.ndarray:
+        """Squared L2 distances between normalized vectors (2 - 2 cos) estimated from the search codes."""
+        if self.quantization == "binary":
+            differing = _POPCOUNT[np.bitwise_xor(segment["codes"], query_codes)].sum(axis=1, dtype=np.int32)
+            similarities = 1.0 - 2.0 * differing / dimensions
+        elif self.quantization == "int8":
+            similarities = (segment["codes"] @ query_codes) * segment["scales"]
+        else:
+            similarities = segment["codes"] @ query_codes
+        return (2.0 - 2.0 * similarities).astype(np.float32)
+
+    def get(self, ids: Optional[List[str]] = None, sources: Optional[List[str]] = None,
+            include: Iterable[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, List[Any]]:
+        include = [field for field in include if field in GET_FIELDS]
+        with self._lock:
+            if ids is not None:
+                selected = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id in self._locations]
+                if sources:
+                    selected = [chunk_id for chunk_id in selected if self._record(chunk_id)["metadata"].get("source") in sources]
+            elif sources:
+                selected = [chunk_id for source in dict.fromkeys(sources) for chunk_id in self._ids_by_source.get(source, ())]
+            else:
+                selected = list(self._locations)
+            if limit is not None:
+                selected = selected[offset:offset + limit]
+            elif offset:
+                selected = selected[offset:]
+
+            results = {"ids": selected}
+            if "documents" in include:
+                results["documents"] = [self._record(chunk_id)["text"] for chunk_id in selected]
+            if "metadatas" in include:
+                results["metadatas"] = [dict(self._record(chunk_id)["metadata"]) for chunk_id in selected]
+            if "embeddings" in include:
+                results["embeddings"] = np.array([self._vector(chunk_id) for chunk_id in selected], dtype=np.float32)
+        return results
+
+    def _record(self, chunk_id: str) -> Dict[str, Any]:
+        position, row = self._locations[chunk_id]
+        return self._segments[position]["records"][row]
+
+    def _vector(self, chunk_id: str) -> np.ndarray:
+        """The full vector of a chunk, or its approximation from the search codes if full vectors are not kept."""
+        position, row = self._locations[chunk_id]
+        segment = self._segments[position]
+        if segment["vectors"] is not None:
+            return segment["vectors"][row]
+        scales = segment["scales"][row:row + 1] if segment["scales"] is not None else None
+        dimensions = self.dimensions or segment["codes"].shape[1] * (8 if self.quantization == "binary" else 1)
+        return decode_vectors(segment["codes"][row:row + 1], scales, dimensions, self.quantization)[0]
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            if any([self._tombstone(chunk_id) for chunk_id in ids]):
+                self._save_manifest()
+                self._maybe_compact()
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            records, parts = [], []
+            for chunk_id, changes in zip(ids, metadatas):
+                if chunk_id not in self._locations:
+                    continue
+                position, row = self._locations[chunk_id]
+                record = self._segments[position]["records"][row]
+                metadata = {key: value for key, value in {**record["metadata"], **changes}.items() if value is not None}
+                records.append({"id": chunk_id, "text": record["text"], "metadata": metadata})
+                parts.append(self._rows(self._segments[position], np.array([row])))
+            if records:
+                self._append(records, *_concat_rows(parts))
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._locations)
+
+    def _maybe_compact(self) -> None:
+        """Rewrite the segments with too many tombstones and merge full size tiers until none is left."""
+        while True:
+            selected = self._merge_candidates()
+            if not selected:
+                return
+            self._merge(selected)
+
+    def _merge_candidates(self) -> List[int]:
+        """Positions of the next segments to merge: a segment with too many tombstones, or a full size tier."""
+        tiers: Dict[int, List[int]] = {}
+        for position, segment in enumerate(self._segments):
+            alive = segment["alive"]
+            live = int(alive.sum())
+            if len(alive) and (len(alive) - live) / len(alive) > self.compact_ratio:
+                return [position]
+            tiers.setdefault(self._tier(live), []).append(position)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier]
+        return []
+
+    def _tier(self, rows: int) -> int:
+        """Size tier of a segment: floor(log_merge_factor(rows))."""
+        tier = 0
+        while rows >= self.merge_factor:
+            rows //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge(self, positions: Sequence[int]) -> None:
+        """Merge the live rows of some segments into a new segment appended after the others."""
+        with self._lock:
+            selected = set(positions)
+            old_segments = [self._segments[position] for position in sorted(selected)]
+            records, parts = [], []
+            for segment in old_segments:
+                rows = np.flatnonzero(segment["alive"])
+                records.extend(segment["records"][row] for row in rows)
+                parts.append(self._rows(segment, rows))
+
+            # Only the segments after the first merged one move
+            self._segments = [segment for position, segment in enumerate(self._segments) if position not in selected]
+            for position in range(min(selected), len(self._segments)):
+                segment = self._segments[position]
+                for row in np.flatnonzero(segment["alive"]):
+                    self._locations[segment["records"][row]["id"]] = (position, int(row))
+            if records:
+                self._open_segment(self._write_segment(records, *_concat_rows(parts)))
+            self._save_manifest()
+
+            for segment in old_segments:
+                for path in glob.glob(self._path(segment["name"], ".*")):
+                    os.remove(path)
+
+    def compact(self) -> None:
+        """Merge the live rows of every segment into a single contiguous segment."""
+        with self._lock:
+            if self._segments:
+                self._merge(range(len(self._segments)))
+
+
+def _concat_rows(parts: List[Tuple[Optional[np.ndarray], ...]]) -> Tuple[Optional[np.ndarray], ...]:
+    """Concatenate (full vectors, codes, scales) row groups, keeping None for what is not stored."""
+    return tuple(
+        np.concatenate([part[i] for part in parts]) if parts and parts[0][i] is not None else None
+        for i in range(3)
+    )
+
+
+def make_vector_backend(name: str, persist_directory: str, embeddings: Embeddings, **options: Any) -> VectorBackend:
+    """
+    Create the vector backend selected by name.
+
+    Args:
+        name (str): "chroma" or "numpy"
+        persist_directory (str): Directory of the vector database
+        embeddings (Embeddings): Embedding function (used by Chroma for text queries)
+        **options: Backend-specific options
+
+    Returns:
+        VectorBackend: The backend
+    """
+    if name == "chroma":
+        return ChromaBackend(persist_directory, embeddings, **options)
+    if name == "numpy":
+        return NumpyBackend(os.path.join(persist_directory, "numpy_index"), **options)
+    raise ValueError(f"Unknown vector backend: {name}")
@@ -1,45 +1,147 @@
 # Import libraries
 import sys
+import time
+import logging
 sys.path.append(".")
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from .config import OPENAI_API_KEY, CHAT_MODEL_NAME
-from typing import List, Dict, Tuple, Optional
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from .clients import get_chat_model
+from .packer import ContextPacker
+from .utils import summarize_conversation
+from .usage import record_usage, in_current_context
+from .config import CHAT_MODEL_NAME, MEMORY_TURNS
+from typing import List, Dict, Tuple, Optional, Any, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
+logger = logging.getLogger(__name__)
 
-# Memory class to store and manage the chat history
+# Text wrapped around the retrieved context in the prompt
+CONTEXT_PREAMBLE = (
+    "Below is some context extracted from documents. Use this context to answer the question. "
+    "If the context isn't directly related to the query or the information provided is not enough, "
+    "please indicate this explicitly.\n\n"
+    "Context:\n"
+)
+CONTEXT_ACKNOWLEDGEMENT = "I understand the context. Please proceed with your question."
+
+# Introduces the summary of the older turns in the chat history
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+# Conversation memory: the most recent turns verbatim and a running summary of the older ones
 class Memory:
-    def __init__(self, max_messages_count=10):
-        self._memory = []
-        self.max_messages_count = max_messages_count
+    def __init__(self, max_turns: int = MEMORY_TURNS):
+        """
+        Initialize the memory.
+        
+        Args:
+            max_turns (int): Most recent turns (question and answer) kept verbatim
+        """
+        self.max_turns = max_turns
+        self._lock = Lock()
+        self._turns: List[Dict[str, str]] = []  # Recent messages, kept verbatim
+        self._pending: List[Dict[str, str]] = []  # Older messages not folded into the summary yet
+        self._summary = ""
+        self._generation = 0  # Bumped on reset, so summaries of a cleared conversation are discarded
+        self._summarizing = False
+        # A single worker folds older turns into the summary in order, off the request path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+
     def update_memory(self, human_msg: str, ai_msg: str):
-        self._memory.append(
-            {"role": "user", "content": human_msg}
-        )
-        self._memory.append(
-            {"role": "assistant", "content": ai_msg}
-        )
+        """Add a turn. Turns beyond max_turns are summarized in the background."""
+        with self._lock:
+            self._turns.append({"role": "user", "content": human_msg})
+            self._turns.append({"role": "assistant", "content": ai_msg})
+            overflow = len(self._turns) - 2 * self.max_turns
+            if overflow <= 0:
+                return
+            self._pending.extend(self._turns[:overflow])
+            del self._turns[:overflow]
+            if self._summarizing:
+                return
+            self._summarizing = True
+            generation = self._generation
+        self._executor.submit(in_current_context(self._summarize), generation)
+
+    def _summarize(self, generation: int) -> None:
+        """Fold the pending turns into the summary until none are left."""
+        while True:
+            with self._lock:
+                if generation != self._generation or not self._pending:
+                    if generation == self._generation:
+                        self._summarizing = False
+                    return
+                summary, turns = self._summary, list(self._pending)
+            try:
+                summary = summarize_conversation(summary, turns)
+            except Exception as e:
+                # Keep the turns pending: they stay in the history verbatim and are retried on the next turn
+                logger.warning("Error summarizing conversation: %s", e)
+                with self._lock:
+                    if generation == self._generation:
+                        self._summarizing = False
+                return
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._summary = summary
+                del self._pending[:len(turns)]
 
     def reset_memory(self):
-        self._memory = []
+        with self._lock:
+            self._turns, self._pending, self._summary = [], [], ""
+            self._generation += 1
+            self._summarizing = False
+
+    @property
+    def summary(self) -> str:
+        """Running summary of the turns older than the recent ones."""
+        with self._lock:
+            return self._summary
 
     @property
     def history(self) -> List[Dict[str, str]]:
-        return self._memory[-self.max_messages_count:]
+        """
+        History to send to the model: the summary of the older turns as a system message,
+        then the turns not summarized yet and the recent turns verbatim.
+        """
+        with self._lock:
+            history = []
+            if self._summary:
+                history.append({"role": "system", "content": f"{SUMMARY_PREFIX}{self._summary}"})
+            return history + self._pending + self._turns
+
+
+def clean_history(history: Optional[List[Dict[str, Any]]], max_turns: int = MEMORY_TURNS) -> List[Dict[str, str]]:
+    """
+    Keep only what the model needs from a chat history: the role and content of the
+    most recent turns, without sources or any other metadata.
     
+    Args:
+        history (List[Dict[str, Any]], optional): Chat history, e.g. the UI messages with their sources
+        max_turns (int): Most recent turns (question and answer) to keep
+        
+    Returns:
+        List[Dict[str, str]]: History in format [{"role": "user/assistant", "content": "message"}]
+    """
+    messages = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in history or []
+        if msg.get("role") in ("user", "assistant") and msg.get("content")
+    ]
+    return messages[-2 * max_turns:] if max_turns > 0 else []
     
 
 # Main chatbot class
 class ChatBot:
     def __init__(self):
-        # Initialize OpenAI chat model
-        self.chat_model = ChatOpenAI(
-            model_name= CHAT_MODEL_NAME,
-            api_key=OPENAI_API_KEY
-        )
+        # Get the shared OpenAI chat model, reporting token usage on streamed answers too
+        self.model_name = CHAT_MODEL_NAME
+        self.chat_model = get_chat_model(CHAT_MODEL_NAME, stream_usage=True)
         self._context = None
         self._sources = None
         self.memory = Memory()
+        self.packer = ContextPacker()
 
         # System prompt
         self.system_prompt = (
@@ -53,15 +155,27 @@ class ChatBot:
             "If the user's language is unclear, default to English."
         )
 
-    def retrieve_context_from_db(self, query: str, vector_db) -> None:
+    def retrieve_context_from_db(self, query: str, vector_db, query_embedding: Optional[List[float]] = None) -> None:
         """
         Retrieve relevant context from the vector database for the given query.
         
         Args:
             query (str): The user's query
             vector_db: The vector database instance
+            query_embedding (List[float], optional): Precomputed embedding of the query
+        """
+        self._context, self._sources = vector_db.retrieve_context(query, query_embedding=query_embedding)
+
+    def set_context(self, context: str, sources: List[Dict[str, Any]]) -> None:
+        """
+        Set context and sources that were retrieved beforehand.
+        
+        Args:
+            context (str): Context extracted from the documents
+            sources (List[Dict[str, Any]]): Sources of the context
         """
-        self._context, self._sources = vector_db.retrieve_context(query)
+        self._context = context
+        self._sources = sources
 
     def remove_context(self) -> None:
         """
@@ -70,47 +184,138 @@ class ChatBot:
         self._context = None
         self._sources = None
 
-    def infer(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, List[Dict[str, str]]]:
+    @property
+    def sources(self) -> List[Dict[str, Any]]:
+        """Sources of the current context."""
+        return self._sources if self._sources else []
+
+    def _build_messages(self, message: str, history: Optional[List[Dict[str, str]]] = None,
+                        context: Optional[str] = None, sources: Optional[List[Dict[str, Any]]] = None,
+                        max_prompt_tokens: Optional[int] = None) -> Tuple[List[BaseMessage], Dict[str, Any]]:
         """
-        Generate a response using OpenAI's API.
+        Build the prompt messages: system prompt, context, chat history and current message,
+        with the context and history packed into the prompt token budget.
 
         Parameters:
             message (str): User input
             history (List[Dict[str, str]], optional): Chat history in format [{"role": "user/assistant", "content": "message"}]
+            context (str, optional): Context to use instead of the chatbot's current context
+            sources (List[Dict[str, Any]], optional): Sources of the given context
+            max_prompt_tokens (int, optional): Lower prompt budget than the packer's, for requests over a token budget
 
         Returns:
-            Tuple[str, List[Dict[str, str]]]: The model's response and sources used
+            Tuple[List[BaseMessage], Dict[str, Any]]: Messages to send to the chat model, and the packing
+            (kept sources, tokens per section, dropped spans and messages, and the "seconds" it took)
         """
+        start = time.perf_counter()
+        if context is None:
+            context, sources = self._context, self.sources
+
+        # Fit the context and history into the token budget, least relevant spans and oldest messages first out
+        packing = self.packer.pack(
+            self.system_prompt, message, context=context, sources=sources, history=history,
+            context_frame=CONTEXT_PREAMBLE + CONTEXT_ACKNOWLEDGEMENT, max_tokens=max_prompt_tokens
+        )
+        context, history = packing["context"], packing["history"]
+
         # Prepare messages
         messages = [SystemMessage(content=self.system_prompt)]
         
         # Add context if available
-        if self._context:
-            context_message = (
-                "Below is some context extracted from documents. Use this context to answer the question. "
-                "If the context isn't directly related to the query or the information provided is not enough, "
-                "please indicate this explicitly.\n\n"
-                f"Context:\n{self._context}"
-            )
-            messages.append(HumanMessage(content=context_message))
-            messages.append(SystemMessage(content="I understand the context. Please proceed with your question."))
+        if context:
+            messages.append(HumanMessage(content=CONTEXT_PREAMBLE + context))
+            messages.append(SystemMessage(content=CONTEXT_ACKNOWLEDGEMENT))
 
         # Add chat history if available
         if history:
             for msg in history:
                 if msg["role"] == "user":
                     messages.append(HumanMessage(content=msg["content"]))
-                elif msg["role"] == "assistant":
+                elif msg["role"] in ("assistant", "system"):
                     messages.append(SystemMessage(content=msg["content"]))
 
         # Add current message
         messages.append(HumanMessage(content=message))
+        packing["seconds"] = time.perf_counter() - start
+        return messages, packing
+
+    def infer(self, message: str, history: Optional[List[Dict[str, str]]] = None,
+              max_prompt_tokens: Optional[int] = None) -> Tuple[str, List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Generate a response using OpenAI's API.
+
+        Parameters:
+            message (str): User input
+            history (List[Dict[str, str]], optional): Chat history in format [{"role": "user/assistant", "content": "message"}]
+            max_prompt_tokens (int, optional): Lower prompt budget than the packer's, for requests over a token budget
+
+        Returns:
+            Tuple[str, List[Dict[str, str]], Dict[str, Any]]: The model's response, sources used and the
+            packing of the prompt (tokens per section and the "seconds" it took)
+        """
+        messages, packing = self._build_messages(message, history, max_prompt_tokens=max_prompt_tokens)
 
         # Get response from OpenAI
         response = self.chat_model.invoke(messages)
+        record_usage("answer", self.model_name, response)
         
-        # Return response and sources
-        return response.content, self._sources if self._sources else []
+        # Return response, the sources that made it into the prompt and how it was packed
+        return response.content, packing["sources"], packing
+
+    async def ainfer(self, message: str, history: Optional[List[Dict[str, str]]] = None,
+                     context: Optional[str] = None, sources: Optional[List[Dict[str, Any]]] = None,
+                     max_prompt_tokens: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Async version of `infer`. Context and sources can be passed explicitly so
+        concurrent conversations do not share the chatbot's current context.
+
+        Parameters:
+            message (str): User input
+            history (List[Dict[str, str]], optional): Chat history in format [{"role": "user/assistant", "content": "message"}]
+            context (str, optional): Context to use instead of the chatbot's current context
+            sources (List[Dict[str, Any]], optional): Sources of the given context
+            max_prompt_tokens (int, optional): Lower prompt budget than the packer's, for requests over a token budget
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]], Dict[str, Any]]: The model's response, sources used and the packing of the prompt
+        """
+        messages, packing = self._build_messages(
+            message, history, context=context, sources=sources, max_prompt_tokens=max_prompt_tokens
+        )
+        response = await self.chat_model.ainvoke(messages)
+        record_usage("answer", self.model_name, response)
+        return response.content, packing["sources"], packing
+
+    def stream(self, message: str, history: Optional[List[Dict[str, str]]] = None,
+               max_prompt_tokens: Optional[int] = None) -> Tuple[Iterator[str], Dict[str, Any]]:
+        """
+        Generate a response using OpenAI's API, yielding tokens as they arrive.
+        The prompt is built when this is called, so later context changes do not affect it.
+        The returned packing holds the sources of the answer. The token usage is
+        recorded for the usage trackers active when this is called.
+
+        Parameters:
+            message (str): User input
+            history (List[Dict[str, str]], optional): Chat history in format [{"role": "user/assistant", "content": "message"}]
+            max_prompt_tokens (int, optional): Lower prompt budget than the packer's, for requests over a token budget
+
+        Returns:
+            Tuple[Iterator[str], Dict[str, Any]]: The response tokens and the packing of the prompt
+        """
+        messages, packing = self._build_messages(message, history, max_prompt_tokens=max_prompt_tokens)
+        record = in_current_context(record_usage)
+
+        def tokens() -> Iterator[str]:
+            usage_chunk = None
+            for chunk in self.chat_model.stream(messages):
+                if chunk.usage_metadata:
+                    usage_chunk = chunk  # The last chunk carries the usage of the whole answer
+                if chunk.content:
+                    yield chunk.content
+            if usage_chunk is not None:
+                record("answer", self.model_name, usage_chunk)
+
+        return tokens(), packing
 
 if __name__=="__main__":
     cb = ChatBot()
@@ -0,0 +1,139 @@
+import asyncio
+import weakref
+from threading import Lock
+from typing import Any, Dict, Tuple
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from .config import (
+    OPENAI_API_KEY,
+    OPENAI_POOL_SIZE,
+    OPENAI_CONNECT_TIMEOUT,
+    OPENAI_REQUEST_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+)
+
+# Process-wide registry of OpenAI clients, keyed by kind, model and parameters.
+# Every client shares the same pooled keep-alive HTTP connections.
+_clients: Dict[Tuple, Any] = {}
+_http_clients: Dict[str, Any] = {}
+_lock = Lock()
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_REQUEST_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_POOL_SIZE, max_keepalive_connections=OPENAI_POOL_SIZE)
+
+
+# httpx.AsyncClient whose requests go through a pooled client of the running event loop:
+# async connections belong to the loop that opened them, and Streamlit reruns, scripts and
+# asyncio.run each use their own loop
+class _PerLoopAsyncClient(httpx.AsyncClient):
+    def __init__(self):
+        super().__init__(limits=_limits(), timeout=_timeout())
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._loop_lock = Lock()
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.get(loop)
+            if client is None or client.is_closed:
+                client = self._loop_clients[loop] = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            return client
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await self._loop_client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._loop_client().aclose()
+
+    def close_all(self) -> None:
+        """Close the client of every event loop: on the loop if it can still run, otherwise just drop it."""
+        with self._loop_lock:
+            loop_clients = list(self._loop_clients.items())
+            self._loop_clients.clear()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for loop, client in loop_clients:
+            if loop.is_closed():
+                continue
+            if loop is running:
+                loop.create_task(client.aclose())
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            elif running is None:
+                loop.run_until_complete(client.aclose())
+
+
+def _shared_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Return the shared sync and async HTTP clients, creating them on first use. Call with the lock held."""
+    if not _http_clients:
+        _http_clients["sync"] = httpx.Client(limits=_limits(), timeout=_timeout())
+        _http_clients["async"] = _PerLoopAsyncClient()
+    return _http_clients["sync"], _http_clients["async"]
+
+
+def _get_client(kind: str, factory: Any, model: str, **params: Any) -> Any:
+    """Return the registered client for (kind, model, params), creating it if needed."""
+    key = (kind, model, tuple(sorted(params.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client, http_async_client = _shared_http_clients()
+            client = factory(
+                model=model,
+                api_key=OPENAI_API_KEY,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                request_timeout=_timeout(),
+                max_retries=OPENAI_MAX_RETRIES,
+                **params
+            )
+            _clients[key] = client
+        return client
+
+
+def get_chat_model(model_name: str, **params: Any) -> ChatOpenAI:
+    """
+    Get the shared chat model client for a model and parameters.
+    
+    Args:
+        model_name (str): Name of the OpenAI chat model
+        **params: Extra ChatOpenAI parameters (e.g. temperature), part of the registry key
+        
+    Returns:
+        ChatOpenAI: The shared client
+    """
+    return _get_client("chat", ChatOpenAI, model_name, **params)
+
+
+def get_embeddings(model_name: str, **params: Any) -> OpenAIEmbeddings:
+    """
+    Get the shared embeddings client for a model and parameters.
+    
+    Args:
+        model_name (str): Name of the OpenAI embedding model
+        **params: Extra OpenAIEmbeddings parameters, part of the registry key
+        
+    Returns:
+        OpenAIEmbeddings: The shared client
+    """
+    return _get_client("embeddings", OpenAIEmbeddings, model_name, **params)
+
+
+def reset_clients() -> None:
+    """Close the shared HTTP connections and drop every registered client."""
+    with _lock:
+        _clients.clear()
+        if _http_clients:
+            _http_clients["sync"].close()
+            _http_clients["async"].close_all()
+        _http_clients.clear()
@@ -13,6 +13,7 @@ if not OPENAI_API_KEY:
 CHAT_MODEL_NAME = "gpt-4.1-2025-04-14"  # Default model for chat interactions
 RAG_DECISION_MODEL_NAME = "gpt-4o-mini"  # Model for deciding whether to use RAG
 SUMMARY_MODEL_NAME = "gpt-4.1-2025-04-14"  # Model for document summarization
+MEMORY_SUMMARY_MODEL_NAME = "gpt-4o-mini"  # Model for summarizing older conversation turns
 
 # Document storage
 DOCUMENTS_DIR = "docs"
@@ -20,4 +21,102 @@ TEMP_DIR = "temp"
 
 # Create necessary directories if they don't exist
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True) 
\ No newline at end of file
+os.makedirs(TEMP_DIR, exist_ok=True) 
+
+# Retrieval caches
+CHUNK_INDEX_CACHE_SIZE = 32  # Number of documents whose ordered chunk sequence is kept in memory
+
+# RAG routing: cosine similarity between the query and the documents' summary embeddings / chunk centroids
+ROUTER_SKIP_THRESHOLD = 0.20  # At or below this similarity RAG is skipped without asking the LLM
+ROUTER_USE_THRESHOLD = 0.45  # At or above this similarity RAG is used without asking the LLM
+
+# RAG routing decision cache
+ROUTER_CACHE_SIZE = 1024  # Maximum number of cached routing decisions
+ROUTER_CACHE_TTL = 24 * 60 * 60  # Seconds a routing decision stays valid
+ROUTER_CACHE_FILE = os.path.join("db", "routing_cache.json")  # Set to None to keep the cache in memory only
+ROUTER_CACHE_SAVE_DELAY = 5.0  # Seconds new decisions are batched before the cache is saved, off the request path
+
+# Retrieve context concurrently with the RAG routing decision (dropped if RAG is not used)
+SPECULATIVE_RETRIEVAL = True
+
+# OpenAI HTTP clients (shared keep-alive connection pool)
+OPENAI_POOL_SIZE = 20  # Maximum number of pooled connections
+OPENAI_CONNECT_TIMEOUT = 10.0  # Seconds to establish a connection
+OPENAI_REQUEST_TIMEOUT = 120.0  # Seconds to wait for a response
+OPENAI_MAX_RETRIES = 2  # Retries on transient API errors
+
+# Persistent embedding cache (kept outside db/ so it survives rebuilding the vector store)
+EMBEDDING_MODEL_NAME = "text-embedding-3-large"
+EMBEDDING_CACHE_PATH = os.path.join("cache", "embeddings.sqlite")  # Set to None to disable the cache
+EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used vectors are evicted above this size
+EMBEDDING_CACHE_TOUCH_INTERVAL = 600.0  # Seconds before a cache hit refreshes a vector's last use time
+
+# Map-reduce summarization of large documents
+SUMMARY_SECTION_TOKENS = 8000  # Documents longer than this are summarized section by section
+SUMMARY_MAX_WORKERS = 8  # Sections summarized concurrently
+SUMMARY_CACHE_PATH = os.path.join("cache", "section_summaries.json")  # Set to None to keep section summaries in memory only
+SUMMARY_CACHE_SIZE = 4096  # Maximum number of cached section summaries
+
+# Parallel ingest pipeline (VectorDB.upload_documents)
+INGEST_PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Processes parsing PDFs, 0 parses in a thread instead
+INGEST_EMBED_WORKERS = 4  # Documents embedded concurrently
+INGEST_SUMMARY_WORKERS = 4  # Documents summarized concurrently
+INGEST_EMBED_BATCH_SIZE = 256  # Chunks per embedding request
+INGEST_WRITE_BATCH_SIZE = 2048  # Chunks per vector store write
+INGEST_MAX_IN_FLIGHT = 16  # Documents parsed but not yet written (bounds memory)
+
+# Streaming ingest (page by page, constant memory)
+STREAMING_INGEST_MIN_BYTES = 50 * 1024 * 1024  # PDFs at least this large are ingested in streaming mode
+STREAMING_BATCH_SIZE = 256  # Chunks embedded and written per batch in streaming mode
+
+# Vector store backend
+VECTOR_BACKEND = "chroma"  # "chroma" or "numpy" (memory-mapped segments searched in-process)
+NUMPY_COMPACT_RATIO = 0.25  # Fraction of deleted rows that triggers the rewrite of a NumPy index segment
+NUMPY_MERGE_FACTOR = 4  # Number of similar-size NumPy index segments merged together (size-tiered merging)
+
+# Reduced-precision search index of the NumPy backend
+INDEX_DIMENSIONS = None  # Leading embedding components searched (Matryoshka truncation, e.g. 256/512/1024), None for all
+INDEX_QUANTIZATION = "none"  # "none" (float32), "int8" or "binary"
+INDEX_KEEP_FULL_VECTORS = True  # Keep full-precision vectors on disk for rescoring and rebuilding the index
+INDEX_RESCORE_FACTOR = 4  # Candidates rescored with full vectors per requested hit (0 disables rescoring)
+
+# Hybrid retrieval (BM25 + vector search)
+RETRIEVAL_MODE = "hybrid"  # "hybrid", "vector" or "lexical" (identifier-like queries always use "lexical")
+HYBRID_CANDIDATES = 20  # Candidates taken from each retriever before fusion
+RRF_K = 60  # Reciprocal rank fusion constant
+BM25_K1 = 1.5  # BM25 term frequency saturation
+BM25_B = 0.75  # BM25 document length normalization
+
+# Prompt token budget
+PROMPT_TOKEN_BUDGET = 16000  # Maximum prompt tokens: system prompt, context, chat history and question
+HISTORY_TOKEN_BUDGET = 4000  # Maximum chat history tokens, the oldest messages are dropped first
+
+# Conversation memory
+MEMORY_TURNS = 4  # Most recent turns (question and answer) kept verbatim, older ones are summarized
+MEMORY_SUMMARY_TOKENS = 500  # Maximum tokens of the running summary of the older turns
+
+# Semantic answer cache
+ANSWER_CACHE_SIZE = 512  # Maximum number of cached answers, 0 disables the cache
+ANSWER_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity between two queries to reuse an answer
+ANSWER_CACHE_MAX_HISTORY_TURNS = 1  # Cached answers are served only to turns with at most this much history
+
+# Query caches
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Query embeddings kept in memory
+RETRIEVAL_CACHE_SIZE = 256  # Retrieval results (context and sources) kept in memory, dropped on every write
+
+# Logging and metrics
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")  # "DEBUG" shows the routing decisions and per-message stage timings
+METRICS_HOST = "127.0.0.1"  # Interface of the Prometheus metrics endpoint
+METRICS_PORT = 9464  # Port of the endpoint (http://METRICS_HOST:METRICS_PORT/metrics), None disables it
+TRACE_FILE = os.environ.get("TRACE_FILE")  # JSONL file the stage timings of every message and ingest are appended to, unset disables it
+
+# Token accounting and budgets (None disables a budget)
+MODEL_PRICES = {  # USD per million prompt and completion tokens, for the cost estimates (longest matching prefix)
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+REQUEST_TOKEN_BUDGET = 24000  # Tokens all chat model calls of one message may use; the answer prompt gets what routing left
+SESSION_TOKEN_BUDGET = None  # Tokens one GalteaChat session may use before its answers get SESSION_DEGRADED_PROMPT_TOKENS
+SESSION_DEGRADED_PROMPT_TOKENS = 4000  # Prompt budget of answers past the session budget: fewer chunks and shorter history
+INGEST_TOKEN_BUDGET = None  # Tokens one ingest may spend on summaries; past it, documents get their beginning as summary
+DEGRADED_SUMMARY_TOKENS = 300  # Length of the summaries that replace the model's past the ingest budget
@@ -1,35 +1,73 @@
 import os
 import glob
-from typing import List, Tuple, Optional, Dict
-from .chatbot import ChatBot, Memory
-from .db import VectorDB
-from .utils import should_use_rag
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional, Dict, Any, Iterator, Callable
+from .chatbot import ChatBot, Memory, clean_history
+from .db import get_vector_db
+from .router import RoutingDecision, get_router
+from .answer_cache import get_answer_cache
+from .observability import configure_logging, start_metrics_server, record_request
+from .usage import Usage, track_usage, in_current_context
+from .config import (
+    SPECULATIVE_RETRIEVAL,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_MAX_HISTORY_TURNS,
+    REQUEST_TOKEN_BUDGET,
+    SESSION_TOKEN_BUDGET,
+    SESSION_DEGRADED_PROMPT_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
 
 class GalteaChat:
-    def __init__(self, documents_dir: str = "docs"):
+    def __init__(self, documents_dir: str = "docs", speculative_retrieval: bool = SPECULATIVE_RETRIEVAL):
         """
         Initialize the GalteaChat system.
         
         Args:
             documents_dir (str): Directory where PDF documents are stored
+            speculative_retrieval (bool): Retrieve context while the RAG decision is being made
         """
+        configure_logging()
+        start_metrics_server()
+        
         self.documents_dir = documents_dir
         self.chatbot = ChatBot()
-        self.vector_db = VectorDB()
+        self.vector_db = get_vector_db()
+        self.router = get_router(self.vector_db)
+        self.speculative_retrieval = speculative_retrieval
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="galtea-retrieval")
+        
+        # Answers of previous questions in any session on this vector database, reused for paraphrases until the documents change
+        self.answer_cache = get_answer_cache(self.vector_db) if ANSWER_CACHE_SIZE > 0 else None
+        
+        # Seconds spent in each stage of the last processed message
+        self.last_timings: Dict[str, float] = {}
+        
+        # Prompt tokens per section (system, context, history, question) of the last processed message
+        self.last_prompt_tokens: Dict[str, int] = {}
+        
+        # LLM tokens and cost of this session and of the last processed message, per stage
+        self.session_usage = Usage(SESSION_TOKEN_BUDGET)
+        self.last_usage: Dict[str, Any] = {}
         
         # Load initial documents if collection is empty
         try:
-            collection_size = len(self.vector_db.vector_store.get()["ids"])
+            collection_size = self.vector_db.count_chunks()
             if collection_size == 0:
                 documents = glob.glob(os.path.join(documents_dir, "*.pdf"))
-                print(f"Loading initial documents: {documents}")
-                for doc in documents:
-                    self.vector_db.upload_document(doc)
-                print("Initial documents loaded successfully")
+                logger.info("Loading initial documents: %s", documents)
+                if self.vector_db.upload_documents(documents):
+                    logger.info("Initial documents loaded successfully")
+                else:
+                    logger.warning("Some initial documents could not be loaded")
             else:
-                print(f"Using existing collection with {collection_size} documents")
+                logger.info("Using existing collection with %d documents", collection_size)
         except Exception as e:
-            print(f"Error initializing document collection: {str(e)}")
+            logger.error("Error initializing document collection: %s", e)
             raise
 
     def upload_document(self, file_path: str) -> bool:
@@ -52,42 +90,453 @@ class GalteaChat:
             self.vector_db.upload_document(file_path)
             return True
         except Exception as e:
-            print(f"Error uploading document: {str(e)}")
+            logger.error("Error uploading document: %s", e)
+            return False
+
+    async def aupload_document(self, file_path: str) -> bool:
+        """
+        Async version of `upload_document`.
+        
+        Args:
+            file_path (str): Path to the PDF file
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not file_path.endswith(".pdf"):
+                raise ValueError("Only PDF files are supported")
+            
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"File not found: {file_path}")
+            
+            return await self.vector_db.aupload_document(file_path)
+        except Exception as e:
+            logger.error("Error uploading document: %s", e)
             return False
 
     def process_message(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, List[Dict[str, str]]]:
         """
         Process a user message and return the response.
+        Without an explicit history the chatbot's memory is used and updated with the answer.
+        Paraphrases of a question answered before (with little or no history) get the cached answer.
         
         Args:
             message (str): The user's message
-            history (List[Dict[str, str]], optional): Chat history in the format [{"role": "user/assistant", "content": "message"}]
+            history (List[Dict[str, str]], optional): Chat history in the format [{"role": "user/assistant", "content": "message"}],
+                only the role and content of its most recent turns are used
             
         Returns:
             Tuple[str, List[Dict[str, str]]]: (response, sources)
         """
+        timings = {}
+        self.last_timings = timings
+        prompt_tokens = self.last_prompt_tokens = {}
+        total_start = time.perf_counter()
+        outcome = "error"
+        usage = Usage(REQUEST_TOKEN_BUDGET)
         try:
-            if not message or not message.strip():
-                raise ValueError("Message cannot be empty")
+            with track_usage(self.session_usage, usage):
+                chat_history = self._history(history)
+                version = self.vector_db.version
+                query_embedding, cached = self._cached_answer(message, chat_history, timings)
+                if cached is not None:
+                    answer, sources = cached
+                    self.last_prompt_tokens = {}
+                    outcome = "cached"
+                else:
+                    self._prepare_context(message, timings, query_embedding=query_embedding)
+                    
+                    start = time.perf_counter()
+                    answer, sources, packing = self.chatbot.infer(
+                        message, history=chat_history, max_prompt_tokens=self._prompt_budget(usage)
+                    )
+                    self._record_generation(timings, start, packing)
+                    prompt_tokens = self.last_prompt_tokens = packing["tokens"]
+                    self._cache_answer(query_embedding, chat_history, version, answer, sources, total_start)
+                    outcome = "answered"
+                if history is None:
+                    self.chatbot.memory.update_memory(message, answer)
+                return answer, sources
+            
+        except Exception as e:
+            logger.exception("Error processing message: %s", e)
+            return f"Error processing message: {str(e)}", []
+        finally:
+            timings["total"] = time.perf_counter() - total_start
+            self.last_usage = usage.report()
+            record_request(timings, outcome, prompt_tokens=prompt_tokens.get("total"), usage=self.last_usage)
 
-            # Get all document summaries
-            summaries = self.vector_db.get_all_summaries()
+    async def aprocess_message(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Async version of `process_message`. It does not touch the chatbot's shared
+        context or memory, so many conversations can be processed concurrently.
+        
+        Args:
+            message (str): The user's message
+            history (List[Dict[str, str]], optional): Chat history in the format [{"role": "user/assistant", "content": "message"}],
+                only the role and content of its most recent turns are used
             
-            # Check if the message should use RAG
-            if should_use_rag(message, summaries):
-                # If RAG worthy, retrieve context and get response with sources
-                self.chatbot.retrieve_context_from_db(message, self.vector_db)
-                answer, sources = self.chatbot.infer(message, history=history)
+        Returns:
+            Tuple[str, List[Dict[str, str]]]: (response, sources)
+        """
+        timings = {}
+        self.last_timings = timings
+        prompt_tokens = self.last_prompt_tokens = {}
+        total_start = time.perf_counter()
+        outcome = "error"
+        usage = Usage(REQUEST_TOKEN_BUDGET)
+        try:
+            with track_usage(self.session_usage, usage):
+                if not message or not message.strip():
+                    raise ValueError("Message cannot be empty")
+                
+                chat_history = clean_history(history)
+                version = self.vector_db.version
+                query_embedding, cached = None, None
+                if self._answer_cache_applies(chat_history):
+                    start = time.perf_counter()
+                    query_embedding = await self.vector_db.aembed_query(message)
+                    timings["query_embedding"] = time.perf_counter() - start
+                    cached = self._lookup_answer(query_embedding, version, timings)
+                if cached is not None:
+                    self.last_prompt_tokens = {}
+                    outcome = "cached"
+                    return cached
+
+                # Get all document summaries
+                start = time.perf_counter()
+                summaries = self.vector_db.get_all_summaries()
+                timings["summaries"] = time.perf_counter() - start
+                
+                decision, context, sources = await self._aroute_and_retrieve(
+                    message, summaries, timings, query_embedding=query_embedding
+                )
+                
+                start = time.perf_counter()
+                answer, sources, packing = await self.chatbot.ainfer(
+                    message, history=chat_history, context=context if decision.use_rag else "", sources=sources,
+                    max_prompt_tokens=self._prompt_budget(usage)
+                )
+                self._record_generation(timings, start, packing)
+                prompt_tokens = self.last_prompt_tokens = packing["tokens"]
+                self._cache_answer(query_embedding, chat_history, version, answer, sources, total_start)
+                outcome = "answered"
                 return answer, sources
-            else:
-                # If not RAG worthy, just get response without sources
-                answer, _ = self.chatbot.infer(message, history=history)
-                return answer, []
             
         except Exception as e:
-            error_msg = f"Error processing message: {str(e)}"
-            print(error_msg)
-            return error_msg, []
+            logger.exception("Error processing message: %s", e)
+            return f"Error processing message: {str(e)}", []
+        finally:
+            timings["total"] = time.perf_counter() - total_start
+            self.last_usage = usage.report()
+            record_request(timings, outcome, prompt_tokens=prompt_tokens.get("total"), usage=self.last_usage)
+
+    def stream_message(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Tuple[Iterator[str], List[Dict[str, Any]]]:
+        """
+        Process a user message and stream the response as it is generated.
+        Routing and retrieval happen before this returns; the answer is generated
+        while the returned iterator is consumed. Without an explicit history the chatbot's
+        memory is used and updated once the answer is complete.
+        
+        Args:
+            message (str): The user's message
+            history (List[Dict[str, str]], optional): Chat history in the format [{"role": "user/assistant", "content": "message"}],
+                only the role and content of its most recent turns are used
+            
+        Returns:
+            Tuple[Iterator[str], List[Dict[str, Any]]]: (response tokens, sources)
+        """
+        timings = {}
+        self.last_timings = timings
+        self.last_prompt_tokens = {}
+        total_start = time.perf_counter()
+        usage = Usage(REQUEST_TOKEN_BUDGET)
+        try:
+            with track_usage(self.session_usage, usage):
+                chat_history = self._history(history)
+                version = self.vector_db.version
+                query_embedding, cached = self._cached_answer(message, chat_history, timings)
+                if cached is not None:
+                    answer, sources = cached
+                    self.last_prompt_tokens = {}
+                    if history is None:
+                        self.chatbot.memory.update_memory(message, answer)
+                    timings["total"] = time.perf_counter() - total_start
+                    self.last_usage = usage.report()
+                    record_request(timings, "cached", usage=self.last_usage)
+                    return iter([answer]), sources
+                
+                self._prepare_context(message, timings, query_embedding=query_embedding)
+                tokens, packing = self.chatbot.stream(message, history=chat_history, max_prompt_tokens=self._prompt_budget(usage))
+                sources = packing["sources"]
+                timings["prompt_assembly"] = packing["seconds"]
+                self.last_prompt_tokens = packing["tokens"]
+                
+                def on_complete(answer: str) -> None:
+                    if history is None:
+                        self.chatbot.memory.update_memory(message, answer)
+                    self._cache_answer(query_embedding, chat_history, version, answer, sources, total_start)
+                
+                # The stream is consumed later: the memory summary it triggers still counts for this session
+                on_complete = in_current_context(on_complete)
+        except Exception as e:
+            logger.exception("Error processing message: %s", e)
+            timings["total"] = time.perf_counter() - total_start
+            self.last_usage = usage.report()
+            record_request(timings, "error", usage=self.last_usage)
+            return iter([f"Error processing message: {str(e)}"]), []
+        
+        return self._timed_stream(tokens, timings, total_start, usage, on_complete, packing["tokens"].get("total")), sources
+
+    def _timed_stream(self, tokens: Iterator[str], timings: Dict[str, float], total_start: float, usage: Usage,
+                      on_complete: Optional[Callable[[str], None]] = None, prompt_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the response tokens, recording time to first token and generation time.
+        If given, on_complete is called with the complete answer once it has been fully generated.
+        The message's timings and token usage are exported once the stream ends.
+        """
+        start = time.perf_counter()
+        answer = []
+        outcome = "error"
+        try:
+            for token in tokens:
+                if "time_to_first_token" not in timings:
+                    timings["time_to_first_token"] = time.perf_counter() - start
+                answer.append(token)
+                yield token
+            if on_complete is not None:
+                on_complete("".join(answer))
+            outcome = "answered"
+        except Exception as e:
+            logger.exception("Error processing message: %s", e)
+            yield f"\n\nError processing message: {str(e)}"
+        finally:
+            timings["generation"] = time.perf_counter() - start
+            timings["total"] = time.perf_counter() - total_start
+            self.last_usage = usage.report()
+            record_request(timings, outcome, prompt_tokens=prompt_tokens, usage=self.last_usage)
+
+    def _prompt_budget(self, usage: Usage) -> Optional[int]:
+        """
+        Prompt tokens the answer may use: what the request budget has left after routing,
+        and at most SESSION_DEGRADED_PROMPT_TOKENS once the session budget is used up.
+        Over budget the packer keeps fewer context spans and less history instead of failing.
+        
+        Returns:
+            Optional[int]: The prompt budget, or None if no token budget applies
+        """
+        budgets = [] if usage.remaining is None else [usage.remaining]
+        session_remaining = self.session_usage.remaining
+        if session_remaining is not None and session_remaining <= 0:
+            budgets.append(SESSION_DEGRADED_PROMPT_TOKENS)
+        if not budgets:
+            return None
+        budget = max(min(budgets), 0)
+        if budget < self.chatbot.packer.max_tokens:
+            logger.info("Token budget: answer prompt limited to %d tokens", budget)
+        return budget
+
+    def _record_generation(self, timings: Dict[str, float], start: float, packing: Dict[str, Any]) -> None:
+        """Split the time since start into prompt assembly (as measured in the packing) and the model call itself."""
+        elapsed = time.perf_counter() - start
+        timings["prompt_assembly"] = packing["seconds"]
+        timings["generation"] = elapsed - timings["prompt_assembly"]
+
+    def _answer_cache_applies(self, history: List[Dict[str, str]]) -> bool:
+        """Cached answers are served only to turns with little or no history, which cannot change their meaning much."""
+        return self.answer_cache is not None and len(history) <= 2 * ANSWER_CACHE_MAX_HISTORY_TURNS
+
+    def _cached_answer(self, message: str, history: List[Dict[str, str]],
+                       timings: Dict[str, float]) -> Tuple[Optional[List[float]], Optional[Tuple[str, List[Dict[str, Any]]]]]:
+        """
+        Look up a cached answer for the message if the answer cache applies to it.
+        The query embedding computed for the lookup is reused by routing and retrieval.
+        
+        Returns:
+            Tuple[Optional[List[float]], Optional[Tuple[str, List[Dict[str, Any]]]]]: (query embedding, (answer, sources) or None)
+        """
+        if not message or not message.strip() or not self._answer_cache_applies(history):
+            return None, None
+        start = time.perf_counter()
+        query_embedding = self.vector_db.embed_query(message)
+        timings["query_embedding"] = time.perf_counter() - start
+        return query_embedding, self._lookup_answer(query_embedding, self.vector_db.version, timings)
+
+    def _lookup_answer(self, query_embedding: List[float], version: int,
+                       timings: Dict[str, float]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Look up the answer cache, timing the lookup."""
+        start = time.perf_counter()
+        cached = self.answer_cache.get(query_embedding, version)
+        timings["answer_cache"] = time.perf_counter() - start
+        return cached
+
+    def _cache_answer(self, query_embedding: Optional[List[float]], history: List[Dict[str, str]], version: int,
+                      answer: str, sources: List[Dict[str, Any]], total_start: float) -> None:
+        """Cache an answer given without history: only those do not depend on an earlier turn."""
+        if query_embedding is None or history:
+            return
+        self.answer_cache.put(query_embedding, version, answer, sources, time.perf_counter() - total_start)
+
+    def _history(self, history: Optional[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+        """The history to send to the model: the given one without metadata, or the chatbot's memory."""
+        if history is None:
+            return self.chatbot.memory.history
+        return clean_history(history)
+
+    def _prepare_context(self, message: str, timings: Dict[str, float],
+                         query_embedding: Optional[List[float]] = None) -> None:
+        """
+        Validate the message, decide whether it should use RAG and set the chatbot's
+        context accordingly.
+        
+        Args:
+            message (str): The user's message
+            timings (Dict[str, float]): Dict filled with the seconds spent in each stage
+            query_embedding (List[float], optional): Precomputed embedding of the message
+        """
+        if not message or not message.strip():
+            raise ValueError("Message cannot be empty")
+
+        # Get all document summaries
+        start = time.perf_counter()
+        summaries = self.vector_db.get_all_summaries()
+        timings["summaries"] = time.perf_counter() - start
+        
+        decision, context, sources = self._route_and_retrieve(message, summaries, timings, query_embedding=query_embedding)
+        
+        # Check if the message should use RAG
+        if decision.use_rag:
+            # If RAG worthy, answer with the retrieved context and return its sources
+            self.chatbot.set_context(context, sources)
+        else:
+            # If not RAG worthy, answer without context or sources
+            self.chatbot.remove_context()
+
+    def _route_and_retrieve(self, message: str, summaries: str, timings: Dict[str, float],
+                            query_embedding: Optional[List[float]] = None) -> Tuple[RoutingDecision, str, List[Dict[str, Any]]]:
+        """
+        Decide whether the message should use RAG and retrieve its context if so.
+        In speculative mode, retrieval runs while the router is deciding and its
+        result is dropped if the router decides against RAG.
+        
+        Args:
+            message (str): The user's message
+            summaries (str): Concatenated summaries of all documents
+            timings (Dict[str, float]): Dict filled with the seconds spent in each stage
+            query_embedding (List[float], optional): Precomputed embedding of the message
+            
+        Returns:
+            Tuple[RoutingDecision, str, List[Dict[str, Any]]]: (decision, context, sources)
+        """
+        # A cached routing decision avoids embedding messages that skip RAG
+        start = time.perf_counter()
+        decision = self.router.cached_decision(message, summaries) if summaries else self.router.route(message, summaries)
+        retrieval = None
+        retrieval_timings = {}
+        if decision is None:
+            # Embed the message once, it is used both for routing and retrieval
+            if query_embedding is None:
+                query_embedding = self.vector_db.embed_query(message)
+                timings["query_embedding"] = time.perf_counter() - start
+            
+            if self.speculative_retrieval:
+                retrieval = self._executor.submit(
+                    self.vector_db.retrieve_context, message,
+                    query_embedding=query_embedding, timings=retrieval_timings
+                )
+            start = time.perf_counter()
+            decision = self.router.route(message, summaries, query_embedding=query_embedding)
+        timings["routing"] = time.perf_counter() - start
+        logger.debug("Routing decision: use_rag=%s via %s (similarity %s, confidence %s)",
+                     decision.use_rag, decision.path, decision.similarity, decision.confidence)
+        
+        if not decision.use_rag:
+            if retrieval is not None:
+                retrieval.cancel()  # The result is dropped if it already started
+            return decision, "", []
+        
+        # Time spent on retrieval after the decision (only the remaining wait in speculative mode)
+        start = time.perf_counter()
+        if retrieval is not None:
+            context, sources = retrieval.result()
+        else:
+            context, sources = self.vector_db.retrieve_context(
+                message, query_embedding=query_embedding, timings=retrieval_timings
+            )
+        timings.update(retrieval_timings)
+        timings["retrieval"] = time.perf_counter() - start
+        return decision, context, sources
+
+    async def _aroute_and_retrieve(self, message: str, summaries: str, timings: Dict[str, float],
+                                   query_embedding: Optional[List[float]] = None) -> Tuple[RoutingDecision, str, List[Dict[str, Any]]]:
+        """
+        Async version of `_route_and_retrieve`. In speculative mode retrieval runs
+        as a concurrent task while the router is deciding.
+        
+        Args:
+            message (str): The user's message
+            summaries (str): Concatenated summaries of all documents
+            timings (Dict[str, float]): Dict filled with the seconds spent in each stage
+            query_embedding (List[float], optional): Precomputed embedding of the message
+            
+        Returns:
+            Tuple[RoutingDecision, str, List[Dict[str, Any]]]: (decision, context, sources)
+        """
+        start = time.perf_counter()
+        decision = self.router.cached_decision(message, summaries) if summaries else await self.router.aroute(message, summaries)
+        retrieval = None
+        retrieval_timings = {}
+        if decision is None:
+            # Embed the message once, it is used both for routing and retrieval
+            if query_embedding is None:
+                query_embedding = await self.vector_db.aembed_query(message)
+                timings["query_embedding"] = time.perf_counter() - start
+            
+            if self.speculative_retrieval:
+                retrieval = asyncio.ensure_future(self.vector_db.aretrieve_context(
+                    message, query_embedding=query_embedding, timings=retrieval_timings
+                ))
+            start = time.perf_counter()
+            decision = await self.router.aroute(message, summaries, query_embedding=query_embedding)
+        timings["routing"] = time.perf_counter() - start
+        logger.debug("Routing decision: use_rag=%s via %s (similarity %s, confidence %s)",
+                     decision.use_rag, decision.path, decision.similarity, decision.confidence)
+        
+        if not decision.use_rag:
+            if retrieval is not None:
+                retrieval.cancel()
+            return decision, "", []
+        
+        # Time spent on retrieval after the decision (only the remaining wait in speculative mode)
+        start = time.perf_counter()
+        if retrieval is not None:
+            context, sources = await retrieval
+        else:
+            context, sources = await self.vector_db.aretrieve_context(
+                message, query_embedding=query_embedding, timings=retrieval_timings
+            )
+        timings.update(retrieval_timings)
+        timings["retrieval"] = time.perf_counter() - start
+        return decision, context, sources
+
+    def answer_cache_stats(self) -> Dict[str, Any]:
+        """
+        Statistics of the answer cache.
+        
+        Returns:
+            Dict[str, Any]: Entries, hits, misses, hit rate and seconds saved by hits (empty if the cache is disabled)
+        """
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """
+        LLM token usage of this session (routing, answers and memory summaries).
+        
+        Returns:
+            Dict[str, Any]: Calls, prompt, completion and total tokens, estimated cost in USD and budget, in total and per stage
+        """
+        return self.session_usage.report()
 
     def list_documents(self) -> List[str]:
         """
@@ -99,7 +548,7 @@ class GalteaChat:
         try:
             return self.vector_db.list_documents()
         except Exception as e:
-            print(f"Error listing documents: {str(e)}")
+            logger.error("Error listing documents: %s", e)
             return []
 
     def delete_document(self, filename: str) -> bool:
@@ -117,7 +566,7 @@ class GalteaChat:
                 raise ValueError("Filename cannot be empty")
             return self.vector_db.delete_document(filename)
         except Exception as e:
-            print(f"Error deleting document: {str(e)}")
+            logger.error("Error deleting document: %s", e)
             return False
 
     def reset(self) -> None:
@@ -128,5 +577,5 @@ class GalteaChat:
             self.chatbot.remove_context()
             self.chatbot.memory.reset_memory()
         except Exception as e:
-            print(f"Error resetting chatbot: {str(e)}")
+            logger.error("Error resetting chatbot: %s", e)
             raise
@@ -1,102 +1,387 @@
 # Import required libraries
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Tuple, Optional, Any
+from langchain.schema import Document
+from typing import List, Dict, Tuple, Optional, Any, Iterable
+from bisect import bisect_left
 import os
 import json
-from .utils import summarize_document
+import time
+import hashlib
+import asyncio
+import logging
+from threading import Lock, RLock
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .utils import summarize_document, asummarize_document, StreamingSummarizer
+from .cache import LRUCache
+from .clients import get_embeddings
+from .registry import DocumentRegistry, CHUNKS_PER_PAGE, file_content_hash, text_hash, make_chunk_id, make_document_id
+from .embedding_cache import CachedEmbeddings
+from .backends import make_vector_backend
+from .lexical import BM25Index, is_identifier_query, reciprocal_rank_fusion
+from .ingest import IngestPipeline
+from .packer import CONTEXT_SEPARATOR
+from .config import (
+    CHUNK_INDEX_CACHE_SIZE,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_BYTES,
+    SUMMARY_MAX_WORKERS,
+    VECTOR_BACKEND,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    STREAMING_INGEST_MIN_BYTES,
+    STREAMING_BATCH_SIZE,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    RETRIEVAL_CACHE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chroma rejects writes larger than its max batch size (~5k records)
+MAX_WRITE_BATCH_SIZE = 4096
 
 # Class to handle vector database logic
 class VectorDB:
-    def __init__(self, persist_directory: str = "db"):
+    def __init__(self, persist_directory: str = "db", backend: str = VECTOR_BACKEND):
         """
         Initialize the vector store with:
         - a persistence directory to save vectors
         - a sentence-transformer model for embedding
-        - a Chroma store to persist vectorized documents
+        - a vector backend (Chroma or the NumPy index) to persist vectorized documents
         - a text splitter to chunk text
         """
         self.persist_directory = persist_directory
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = get_embeddings(EMBEDDING_MODEL_NAME)
+        if EMBEDDING_CACHE_PATH:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_BYTES
+            )
         self.summaries_file = os.path.join(persist_directory, "document_summaries.json")
         
         os.makedirs(self.persist_directory, exist_ok=True)
         
-        # Load existing summaries if available
-        self.document_summaries = self._load_summaries()
+        # Load the document registry (filename -> source, chunk ids, content hash, summary)
+        self.registry = DocumentRegistry(os.path.join(persist_directory, "document_registry.sqlite"))
         
         # Create or load the vector store from the given directory
-        self.vector_store = Chroma(
-            collection_name="example_collection",
-            embedding_function=self.embeddings, 
-            persist_directory=self.persist_directory
-        )
+        self.vector_store = make_vector_backend(backend, self.persist_directory, self.embeddings)
+        
+        # BM25 index of the chunks, for exact terms (part numbers, specs, intervals) dense search misses
+        self.lexical_index = BM25Index(os.path.join(persist_directory, "bm25_index.sqlite"))
+        
         # Split long text into overlapping chunks
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
         
-        # If we have documents but no summaries, regenerate them
-        if len(self.document_summaries) == 0:
-            self._regenerate_summaries()
+        # Ordered chunk sequence per source: source -> (sorted chunk indices, chunk texts)
+        self._chunk_index_cache = LRUCache(max_size=CHUNK_INDEX_CACHE_SIZE)
+        
+        # Serializes registry updates from concurrent ingests
+        self._write_lock = RLock()
+        
+        # Report of the last `upload_documents` run
+        self.last_ingest_report: Dict[str, Any] = {}
+        
+        # Bumped on every write to the collection, so caches of query results can tell they are stale
+        self.version = 0
+        
+        # Query text -> embedding, and (query or embedding, k, window, mode, version) -> (context, sources)
+        self._query_embedding_cache = LRUCache(max_size=QUERY_EMBEDDING_CACHE_SIZE)
+        self._retrieval_cache = LRUCache(max_size=RETRIEVAL_CACHE_SIZE)
+        self._query_cache_stats = {"embedding_hits": 0, "embedding_misses": 0, "retrieval_hits": 0, "retrieval_misses": 0}
+        
+        # Normalized summary embedding and chunk centroid per document, used by the RAG router
+        self.document_vectors_file = os.path.join(persist_directory, "document_vectors.npz")
+        self._document_vectors = self._load_document_vectors()
+        self._document_matrix = None
+        self._document_vectors_lock = Lock()
+        self._document_vectors_dirty = False
+        
+        # If the collection predates the registry, build it once from the vector store
+        if not self.registry.exists:
+            self._rebuild_registry()
+        
+        # Same for the lexical index
+        if not self.lexical_index.exists and len(self.registry):
+            self._rebuild_lexical_index()
     
-    def _load_summaries(self) -> Dict[str, str]:
-        """Load document summaries from disk."""
+    def _load_legacy_summaries(self) -> Dict[str, str]:
+        """Load document summaries saved by versions that predate the registry."""
         if os.path.exists(self.summaries_file):
             try:
                 with open(self.summaries_file, 'r') as f:
                     return json.load(f)
             except Exception as e:
-                print(f"Error loading summaries: {str(e)}")
+                logger.error("Error loading summaries: %s", e)
         return {}
     
-    def _save_summaries(self) -> None:
-        """Save document summaries to disk."""
-        try:
-            with open(self.summaries_file, 'w') as f:
-                json.dump(self.document_summaries, f)
-        except Exception as e:
-            print(f"Error saving summaries: {str(e)}")
-    
-    def _regenerate_summaries(self) -> None:
-        """Regenerate summaries for all documents in the vector store."""
+    def _rebuild_registry(self) -> None:
+        """
+        Rebuild the document registry from the chunk metadata in the vector store,
+        reusing legacy summaries and regenerating the missing ones.
+        """
         try:
-            results = self.vector_store.get()
-            unique_sources = set()
+            results = self.vector_store.get(include=["metadatas"])
+            summaries = self._load_legacy_summaries()
             
-            # Get unique document sources
-            for metadata in results['metadatas']:
+            # Group chunk ids by document filename
+            ids_by_filename = {}
+            sources = {}
+            for chunk_id, metadata in zip(results['ids'], results['metadatas']):
                 if 'source' in metadata:
-                    unique_sources.add(metadata['source'])
-            
-            # Generate summaries for each document
-            for source in unique_sources:
-                filename = os.path.basename(source)
-                if filename not in self.document_summaries:
-                    # Get all chunks for this document
-                    doc_chunks = []
-                    for i, metadata in enumerate(results['metadatas']):
-                        if metadata.get('source') == source:
-                            doc_chunks.append(results['documents'][i])
-                    
-                    # Generate summary
-                    full_text = " ".join(doc_chunks)
-                    summary = summarize_document(full_text)
-                    self.document_summaries[filename] = summary
-            
-            # Save the regenerated summaries
-            self._save_summaries()
+                    filename = os.path.basename(metadata['source'])
+                    ids_by_filename.setdefault(filename, []).append(chunk_id)
+                    sources[filename] = metadata['source']
+                    # Chunks written before summaries moved to the registry carry a copy of it
+                    if metadata.get('document_summary'):
+                        summaries.setdefault(filename, metadata['document_summary'])
+            
+            # Generate the missing summaries from the documents' ordered chunks, concurrently
+            def regenerate_summary(filename: str) -> str:
+                source = sources[filename]
+                _, doc_chunks = self._get_chunk_sequences([source])[source]
+                return summarize_document(" ".join(doc_chunks))
+            
+            missing = [filename for filename in ids_by_filename if filename not in summaries]
+            if missing:
+                with ThreadPoolExecutor(max_workers=min(SUMMARY_MAX_WORKERS, len(missing))) as pool:
+                    summaries.update(zip(missing, pool.map(regenerate_summary, missing)))
+            
+            self.registry.clear()
+            for filename, chunk_ids in ids_by_filename.items():
+                self.registry.add(filename, sources[filename], chunk_ids, summary=summaries[filename])
+            
+            self.registry.save()
             
         except Exception as e:
-            print(f"Error regenerating summaries: {str(e)}")
+            logger.error("Error rebuilding document registry: %s", e)
     
-    def upload_document(self, path_to_single_document: str) -> bool:
+    def _rebuild_lexical_index(self, batch_size: int = MAX_WRITE_BATCH_SIZE) -> None:
+        """Build the lexical index from the chunks in the vector store."""
+        try:
+            self.lexical_index.clear()
+            offset = 0
+            while True:
+                batch = self.vector_store.get(include=["documents"], limit=batch_size, offset=offset)
+                if not batch["ids"]:
+                    break
+                self.lexical_index.add(batch["ids"], batch["documents"])
+                offset += len(batch["ids"])
+            self.lexical_index.save()
+        except Exception as e:
+            logger.error("Error rebuilding lexical index: %s", e)
+
+    def _load_document_vectors(self) -> Dict[str, np.ndarray]:
+        """Load the routing vectors of each document from disk."""
+        if os.path.exists(self.document_vectors_file):
+            try:
+                with np.load(self.document_vectors_file) as data:
+                    return {filename: data[filename] for filename in data.files}
+            except Exception as e:
+                logger.error("Error loading document vectors: %s", e)
+        return {}
+
+    def _save_document_vectors(self) -> None:
+        """Save the routing vectors of each document to disk."""
+        with self._document_vectors_lock:
+            vectors = dict(self._document_vectors)
+            self._document_vectors_dirty = False
+        try:
+            with open(self.document_vectors_file, 'wb') as f:
+                np.savez(f, **vectors)
+        except Exception as e:
+            logger.error("Error saving document vectors: %s", e)
+
+    @staticmethod
+    def _routing_vectors(summary_vector: Optional[List[float]], chunk_vectors: List[Any]) -> Optional[np.ndarray]:
+        """
+        Stack the routing vectors of a document: the embedding of its summary and the centroid
+        of its chunk embeddings, both L2-normalized.
+        
+        Args:
+            summary_vector (List[float], optional): Embedding of the summary
+            chunk_vectors (List[Any]): Embeddings of the chunks
+            
+        Returns:
+            Optional[np.ndarray]: Matrix of one or two rows, None if there is nothing to route on
+        """
+        vectors = []
+        if summary_vector is not None:
+            vectors.append(np.asarray(summary_vector, dtype=np.float32))
+        if len(chunk_vectors) > 0:
+            centroid = np.mean(np.asarray(chunk_vectors, dtype=np.float32), axis=0)
+            # A backend storing only truncated vectors cannot be compared with full query embeddings
+            if not vectors or len(centroid) == len(vectors[0]):
+                vectors.append(centroid)
+        if not vectors:
+            return None
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+    def _plan_document_vectors(self, plan: Dict[str, Any], summary_vector: Optional[List[float]],
+                               embeddings: List[List[float]]) -> Optional[np.ndarray]:
+        """
+        Compute the routing vectors of a planned document before it is written, so writes never
+        wait on an embedding call: the centroid is taken over the new chunk embeddings and the
+        stored vectors of the unchanged chunks.
+        
+        Args:
+            plan (Dict[str, Any]): Plan built by `_plan_document`
+            summary_vector (List[float], optional): Embedding of the document summary
+            embeddings (List[List[float]]): Embeddings of the plan's new chunks
+            
+        Returns:
+            Optional[np.ndarray]: The routing vectors, None if the document has none
+        """
+        new_ids = set(plan["ids"])
+        kept_ids = [chunk_id for page in plan["pages"].values() for chunk_id in page["chunk_ids"] if chunk_id not in new_ids]
+        chunk_vectors = list(embeddings)
+        if kept_ids:
+            chunk_vectors.extend(self.vector_store.get(ids=kept_ids, include=["embeddings"])["embeddings"])
+        if not chunk_vectors:
+            return None
+        # Only average vectors of the same (full) dimension
+        dimension = max(len(vector) for vector in chunk_vectors)
+        chunk_vectors = [vector for vector in chunk_vectors if len(vector) == dimension]
+        return self._routing_vectors(summary_vector, chunk_vectors)
+
+    def _set_document_vectors(self, filename: str, matrix: Optional[np.ndarray]) -> None:
+        """Replace the routing vectors of a document in memory (None drops them, to be computed on demand)."""
+        with self._document_vectors_lock:
+            if matrix is None:
+                self._document_vectors.pop(filename, None)
+            else:
+                self._document_vectors[filename] = matrix
+            self._document_matrix = None
+            self._document_vectors_dirty = True
+
+    def _index_document_vectors(self, filename: str) -> None:
+        """
+        Compute the routing vectors of a registered document from its summary and stored chunks.
+        
+        Args:
+            filename (str): Name of the document
+        """
+        entry = self.registry.get(filename)
+        if not entry or not entry["chunk_ids"]:
+            return
+        
+        summary_vector = self.embeddings.embed_query(entry["summary"]) if entry.get("summary") else None
+        results = self.vector_store.get(ids=entry["chunk_ids"], include=["embeddings"])
+        matrix = self._routing_vectors(summary_vector, results["embeddings"])
+        if matrix is not None:
+            self._set_document_vectors(filename, matrix)
+
+    def _remove_document_vectors(self, filename: str) -> None:
+        """Drop the routing vectors of a document."""
+        with self._document_vectors_lock:
+            removed = self._document_vectors.pop(filename, None) is not None
+            if removed:
+                self._document_matrix = None
+        if removed:
+            self._save_document_vectors()
+
+    def get_document_vectors(self) -> np.ndarray:
+        """
+        Get the normalized routing vectors (summary embeddings and chunk centroids)
+        of all documents as one matrix, computing the missing ones first.
+        
+        Returns:
+            np.ndarray: Matrix of shape (n_vectors, dim), empty if there are no documents
+        """
+        missing = [filename for filename in self.registry.filenames() if filename not in self._document_vectors]
+        if missing:
+            for filename in missing:
+                try:
+                    self._index_document_vectors(filename)
+                except Exception as e:
+                    logger.error("Error indexing vectors of %s: %s", filename, e)
+            self._save_document_vectors()
+        
+        with self._document_vectors_lock:
+            if self._document_matrix is None:
+                if self._document_vectors:
+                    self._document_matrix = np.concatenate(list(self._document_vectors.values()))
+                else:
+                    self._document_matrix = np.zeros((0, 0), dtype=np.float32)
+            return self._document_matrix
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the same model used for the documents.
+        Recent queries are answered from memory.
+        
+        Args:
+            query (str): The search query
+            
+        Returns:
+            List[float]: The query embedding
+        """
+        embedding = self._cached_query_embedding(query)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+            self._query_embedding_cache.put(query, embedding)
+        return embedding
+
+    def _cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        """Look up the in-memory query embedding cache, counting hits and misses."""
+        embedding = self._query_embedding_cache.get(query)
+        self._query_cache_stats["embedding_hits" if embedding is not None else "embedding_misses"] += 1
+        return embedding
+
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get the hit/miss counters of the in-memory query embedding and retrieval caches.
+        
+        Returns:
+            Dict[str, Any]: Counters and current number of entries of both caches
+        """
+        return {
+            **self._query_cache_stats,
+            "embedding_entries": len(self._query_embedding_cache),
+            "retrieval_entries": len(self._retrieval_cache),
+        }
+
+    def embedding_cache_stats(self) -> Dict[str, Any]:
         """
-        Load a single PDF document, split it into chunks, and add them to the vector store.
-        Adds 'chunk_idx' metadata to each chunk for tracking and reordering.
+        Get the hit/miss counters of the embedding cache.
+        
+        Returns:
+            Dict[str, Any]: Cache counters, empty if the cache is disabled
+        """
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.stats()
+        return {}
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """
+        Async version of `embed_query`.
+        
+        Args:
+            query (str): The search query
+            
+        Returns:
+            List[float]: The query embedding
+        """
+        embedding = self._cached_query_embedding(query)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(query)
+            self._query_embedding_cache.put(query, embedding)
+        return embedding
+
+    def upload_document(self, path_to_single_document: str, streaming: Optional[bool] = None) -> bool:
+        """
+        Load a single PDF document, split it into chunks, and upsert them into the vector store.
+        Chunks get a 'chunk_idx' metadata for tracking and reordering, and a deterministic id
+        derived from the filename and chunk_idx. Unchanged files are skipped, and only the
+        chunks of changed pages are replaced.
         
         Args:
             path_to_single_document (str): Path to the PDF file
+            streaming (bool, optional): Ingest page by page with constant memory (see `_stream_document`).
+                By default files of at least STREAMING_INGEST_MIN_BYTES are streamed.
             
         Returns:
             bool: True if successful, False otherwise
@@ -104,40 +389,374 @@ class VectorDB:
         try:
             if not os.path.exists(path_to_single_document):
                 raise FileNotFoundError(f"Document not found: {path_to_single_document}")
+            
+            content_hash = file_content_hash(path_to_single_document)
+            if self._is_indexed(path_to_single_document, content_hash):
+                logger.info("Document unchanged, skipping: %s", path_to_single_document)
+                return True
+            
+            if self._use_streaming(path_to_single_document, streaming):
+                return self._stream_document(path_to_single_document, content_hash)
                 
-            loader = PyPDFLoader(path_to_single_document, mode="single")
-            documents = loader.load()
+            pages = self._load_document(path_to_single_document)
+            plan = self._plan_document(path_to_single_document, pages, content_hash)
             
-            # Generate a consolidated summary of the entire document
-            full_text = " ".join([doc.page_content for doc in documents])
-            document_summary = summarize_document(full_text)
+            # Generate a consolidated summary of the entire document if its text changed
+            document_summary = plan["summary"]
+            if plan["changed"]:
+                full_text = " ".join([page.page_content for page in pages])
+                document_summary = summarize_document(full_text)
             
-            # Store the summary with the document filename as key
-            filename = os.path.basename(path_to_single_document)
-            self.document_summaries[filename] = document_summary
-            self._save_summaries()  # Save summaries after updating
+            return self._apply_plan(plan, document_summary)
             
-            # Split the document into chunks
-            docs = self.text_splitter.split_documents(documents)
+        except Exception as e:
+            logger.error("Error uploading document %s: %s", path_to_single_document, e)
+            return False
 
-            for idx, doc in enumerate(docs):
-                # Add metadata including the document summary
-                doc.metadata["chunk_idx"] = idx
-                doc.metadata["document_summary"] = document_summary
-                
-            # Store docs into Chroma - persistence is automatic now
-            if len(docs) > 0:
-                self.vector_store.add_documents(docs)
+    async def aupload_document(self, path_to_single_document: str, streaming: Optional[bool] = None) -> bool:
+        """
+        Async version of `upload_document`. Hashing, PDF parsing, chunking and vector store
+        writes run in worker threads, the summary uses the async client.
+        
+        Args:
+            path_to_single_document (str): Path to the PDF file
+            streaming (bool, optional): Ingest page by page with constant memory, in a worker thread
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if not os.path.exists(path_to_single_document):
+                raise FileNotFoundError(f"Document not found: {path_to_single_document}")
+            
+            content_hash = await asyncio.to_thread(file_content_hash, path_to_single_document)
+            if await asyncio.to_thread(self._is_indexed, path_to_single_document, content_hash):
+                logger.info("Document unchanged, skipping: %s", path_to_single_document)
                 return True
-            return False
+            
+            if self._use_streaming(path_to_single_document, streaming):
+                return await asyncio.to_thread(self._stream_document, path_to_single_document, content_hash)
+            
+            pages = await asyncio.to_thread(self._load_document, path_to_single_document)
+            plan = await asyncio.to_thread(self._plan_document, path_to_single_document, pages, content_hash)
+            
+            # Generate a consolidated summary of the entire document if its text changed
+            document_summary = plan["summary"]
+            if plan["changed"]:
+                full_text = " ".join([page.page_content for page in pages])
+                document_summary = await asummarize_document(full_text)
+            
+            return await asyncio.to_thread(self._apply_plan, plan, document_summary)
             
         except Exception as e:
-            print(f"Error uploading document {path_to_single_document}: {str(e)}")
+            logger.error("Error uploading document %s: %s", path_to_single_document, e)
             return False
+
+    def _load_document(self, path_to_single_document: str) -> List[Document]:
+        """Load a PDF document as one LangChain document per page."""
+        loader = PyPDFLoader(path_to_single_document, mode="page")
+        return loader.load()
+
+    def _use_streaming(self, path_to_single_document: str, streaming: Optional[bool] = None) -> bool:
+        """Whether to ingest a file in streaming mode: as requested, otherwise if it is large."""
+        if streaming is not None:
+            return streaming
+        return os.path.getsize(path_to_single_document) >= STREAMING_INGEST_MIN_BYTES
+
+    def _is_indexed(self, path_to_single_document: str, content_hash: str) -> bool:
+        """Check if the file is already indexed from the same path with the same content."""
+        entry = self.registry.get(os.path.basename(path_to_single_document))
+        return bool(
+            entry
+            and entry.get("content_hash") == content_hash
+            and entry.get("source") == path_to_single_document
+            and entry.get("pages") is not None
+        )
+
+    def _plan_document(self, path_to_single_document: str, pages: List[Document], content_hash: str) -> Dict[str, Any]:
+        """
+        Compare the pages of a document against its registry entry and work out which
+        chunks must be written and which must be deleted.
+        
+        Args:
+            path_to_single_document (str): Path to the PDF file
+            pages (List[Document]): The loaded pages
+            content_hash (str): SHA-256 of the file content
+            
+        Returns:
+            Dict[str, Any]: The ingest plan: chunks to upsert with their ids, ids to delete,
+            new page index, previous summary and whether anything changed
+        """
+        filename = os.path.basename(path_to_single_document)
+        entry = self.registry.get(filename) or {}
+        
+        # Chunks of a document indexed from another path (or before page hashes) are all replaced
+        old_pages = (entry.get("pages") or {}) if entry.get("source") == path_to_single_document else {}
+        
+        new_pages = {}
+        docs, ids = [], []
+        carry = ""
+        for page_doc in pages:
+            page, page_hash, page_chunks, page_ids = self._split_page(filename, page_doc, carry, old_pages)
+            carry = self._overlap_tail(carry, page_doc.page_content)
+            new_pages[str(page)] = {"hash": page_hash, "chunk_ids": page_ids}
+            if page_chunks:
+                docs.extend(page_chunks)
+                ids.extend(page_ids)
+        
+        # Old chunks that are not overwritten are orphans
+        kept_ids = {chunk_id for page in new_pages.values() for chunk_id in page["chunk_ids"]}
+        ids_to_delete = [chunk_id for chunk_id in entry.get("chunk_ids", []) if chunk_id not in kept_ids]
+        
+        return {
+            "filename": filename,
+            "source": path_to_single_document,
+            "content_hash": content_hash,
+            "pages": new_pages,
+            "docs": docs,
+            "ids": ids,
+            "delete": ids_to_delete,
+            "summary": entry.get("summary"),
+            "changed": bool(docs or ids_to_delete) or not entry,
+        }
+
+    def _split_page(self, filename: str, page_doc: Document, carry: str,
+                    old_pages: Dict[str, Any]) -> Tuple[int, str, List[Document], List[str]]:
+        """
+        Split a page into chunks, prefixed with the splitter overlap carried from the previous page.
+        Pages whose text (including the carried overlap) is unchanged are not split again.
+        
+        Args:
+            filename (str): Filename of the document
+            page_doc (Document): The page
+            carry (str): Tail of the previous pages, up to the splitter overlap
+            old_pages (Dict[str, Any]): Page index of the indexed version of the document
+            
+        Returns:
+            Tuple[int, str, List[Document], List[str]]: Page number, page hash, new chunks and
+            the ids of the page's chunks (the previous ids if the page is unchanged)
+        """
+        page = int(page_doc.metadata.get("page", 0))
+        text = carry + page_doc.page_content if page_doc.page_content.strip() else ""
+        page_hash = text_hash(text)
+        old_page = old_pages.get(str(page))
+        if old_page and old_page["hash"] == page_hash:
+            return page, page_hash, [], old_page["chunk_ids"]
+        
+        page_chunks = self.text_splitter.split_documents([Document(page_content=text, metadata=page_doc.metadata)])
+        page_ids = []
+        document_id = make_document_id(filename)
+        for position, doc in enumerate(page_chunks):
+            chunk_idx = page * CHUNKS_PER_PAGE + position
+            doc.metadata["chunk_idx"] = chunk_idx
+            # The summary is stored once in the registry, chunks only reference their document
+            doc.metadata["document_id"] = document_id
+            page_ids.append(make_chunk_id(filename, chunk_idx))
+        return page, page_hash, page_chunks, page_ids
+
+    def _overlap_tail(self, carry: str, text: str) -> str:
+        """
+        The splitter overlap to carry into the next page: at most chunk_overlap characters
+        from the end of the text so far, starting and ending on a word boundary.
+        """
+        overlap = self.text_splitter._chunk_overlap
+        if not overlap:
+            return ""
+        text = carry + text + " "
+        tail = text[-overlap:]
+        if len(text) > overlap and not text[-overlap - 1].isspace():
+            tail = tail[tail.find(" ") + 1:]
+        return tail
+
+    def _stream_document(self, path_to_single_document: str, content_hash: str,
+                         batch_size: int = STREAMING_BATCH_SIZE) -> bool:
+        """
+        Ingest a PDF page by page with memory bounded by the batch size instead of the document size.
+        Pages are extracted lazily and chunked as they arrive (with the splitter overlap carried
+        across page boundaries), new chunks are embedded and written every `batch_size` chunks,
+        and the summary is built from section summaries as the text goes by.
+        
+        Args:
+            path_to_single_document (str): Path to the PDF file
+            content_hash (str): SHA-256 of the file content
+            batch_size (int): Chunks embedded and written at once
+            
+        Returns:
+            bool: True if the document has chunks, False if it is empty
+        """
+        filename = os.path.basename(path_to_single_document)
+        entry = self.registry.get(filename) or {}
+        old_pages = (entry.get("pages") or {}) if entry.get("source") == path_to_single_document else {}
+        
+        new_pages = {}
+        docs, ids = [], []
+        written = 0
+        carry = ""
+        summarizer = StreamingSummarizer()
+        try:
+            for page_doc in PyPDFLoader(path_to_single_document, mode="page").lazy_load():
+                summarizer.add(page_doc.page_content)
+                page, page_hash, page_chunks, page_ids = self._split_page(filename, page_doc, carry, old_pages)
+                carry = self._overlap_tail(carry, page_doc.page_content)
+                new_pages[str(page)] = {"hash": page_hash, "chunk_ids": page_ids}
+                if page_chunks:
+                    docs.extend(page_chunks)
+                    ids.extend(page_ids)
+                
+                # Flush full batches
+                while len(docs) >= batch_size:
+                    self._write_batch(ids[:batch_size], docs[:batch_size])
+                    written += batch_size
+                    ids, docs = ids[batch_size:], docs[batch_size:]
+            if docs:
+                self._write_batch(ids, docs)
+                written += len(docs)
+            
+            kept_ids = {chunk_id for page in new_pages.values() for chunk_id in page["chunk_ids"]}
+            ids_to_delete = [chunk_id for chunk_id in entry.get("chunk_ids", []) if chunk_id not in kept_ids]
+            changed = bool(written or ids_to_delete) or not entry
+            document_summary = summarizer.summary() if changed else entry.get("summary")
+        finally:
+            summarizer.close()
+        
+        # Register the document; its chunks are already written
+        plan = {
+            "filename": filename,
+            "source": path_to_single_document,
+            "content_hash": content_hash,
+            "pages": new_pages,
+            "docs": [],
+            "ids": [],
+            "delete": ids_to_delete,
+            "summary": entry.get("summary"),
+            "changed": changed,
+        }
+        return self._apply_plan(plan, document_summary)
+
+    def _write_batch(self, ids: List[str], docs: List[Document]) -> None:
+        """Embed and upsert one batch of chunks."""
+        self._upsert_chunks(ids, docs, self.embeddings.embed_documents([doc.page_content for doc in docs]))
+        self._bump_version()
+
+    def _bump_version(self) -> None:
+        """Mark the collection as changed, dropping the retrieval results computed before."""
+        with self._write_lock:
+            self.version += 1
+            self._retrieval_cache.clear()
+
+    def _apply_plan(self, plan: Dict[str, Any], document_summary: Optional[str]) -> bool:
+        """
+        Write an ingest plan to the vector store and the registry.
+        
+        Args:
+            plan (Dict[str, Any]): Plan built by `_plan_document`
+            document_summary (str, optional): Summary of the document
+            
+        Returns:
+            bool: True if the document has chunks, False if it is empty
+        """
+        # Embed the new chunks and the routing vectors before taking the write lock
+        embeddings = self.embeddings.embed_documents([doc.page_content for doc in plan["docs"]]) if plan["docs"] else []
+        if plan["changed"]:
+            summary_vector = self.embeddings.embed_query(document_summary) if document_summary else None
+            plan["document_vectors"] = self._plan_document_vectors(plan, summary_vector, embeddings)
+        return self._apply_plans([(plan, document_summary, embeddings)])[0]
+
+    def _apply_plans(self, items: List[Tuple[Dict[str, Any], Optional[str], Optional[List[List[float]]]]],
+                     persist: bool = True) -> List[bool]:
+        """
+        Write several ingest plans with one batched vector store write, then register the documents.
+        
+        Args:
+            items: (plan built by `_plan_document`, document summary, chunk embeddings or None to compute them)
+            persist (bool): Save the registry, the lexical index and the routing vectors. Ingest runs
+                write batches without saving and call `persist` once at the end.
+            
+        Returns:
+            List[bool]: For each plan, True if the document has chunks, False if it is empty
+        """
+        with self._write_lock:
+            results = []
+            written = []
+            emptied = []  # Plans whose new version has no chunks: the previous one is removed
+            ids_to_delete, ids, docs, vectors = [], [], [], []
+            for plan, document_summary, embeddings in items:
+                pages = plan["pages"]
+                chunk_ids = [chunk_id for page in sorted(pages, key=int) for chunk_id in pages[page]["chunk_ids"]]
+                results.append(bool(chunk_ids))
+                if not chunk_ids:
+                    ids_to_delete.extend(plan["delete"])
+                    emptied.append(plan)
+                    continue
+            
+                if embeddings is None:
+                    embeddings = self.embeddings.embed_documents([doc.page_content for doc in plan["docs"]]) if plan["docs"] else []
+            
+                ids_to_delete.extend(plan["delete"])
+                ids.extend(plan["ids"])
+                docs.extend(plan["docs"])
+                vectors.extend(embeddings)
+                written.append((plan, document_summary, chunk_ids))
+            
+            # Replace the changed chunks in Chroma - persistence is automatic now
+            if ids_to_delete:
+                self.vector_store.delete(ids=ids_to_delete)
+                self.lexical_index.remove(ids_to_delete)
+            if docs:
+                self._upsert_chunks(ids, docs, vectors)
+            
+            for plan, document_summary, chunk_ids in written:
+                self._chunk_index_cache.pop(plan["source"])
+            
+                # Register the document with the filename as key
+                self.registry.add(
+                    plan["filename"],
+                    plan["source"],
+                    chunk_ids,
+                    content_hash=plan["content_hash"],
+                    summary=document_summary,
+                    pages=plan["pages"]
+                )
+            for plan in emptied:
+                self._chunk_index_cache.pop(plan["source"])
+                self.registry.remove(plan["filename"])
+                self._set_document_vectors(plan["filename"], None)
+            if written or ids_to_delete:
+                self._bump_version()
+            
+            # Vectors used to route queries to the changed documents, computed with their plans
+            # (plans without them get theirs on demand, in `get_document_vectors`)
+            for plan, _, _ in written:
+                if plan["changed"]:
+                    self._set_document_vectors(plan["filename"], plan.get("document_vectors"))
+            if (written or emptied) and persist:
+                self.persist()
+            return results
+
+    def persist(self) -> None:
+        """Save the registry, lexical index and routing vector changes made since the last save."""
+        with self._write_lock:
+            self.registry.save()
+            self.lexical_index.save()
+            if self._document_vectors_dirty:
+                self._save_document_vectors()
+
+    def _upsert_chunks(self, ids: List[str], docs: List[Document], embeddings: List[List[float]]) -> None:
+        """Upsert chunks with precomputed embeddings into the vector store (in batches Chroma accepts) and the lexical index."""
+        for start in range(0, len(ids), MAX_WRITE_BATCH_SIZE):
+            end = start + MAX_WRITE_BATCH_SIZE
+            self.vector_store.add(
+                ids[start:end],
+                [doc.page_content for doc in docs[start:end]],
+                embeddings[start:end],
+                [doc.metadata for doc in docs[start:end]]
+            )
+        self.lexical_index.add(ids, [doc.page_content for doc in docs])
         
     def upload_documents(self, documents_paths: List[str]) -> bool:
         """
-        Upload multiple PDF documents from a list of paths.
+        Upload multiple PDF documents from a list of paths through the parallel ingest pipeline.
+        The report of the run is kept in `last_ingest_report`.
         
         Args:
             documents_paths (List[str]): List of paths to PDF files
@@ -146,16 +765,31 @@ class VectorDB:
             bool: True if all documents were uploaded successfully, False otherwise
         """
         try:
-            success = True
-            for path in documents_paths:
-                if not self.upload_document(path):
-                    success = False
-            return success
+            self.last_ingest_report = self.ingest_documents(documents_paths)
+            return all(result["status"] in ("indexed", "unchanged") for result in self.last_ingest_report["files"])
         except Exception as e:
-            print(f"Error uploading documents: {str(e)}")
+            logger.error("Error uploading documents: %s", e)
             return False
+
+    def ingest_documents(self, documents_paths: List[str], **options: Any) -> Dict[str, Any]:
+        """
+        Ingest PDF documents with the pipelined ingest engine: PDFs are parsed in a
+        process pool, summaries and embedding batches run in thread pools and the
+        vector store writes are batched across documents.
+        
+        Args:
+            documents_paths (List[str]): List of paths to PDF files
+            **options: Overrides of the IngestPipeline settings (parse_workers, embed_workers, ...)
             
-    def retrieve_context(self, query: str, k: int = 3, chunk_window_size: int = 2) -> Tuple[str, List[Dict[str, Any]]]:
+        Returns:
+            Dict[str, Any]: Report with per-stage throughput and a result per file
+        """
+        return IngestPipeline(self, **options).run(documents_paths)
+            
+    def retrieve_context(self, query: str, k: int = 3, chunk_window_size: int = 2,
+                         query_embedding: Optional[List[float]] = None,
+                         timings: Optional[Dict[str, float]] = None,
+                         mode: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
         """
         Retrieve top-k most relevant chunks for the query, and expand them with nearby chunks.
         Also return a short source preview for reference.
@@ -164,20 +798,161 @@ class VectorDB:
             query (str): The search query
             k (int): Number of top chunks to retrieve
             chunk_window_size (int): Number of nearby chunks to include
+            query_embedding (List[float], optional): Precomputed embedding of the query
+            timings (Dict[str, float], optional): Dict filled with the seconds spent in each stage
+            mode (str, optional): "hybrid" (BM25 and vector search fused with RRF), "vector" or
+                "lexical" (BM25 only, no embedding call). Defaults to RETRIEVAL_MODE, and to
+                "lexical" for identifier-like queries.
             
         Returns:
             Tuple[str, List[Dict[str, Any]]]: (context, sources)
         """
+        if timings is None:
+            timings = {}
+        mode = self._retrieval_mode(query, mode)
         try:
-            docs = self.vector_store.similarity_search(query, k=k)
-            joined_chunks = []
-            for doc in docs:
-                joined_chunks.append(self._search_nearby_chunks(doc, chunk_window_size))
-            context = "\n\n---\n\n".join(joined_chunks)
+            if query_embedding is None and mode != "lexical":
+                start = time.perf_counter()
+                query_embedding = self.embed_query(query)
+                timings["query_embedding"] = time.perf_counter() - start
+        except Exception as e:
+            logger.error("Error retrieving context: %s", e)
+            return "", []
+        return self._retrieve(query, query_embedding, k, chunk_window_size, mode, timings)
+
+    async def aretrieve_context(self, query: str, k: int = 3, chunk_window_size: int = 2,
+                                query_embedding: Optional[List[float]] = None,
+                                timings: Optional[Dict[str, float]] = None,
+                                mode: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Async version of `retrieve_context`. The query is embedded with the async
+        client and the searches run in a worker thread.
+        
+        Args:
+            query (str): The search query
+            k (int): Number of top chunks to retrieve
+            chunk_window_size (int): Number of nearby chunks to include
+            query_embedding (List[float], optional): Precomputed embedding of the query
+            timings (Dict[str, float], optional): Dict filled with the seconds spent in each stage
+            mode (str, optional): "hybrid", "vector" or "lexical" (see `retrieve_context`)
+            
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: (context, sources)
+        """
+        if timings is None:
+            timings = {}
+        mode = self._retrieval_mode(query, mode)
+        try:
+            if query_embedding is None and mode != "lexical":
+                start = time.perf_counter()
+                query_embedding = await self.aembed_query(query)
+                timings["query_embedding"] = time.perf_counter() - start
+        except Exception as e:
+            logger.error("Error retrieving context: %s", e)
+            return "", []
+        return await asyncio.to_thread(self._retrieve, query, query_embedding, k, chunk_window_size, mode, timings)
+
+    def _retrieval_mode(self, query: str, mode: Optional[str] = None) -> str:
+        """Pick the retrieval mode: as requested, lexical-only for identifier-like queries, otherwise RETRIEVAL_MODE."""
+        if mode is not None:
+            return mode
+        if is_identifier_query(query):
+            return "lexical"
+        return RETRIEVAL_MODE
+
+    def _search(self, query: str, query_embedding: Optional[List[float]], k: int, mode: str,
+                timings: Dict[str, float]) -> List[Tuple[Document, float]]:
+        """
+        Find the top-k chunks for a query with the given retrieval mode, with their relevance scores
+        (higher is more relevant): cosine similarity in vector mode, BM25 in lexical mode and the
+        fused reciprocal rank score in hybrid mode.
+        
+        Args:
+            query (str): The search query
+            query_embedding (List[float], optional): Embedding of the query (unused in lexical mode)
+            k (int): Number of chunks to return
+            mode (str): "hybrid", "vector" or "lexical"
+            timings (Dict[str, float]): Dict filled with the seconds spent in each search
+            
+        Returns:
+            List[Tuple[Document, float]]: (chunk, score), best first
+        """
+        if mode == "vector":
+            start = time.perf_counter()
+            # Embeddings are normalized, so the squared L2 distance is 2 - 2 * cosine similarity
+            results = [(doc, 1.0 - distance / 2) for doc, distance in self.vector_store.search(query_embedding, k)]
+            timings["similarity_search"] = time.perf_counter() - start
+            return results
+        
+        start = time.perf_counter()
+        lexical_hits = self.lexical_index.search(query, max(k, HYBRID_CANDIDATES))
+        lexical_ids = [chunk_id for chunk_id, _ in lexical_hits]
+        timings["lexical_search"] = time.perf_counter() - start
+        if mode == "lexical":
+            scores = dict(lexical_hits[:k])
+            return [(doc, scores[doc.id]) for doc in self._get_chunks(lexical_ids[:k])]
+        
+        start = time.perf_counter()
+        vector_docs = [doc for doc, _ in self.vector_store.search(query_embedding, max(k, HYBRID_CANDIDATES))]
+        timings["similarity_search"] = time.perf_counter() - start
+        
+        # Fuse both rankings, fetching only the lexical hits the vector search did not return
+        docs_by_id = {self._chunk_id(doc): doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion([list(docs_by_id), lexical_ids])[:k]
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in docs_by_id]
+        docs_by_id.update((self._chunk_id(doc), doc) for doc in self._get_chunks(missing))
+        return [(docs_by_id[chunk_id], score) for chunk_id, score in fused if chunk_id in docs_by_id]
+
+    def _chunk_id(self, doc: Document) -> str:
+        """The vector store id of a retrieved chunk."""
+        if doc.id:
+            return doc.id
+        return make_chunk_id(os.path.basename(doc.metadata.get("source", "")), int(float(doc.metadata.get("chunk_idx", 0))))
+
+    def _get_chunks(self, chunk_ids: List[str]) -> List[Document]:
+        """Fetch chunks by id, in the given order."""
+        if not chunk_ids:
+            return []
+        results = self.vector_store.get(ids=chunk_ids, include=["documents", "metadatas"])
+        docs = {
+            chunk_id: Document(id=chunk_id, page_content=content, metadata=metadata)
+            for chunk_id, content, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        }
+        return [docs[chunk_id] for chunk_id in chunk_ids if chunk_id in docs]
+
+    def _retrieve(self, query: str, query_embedding: Optional[List[float]], k: int, chunk_window_size: int,
+                  mode: str, timings: Dict[str, float]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Search the top-k chunks for a query and expand them with nearby chunks."""
+        # The version in the key keeps results computed during a write from being served after it.
+        # The query embedding identifies the query; the text is only keyed in lexical mode, which has no embedding.
+        digest = _embedding_digest(query_embedding)
+        key = (query if mode == "lexical" or digest is None else None, digest, k, chunk_window_size, mode, self.version)
+        cached = self._retrieval_cache.get(key)
+        self._query_cache_stats["retrieval_hits" if cached is not None else "retrieval_misses"] += 1
+        if cached is not None:
+            context, sources = cached
+            return context, [dict(source) for source in sources]
+        try:
+            results = self._search(query, query_embedding, k, mode, timings)
+            if not results and mode == "lexical":
+                # No exact term matched: fall back to dense search
+                if query_embedding is None:
+                    start = time.perf_counter()
+                    query_embedding = self.embed_query(query)
+                    timings["query_embedding"] = time.perf_counter() - start
+                results = self._search(query, query_embedding, k, "vector", timings)
+            docs = [doc for doc, _ in results]
+
+            # Expand the hits with their neighbors, each overlapping stretch of a document only once
+            start = time.perf_counter()
+            spans = self._build_spans(docs, chunk_window_size)
+            context = CONTEXT_SEPARATOR.join(span["text"] for span in spans)
+            timings["neighbor_expansion"] = time.perf_counter() - start
+            span_of_hit = {hit: position for position, span in enumerate(spans) for hit in span["hits"]}
             
             # Extract source information from documents
             sources = []
-            for doc in docs:
+            for rank, (doc, score) in enumerate(results):
                 # Extract just the filename from the full path
                 full_source = doc.metadata.get("source", "Unknown")
                 source_filename = os.path.basename(full_source)
@@ -185,15 +960,144 @@ class VectorDB:
                 source_info = {
                     "source": source_filename,
                     "content": doc.page_content[:500] + "...",  # Preview of content
-                    "metadata": doc.metadata
+                    "metadata": doc.metadata,
+                    "score": float(score),  # Relevance of the hit, comparable within one query only
+                    "span": span_of_hit.get(rank)  # Position of the context span holding this hit
                 }
                 sources.append(source_info)
-                
-            return context, sources
+            
+            self._retrieval_cache.put(key, (context, sources))
+            return context, [dict(source) for source in sources]
         except Exception as e:
-            print(f"Error retrieving context: {str(e)}")
+            logger.error("Error retrieving context: %s", e)
             return "", []
 
+    def _get_chunk_sequences(self, sources: Iterable[str]) -> Dict[str, Tuple[List[int], List[str]]]:
+        """
+        Get the ordered chunk sequence of each source document, fetching the ones
+        that are not cached yet with a single vector store query.
+        
+        Args:
+            sources (Iterable[str]): Source paths of the documents
+            
+        Returns:
+            Dict[str, Tuple[List[int], List[str]]]: source -> (sorted chunk indices, chunk texts)
+        """
+        sequences = {}
+        missing = []
+        for source in set(sources):
+            if source is None:
+                continue
+            sequence = self._chunk_index_cache.get(source)
+            if sequence is None:
+                missing.append(source)
+            else:
+                sequences[source] = sequence
+
+        if missing:
+            results = self.vector_store.get(sources=missing, include=["documents", "metadatas"])
+
+            # Group the chunks by source, keeping the first copy of any duplicated chunk_idx
+            chunks_by_source = {source: {} for source in missing}
+            for content, metadata in zip(results["documents"], results["metadatas"]):
+                chunks = chunks_by_source.get(metadata.get("source"))
+                if chunks is None:
+                    continue
+                chunks.setdefault(int(metadata.get("chunk_idx", 0)), content)
+
+            for source, chunks in chunks_by_source.items():
+                indices = sorted(chunks)
+                sequence = (indices, [chunks[idx] for idx in indices])
+                self._chunk_index_cache.put(source, sequence)
+                sequences[source] = sequence
+
+        return sequences
+
+    def _build_spans(self, docs: List[Document], window: int) -> List[Dict[str, Any]]:
+        """
+        Expand hits into deduplicated spans of their documents: the [position - window, position + window]
+        intervals of the hits are merged per source when they overlap or touch, so every chunk is emitted once.
+        Spans are grouped by source (in order of the source's best hit) and in document order within a source.
+        
+        Args:
+            docs (List[Document]): The hits, best first
+            window (int): Number of chunks to include before and after each hit
+            
+        Returns:
+            List[Dict[str, Any]]: Spans with their source, first and last chunk_idx, joined text,
+            and the ranks of the hits they contain
+        """
+        # Load the chunk sequence of every hit's document in a single pass
+        sequences = self._get_chunk_sequences(doc.metadata.get("source") for doc in docs)
+        
+        # Chunk indices are sorted but may have gaps (one range per page), so windows are positional
+        intervals_by_source = {}
+        for rank, doc in enumerate(docs):
+            source = doc.metadata.get("source")
+            sequence = sequences.get(source)
+            if not sequence or not sequence[0]:
+                continue
+            indices = sequence[0]
+            position = min(bisect_left(indices, int(float(doc.metadata.get("chunk_idx", 0)))), len(indices) - 1)
+            intervals_by_source.setdefault(source, []).append(
+                (max(position - window, 0), min(position + window, len(indices) - 1), rank)
+            )
+        
+        spans = []
+        for source, intervals in intervals_by_source.items():
+            indices, texts = sequences[source]
+            merged = []
+            for start, end, rank in sorted(intervals):
+                if merged and start <= merged[-1]["end"] + 1:
+                    merged[-1]["end"] = max(merged[-1]["end"], end)
+                    merged[-1]["hits"].append(rank)
+                else:
+                    merged.append({"start": start, "end": end, "hits": [rank]})
+            for span in merged:
+                spans.append({
+                    "source": source,
+                    "first_chunk_idx": indices[span["start"]],
+                    "last_chunk_idx": indices[span["end"]],
+                    "text": self._join_chunks(texts[span["start"]:span["end"] + 1]),
+                    "hits": sorted(span["hits"]),
+                })
+        return spans
+
+    def _join_chunks(self, chunks: List[str]) -> str:
+        """Join consecutive chunks, removing the text each one repeats from the end of the previous one."""
+        if not chunks:
+            return ""
+        joined = chunks[0]
+        for chunk in chunks[1:]:
+            # The splitter overlap is at most chunk_overlap characters and starts on a word boundary
+            overlap = next(
+                (length for length in range(min(self.text_splitter._chunk_overlap, len(chunk), len(joined)), 0, -1)
+                 if joined.endswith(chunk[:length]) and (length == len(joined) or joined[-length - 1].isspace())),
+                0
+            )
+            joined += chunk[overlap:] if overlap else " " + chunk
+        return joined
+
+    def _window_text(self, sequence: Optional[Tuple[List[int], List[str]]], chunk_idx: Any, window: int) -> str:
+        """
+        Join the chunks within `window` positions of chunk_idx, removing the splitter overlap.
+        
+        Args:
+            sequence: (sorted chunk indices, chunk texts) of the chunk's document
+            chunk_idx: Index of the chunk at the centre of the window
+            window (int): Number of chunks to include before and after
+            
+        Returns:
+            str: Joined text of nearby chunks
+        """
+        if not sequence or not sequence[0]:
+            return ""
+        indices, texts = sequence
+        
+        # Chunk indices are sorted but may have gaps (one range per page), so the window is positional
+        position = bisect_left(indices, int(float(chunk_idx)))
+        return self._join_chunks(texts[max(position - window, 0):position + window + 1])
+
     def _search_nearby_chunks(self, doc: Any, window: int) -> str:
         """
         Given a document chunk, find nearby chunks in the same PDF file (based on chunk_idx).
@@ -207,60 +1111,12 @@ class VectorDB:
             str: Joined text of nearby chunks
         """
         try:
-            if hasattr(doc, "metadata"):
-                source_doc = doc.metadata["source"]
-            else:
-                source_doc = doc["metadata"]["source"]
-                
-            # Get every chunk of the same pdf document.
-            all_chunks = self.vector_store.get(where={"source": source_doc})
-
-            unique_chunks = []
-            unique_metadatas = []
-            seen_keys = set()
-
-            # For removing duplicates.
-            for i, content in enumerate(all_chunks["documents"]):
-                metadata = all_chunks["metadatas"][i]
-                key = (metadata.get("source"), metadata.get("chunk_idx"))
-                if key not in seen_keys:
-                    seen_keys.add(key)
-                    unique_chunks.append(content)
-                    unique_metadatas.append(metadata)
-            all_chunks["documents"] = unique_chunks
-            all_chunks["metadatas"] = unique_metadatas
-            
-            # Create a list of tuples (chunk_idx, content) for sorting
-            chunk_data = []
-            for i, content in enumerate(all_chunks["documents"]):
-                metadata = all_chunks["metadatas"][i]
-                # Use chunk_idx if available, otherwise use position in list
-                chunk_idx = float(metadata.get("chunk_idx", i))
-                chunk_data.append((chunk_idx, content))
-
-            # Sort chunks by chunk_idx
-            chunk_data.sort(key=lambda x: x[0])
-
-            # Get the current chunk's index
-            if hasattr(doc, "metadata"):
-                current_chunk_idx = float(doc.metadata.get("chunk_idx", 0))
-            else:
-                current_chunk_idx = float(doc["metadata"].get("chunk_idx", 0))
-            
-            nearby_chunks = []
-            target_indices = set(range(int(current_chunk_idx - window), int(current_chunk_idx + window + 1)))
-            for idx, content in chunk_data:
-                if idx in target_indices:
-                    nearby_chunks.append(content)
-
-            cleaned_chunks = [nearby_chunks[0]]  # Keep the first chunk as-is
-
-            for chunk in nearby_chunks[1:]:
-                cleaned_chunks.append(chunk[self.text_splitter._chunk_overlap:])  # Remove the overlap
-
-            return "".join(cleaned_chunks)
+            metadata = doc.metadata if hasattr(doc, "metadata") else doc["metadata"]
+            source_doc = metadata["source"]
+            sequence = self._get_chunk_sequences([source_doc]).get(source_doc)
+            return self._window_text(sequence, metadata.get("chunk_idx", 0), window)
         except Exception as e:
-            print(f"Error searching nearby chunks: {str(e)}")
+            logger.error("Error searching nearby chunks: %s", e)
             return ""
 
     def list_documents(self) -> List[str]:
@@ -271,20 +1127,9 @@ class VectorDB:
             List[str]: List of document filenames
         """
         try:
-            # Get all documents and their metadata
-            results = self.vector_store.get()
-            # Extract unique source documents
-            documents = set()
-            
-            for metadata in results['metadatas']:
-                if 'source' in metadata:
-                    # Get just the filename from the full path
-                    filename = os.path.basename(metadata['source'])
-                    documents.add(filename)
-                    
-            return list(documents)
+            return self.registry.filenames()
         except Exception as e:
-            print(f"Error listing documents: {str(e)}")
+            logger.error("Error listing documents: %s", e)
             return []
 
     def get_all_summaries(self) -> str:
@@ -294,11 +1139,87 @@ class VectorDB:
         Returns:
             str: Concatenated summaries of all documents
         """
-        return "\n\n".join(self.document_summaries.values())
+        return "\n\n".join(self.registry.summaries().values())
+
+    def get_document_summary(self, document_id: str) -> Optional[str]:
+        """
+        Get the summary of the document a chunk references with its 'document_id' metadata.
+        
+        Args:
+            document_id (str): Id of the document
+            
+        Returns:
+            Optional[str]: The summary, or None if the document is unknown or has none
+        """
+        return self.registry.summary_for(document_id)
+
+    def migrate_document_summaries(self, batch_size: int = MAX_WRITE_BATCH_SIZE) -> Dict[str, int]:
+        """
+        One-off migration of a vector store written when every chunk carried a copy of its
+        document's summary: the summary is kept once in the registry, and each chunk's
+        'document_summary' metadata is replaced by a 'document_id' reference.
+        
+        Args:
+            batch_size (int): Chunks read and updated at once
+            
+        Returns:
+            Dict[str, int]: Number of chunks migrated and bytes of summary copies removed
+        """
+        with self._write_lock:
+            # Collect the chunks to migrate first, updating while paginating could shift the pages
+            to_migrate = []
+            legacy_summaries = {}
+            removed_bytes = 0
+            offset = 0
+            while True:
+                batch = self.vector_store.get(include=["metadatas"], limit=batch_size, offset=offset)
+                if not batch["ids"]:
+                    break
+                offset += len(batch["ids"])
+                for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    if "document_summary" not in metadata and "document_id" in metadata:
+                        continue
+                    filename = os.path.basename(metadata.get("source", ""))
+                    summary = metadata.get("document_summary")
+                    if summary:
+                        legacy_summaries.setdefault(filename, summary)
+                        removed_bytes += len(summary.encode("utf-8"))
+                    to_migrate.append((chunk_id, filename))
+            
+            # Keep the summary once per document
+            for filename, summary in legacy_summaries.items():
+                entry = self.registry.get(filename)
+                if entry is not None and not entry.get("summary"):
+                    self.registry.set_summary(filename, summary)
+            self.registry.save()
+            
+            # Setting a metadata key to None removes it
+            for start in range(0, len(to_migrate), batch_size):
+                batch = to_migrate[start:start + batch_size]
+                self.vector_store.update_metadatas(
+                    ids=[chunk_id for chunk_id, _ in batch],
+                    metadatas=[
+                        {"document_summary": None, "document_id": make_document_id(filename)}
+                        for _, filename in batch
+                    ]
+                )
+            self._chunk_index_cache.clear()
+            self._bump_version()
+        
+        return {"chunks": len(to_migrate), "summary_bytes": removed_bytes}
+
+    def count_chunks(self) -> int:
+        """
+        Get the number of chunks stored in the vector database.
+        
+        Returns:
+            int: Total number of chunks across all documents
+        """
+        return self.registry.chunk_count()
 
     def delete_document(self, filename: str) -> bool:
         """
-        Delete a document from the vector store and its summary.
+        Delete a document from the vector store and the registry.
         
         Args:
             filename (str): Name of the document to delete
@@ -310,31 +1231,59 @@ class VectorDB:
             if not filename or not filename.strip():
                 raise ValueError("Filename cannot be empty")
                 
-            # Get all documents and their metadata
-            results = self.vector_store.get()
-            
-            # Find all chunk IDs that belong to this document
-            ids_to_delete = []
-            for i, metadata in enumerate(results['metadatas']):
-                if 'source' in metadata:
-                    source_filename = os.path.basename(metadata['source'])
-                    if source_filename == filename:
-                        ids_to_delete.append(results['ids'][i])
-            
-            if not ids_to_delete:
-                print(f"No document found with filename: {filename}")
+            # Look up the document's chunk IDs in the registry
+            entry = self.registry.get(filename)
+            if not entry or not entry["chunk_ids"]:
+                logger.warning("No document found with filename: %s", filename)
                 return False
             
             # Delete the chunks
-            self.vector_store.delete(ids=ids_to_delete)
+            self.vector_store.delete(ids=entry["chunk_ids"])
+            self.lexical_index.remove(entry["chunk_ids"])
+            self.lexical_index.save()
+            self._chunk_index_cache.pop(entry["source"])
             
-            # Remove the summary from our dictionary and save
-            if filename in self.document_summaries:
-                del self.document_summaries[filename]
-                self._save_summaries()  # Save summaries after updating
+            # Remove the document (and its summary) from the registry and save
+            self.registry.remove(filename)
+            self.registry.save()
+            self._remove_document_vectors(filename)
+            self._bump_version()
                 
             return True
             
         except Exception as e:
-            print(f"Error deleting document {filename}: {str(e)}")
-            return False
\ No newline at end of file
+            logger.error("Error deleting document %s: %s", filename, e)
+            return False
+
+
+# One VectorDB per persist directory and backend, shared by every GalteaChat in the process
+# (e.g. one per Streamlit session) so they see the same registry and lexical index and
+# never save stale copies of them over each other's changes
+_vector_dbs: Dict[Tuple[str, str], VectorDB] = {}
+_vector_dbs_lock = Lock()
+
+
+def get_vector_db(persist_directory: str = "db", backend: str = VECTOR_BACKEND) -> VectorDB:
+    """
+    Return the process-wide VectorDB of a persist directory, creating it on first use.
+    
+    Args:
+        persist_directory (str): Directory the vector store, registry and indexes are saved to
+        backend (str): Vector backend, "chroma" or "numpy"
+        
+    Returns:
+        VectorDB: The shared instance
+    """
+    key = (os.path.abspath(persist_directory), backend)
+    with _vector_dbs_lock:
+        vector_db = _vector_dbs.get(key)
+        if vector_db is None:
+            vector_db = _vector_dbs[key] = VectorDB(persist_directory=persist_directory, backend=backend)
+        return vector_db
+
+
+def _embedding_digest(embedding: Optional[List[float]]) -> Optional[str]:
+    """Short digest of an embedding, used as a cache key."""
+    if embedding is None:
+        return None
+    return hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
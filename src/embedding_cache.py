@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+from threading import Lock
+from typing import List, Dict, Any, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .config import EMBEDDING_CACHE_TOUCH_INTERVAL
+
+
+# Content-addressed persistent cache placed in front of an embeddings client.
+# Vectors are stored as float32 blobs in SQLite, keyed by hash(model, text),
+# and the least recently used ones are evicted when the store exceeds max_bytes.
+# Hits are read-only: last use times are only refreshed once they are touch_interval old,
+# buffered in memory and written with the next store.
+class CachedEmbeddings(Embeddings):
+    _BATCH_SIZE = 500  # Max keys per SQLite lookup
+
+    def __init__(self, embeddings: Embeddings, cache_path: str, model_name: str, max_bytes: int,
+                 touch_interval: float = EMBEDDING_CACHE_TOUCH_INTERVAL):
+        """
+        Initialize the cache.
+        
+        Args:
+            embeddings (Embeddings): The wrapped embeddings client
+            cache_path (str): Path of the SQLite file
+            model_name (str): Name of the embedding model, part of the cache key
+            max_bytes (int): Maximum size of the stored vectors before evicting
+            touch_interval (float): Seconds before a hit refreshes the last use time of a vector
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._touched: Dict[bytes, float] = {}  # key -> last use time not written yet
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Fetch the cached vectors of the given keys and buffer the refresh of stale last use times."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), self._BATCH_SIZE):
+                batch = keys[i:i + self._BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector, last_used in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                    if now - last_used >= self.touch_interval:
+                        self._touched[key] = now
+            if len(self._touched) >= self._BATCH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+        return found
+
+    def _flush_touched(self) -> None:
+        """Write the buffered last use times. Call with the lock held, the caller commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, now in self._touched.items()]
+            )
+            self._touched = {}
+
+    def _store(self, items: Dict[bytes, List[float]]) -> None:
+        """Store new vectors and evict the least recently used ones if the cache is too big."""
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            # Vectors being replaced (e.g. stored concurrently by another caller) no longer count
+            replaced = 0
+            for i in range(0, len(rows), self._BATCH_SIZE):
+                batch = [row[0] for row in rows[i:i + self._BATCH_SIZE]]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchone()[0]
+            # Stored rows are as recent as their buffered use, and eviction must see the other uses
+            for row in rows:
+                self._touched.pop(row[0], None)
+            self._flush_touched()
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._total_bytes += sum(len(row[1]) for row in rows) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Delete the least recently used vectors until the cache is below 90% of max_bytes. Call with the lock held."""
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used")
+        to_delete = []
+        for key, size in cursor:
+            if self._total_bytes <= target:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+
+    def _split(self, texts: List[str]):
+        """Return the keys of the texts, the cached vectors and the unique texts that are missing."""
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.hits += len(texts) - sum(1 for key in keys if key not in cached)
+            self.misses += len(missing)
+        return keys, cached, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, only sending the texts that are not cached to the model."""
+        keys, cached, missing = self._split(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._store(new)
+            cached.update(new)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, using the cached vector if there is one."""
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async version of `embed_documents`. SQLite is queried from a worker thread, off the event loop."""
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store, new)
+            cached.update(new)
+        return [cached[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async version of `embed_query`."""
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters.
+        
+        Returns:
+            Dict[str, Any]: hits, misses, hit rate and stored bytes
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,353 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Tuple, Optional
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.schema import Document
+from .registry import file_content_hash
+from .utils import summarize_document
+from .observability import record_ingest_stage
+from .usage import Usage, track_usage, in_current_context
+from .config import (
+    INGEST_PARSE_WORKERS,
+    INGEST_EMBED_WORKERS,
+    INGEST_SUMMARY_WORKERS,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_WRITE_BATCH_SIZE,
+    INGEST_MAX_IN_FLIGHT,
+    INGEST_TOKEN_BUDGET,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_pdf(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Parse a PDF into (page text, page metadata) pairs. Top-level so it can run in a process pool.
+    
+    Args:
+        path (str): Path to the PDF file
+        
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: One entry per page
+    """
+    return [(page.page_content, page.metadata) for page in PyPDFLoader(path, mode="page").load()]
+
+
+# Throughput counters of one pipeline stage, also exported as metrics
+class _StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.documents = 0
+        self.chunks = 0
+        self.busy = 0.0  # Summed seconds spent in the stage across workers
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, start: float, end: float, documents: int = 0, chunks: int = 0) -> None:
+        with self._lock:
+            self.documents += documents
+            self.chunks += chunks
+            self.busy += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+        record_ingest_stage(self.name, end - start, documents=documents, chunks=chunks)
+
+    def report(self) -> Dict[str, float]:
+        """Throughput over the stage's active wall-clock window."""
+        with self._lock:
+            wall = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+            return {
+                "documents": self.documents,
+                "chunks": self.chunks,
+                "busy_seconds": self.busy,
+                "wall_seconds": wall,
+                "documents_per_s": self.documents / wall if wall > 0 else 0.0,
+                "chunks_per_s": self.chunks / wall if wall > 0 else 0.0,
+            }
+
+
+# Pipelined multi-document ingest engine:
+# parse (process pool) -> plan, summarize and embed (thread pools) -> batched writes (writer thread).
+# Stages are connected by a bounded queue, and at most max_in_flight documents
+# are between parsing and writing, which bounds memory. Files large enough for
+# streaming mode bypass the pipeline and are ingested page by page.
+class IngestPipeline:
+    _DONE = object()
+
+    def __init__(self, vector_db, parse_workers: int = INGEST_PARSE_WORKERS,
+                 embed_workers: int = INGEST_EMBED_WORKERS, summary_workers: int = INGEST_SUMMARY_WORKERS,
+                 embed_batch_size: int = INGEST_EMBED_BATCH_SIZE, write_batch_size: int = INGEST_WRITE_BATCH_SIZE,
+                 max_in_flight: int = INGEST_MAX_IN_FLIGHT, token_budget: Optional[int] = INGEST_TOKEN_BUDGET):
+        """
+        Initialize the pipeline.
+        
+        Args:
+            vector_db: The vector database to ingest into
+            parse_workers (int): Processes parsing PDFs, 0 parses in a single thread instead
+            embed_workers (int): Documents embedded concurrently
+            summary_workers (int): Documents summarized concurrently
+            embed_batch_size (int): Chunks per embedding request
+            write_batch_size (int): Chunks per vector store write
+            max_in_flight (int): Maximum documents parsed but not yet written
+            token_budget (int, optional): Tokens the summaries of one run may use; past it documents
+                get their beginning as summary instead. None for no limit
+        """
+        self.vector_db = vector_db
+        self.parse_workers = parse_workers
+        self.embed_workers = embed_workers
+        self.summary_workers = summary_workers
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.max_in_flight = max_in_flight
+        self.token_budget = token_budget
+        self.stages = {name: _StageStats(name) for name in ("parse", "summarize", "embed", "write", "stream")}
+
+    def run(self, paths: List[str]) -> Dict[str, Any]:
+        """
+        Ingest the given PDF files.
+        
+        Args:
+            paths (List[str]): Paths to the PDF files
+            
+        Returns:
+            Dict[str, Any]: Report with the total and per-stage throughput, the LLM token usage
+            and a result per file (with its own usage)
+        """
+        start = time.perf_counter()
+        paths = list(dict.fromkeys(paths))
+        results = {path: {"path": path, "status": "pending", "chunks": 0, "error": None} for path in paths}
+        usage = Usage(self.token_budget)
+        
+        # Skip missing and unchanged files before doing any work
+        todo = []
+        for path in paths:
+            try:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Document not found: {path}")
+                content_hash = file_content_hash(path)
+                if self.vector_db._is_indexed(path, content_hash):
+                    results[path]["status"] = "unchanged"
+                else:
+                    todo.append((path, content_hash))
+            except Exception as e:
+                self._fail(results[path], e)
+        
+        # Large files are streamed one at a time so they never sit in memory whole
+        streamed = [(path, content_hash) for path, content_hash in todo if self.vector_db._use_streaming(path)]
+        pipelined = [(path, content_hash) for path, content_hash in todo if (path, content_hash) not in streamed]
+        with track_usage(usage):
+            if pipelined:
+                self._run_pipeline(pipelined, results)
+            for path, content_hash in streamed:
+                self._stream(path, content_hash, results[path])
+        
+        elapsed = time.perf_counter() - start
+        indexed = [result for result in results.values() if result["status"] == "indexed"]
+        chunks = sum(result["chunks"] for result in indexed)
+        return {
+            "seconds": elapsed,
+            "documents": len(indexed),
+            "chunks": chunks,
+            "documents_per_s": len(indexed) / elapsed if elapsed > 0 else 0.0,
+            "chunks_per_s": chunks / elapsed if elapsed > 0 else 0.0,
+            "stages": {name: stats.report() for name, stats in self.stages.items()},
+            "usage": usage.report(),
+            "files": list(results.values()),
+        }
+
+    def _run_pipeline(self, todo: List[Tuple[str, str]], results: Dict[str, Dict[str, Any]]) -> None:
+        """Run the parse, prepare and write stages over the files to ingest."""
+        in_flight = threading.Semaphore(self.max_in_flight)
+        write_queue = queue.Queue(maxsize=self.max_in_flight)
+        writer = threading.Thread(target=self._writer, args=(write_queue, results, in_flight), daemon=True)
+        writer.start()
+        
+        if self.parse_workers > 0:
+            parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+            parse = parse_pdf
+        else:
+            parse_pool = ThreadPoolExecutor(max_workers=1)
+            parse = self._parse_in_thread
+        prepare_pool = ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="ingest-embed")
+        summary_pool = ThreadPoolExecutor(max_workers=self.summary_workers, thread_name_prefix="ingest-summary")
+        try:
+            pending: Dict[Future, str] = {}
+            for path, content_hash in todo:
+                # Bounded: hand prepared documents to the writer until one leaves the pipeline, then parse another
+                while not in_flight.acquire(timeout=0 if pending else 0.05):
+                    self._hand_off(pending, write_queue, writer, results, in_flight)
+                parse_start = time.perf_counter()
+                parsed = parse_pool.submit(parse, path)
+                future = prepare_pool.submit(
+                    in_current_context(self._prepare), path, content_hash, parsed, parse_start, summary_pool, results[path]
+                )
+                pending[future] = path
+            while pending:
+                self._hand_off(pending, write_queue, writer, results, in_flight)
+        finally:
+            if writer.is_alive():
+                write_queue.put(self._DONE)
+                writer.join()
+            parse_pool.shutdown()
+            prepare_pool.shutdown()
+            summary_pool.shutdown()
+            # Batches are written without saving the registry, lexical index and routing vectors; save them once for the run
+            self.vector_db.persist()
+
+    def _hand_off(self, pending: Dict[Future, str], write_queue: queue.Queue, writer: threading.Thread,
+                  results: Dict[str, Dict[str, Any]], in_flight: threading.Semaphore) -> None:
+        """
+        Wait briefly for prepared documents and pass them to the writer. Documents that failed
+        leave the pipeline here, freeing their in-flight slot.
+        """
+        if not writer.is_alive():
+            raise RuntimeError("Ingest writer stopped")
+        done, _ = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = pending.pop(future)
+            try:
+                item = future.result()
+            except Exception as e:
+                self._fail(results[path], e)
+                item = None
+            if item is None:
+                in_flight.release()
+                continue
+            # A full queue means the writer is busy; keep checking that it is still running
+            while True:
+                try:
+                    write_queue.put(item, timeout=0.05)
+                    break
+                except queue.Full:
+                    if not writer.is_alive():
+                        raise RuntimeError("Ingest writer stopped")
+
+    def _stream(self, path: str, content_hash: str, result: Dict[str, Any]) -> None:
+        """Ingest a large document in streaming mode."""
+        start = time.perf_counter()
+        usage = Usage()
+        try:
+            with track_usage(usage):
+                has_chunks = self.vector_db._stream_document(path, content_hash)
+            result["usage"] = usage.report()
+        except Exception as e:
+            self._fail(result, e)
+            return
+        result["status"] = "indexed" if has_chunks else "empty"
+        entry = self.vector_db.registry.get(os.path.basename(path)) if has_chunks else None
+        result["chunks"] = entry["chunk_count"] if entry else 0
+        self.stages["stream"].record(start, time.perf_counter(), documents=1, chunks=result["chunks"])
+
+    def _parse_in_thread(self, path: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parse a PDF with the vector database's loader (used when parse_workers is 0)."""
+        return [(page.page_content, page.metadata) for page in self.vector_db._load_document(path)]
+
+    def _prepare(self, path: str, content_hash: str, parsed: Future, parse_start: float,
+                 summary_pool: ThreadPoolExecutor, result: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Optional[str], List[List[float]]]]:
+        """
+        Plan a parsed document, summarize it and embed its new chunks.
+        
+        Returns:
+            The (plan, summary, embeddings) to write, or None if the document failed
+        """
+        try:
+            pages = [Document(page_content=text, metadata=metadata) for text, metadata in parsed.result()]
+            self.stages["parse"].record(parse_start, time.perf_counter(), documents=1)
+            
+            plan = self.vector_db._plan_document(path, pages, content_hash)
+            summary = summary_pool.submit(in_current_context(self._summarize), pages, result) if plan["changed"] else None
+            
+            # Embed the new chunks in batches
+            embed_start = time.perf_counter()
+            texts = [doc.page_content for doc in plan["docs"]]
+            embeddings = []
+            for batch_start in range(0, len(texts), self.embed_batch_size):
+                embeddings.extend(self.vector_db.embeddings.embed_documents(
+                    texts[batch_start:batch_start + self.embed_batch_size]
+                ))
+            self.stages["embed"].record(embed_start, time.perf_counter(), documents=1, chunks=len(texts))
+            
+            if not summary:
+                return plan, plan["summary"], embeddings
+            # The routing vectors are ready before the write, so the writer never waits on an embedding call
+            document_summary, summary_vector = summary.result()
+            plan["document_vectors"] = self.vector_db._plan_document_vectors(plan, summary_vector, embeddings)
+            return plan, document_summary, embeddings
+        except Exception as e:
+            self._fail(result, e)
+            return None
+
+    def _summarize(self, pages: List[Document], result: Dict[str, Any]) -> Tuple[str, Optional[List[float]]]:
+        """
+        Summarize a document from its pages, recording the tokens it took in its result,
+        and embed the summary for the router.
+        
+        Returns:
+            The summary and its embedding (None if the summary is empty)
+        """
+        start = time.perf_counter()
+        usage = Usage()
+        with track_usage(usage):
+            summary = summarize_document(" ".join(page.page_content for page in pages))
+        result["usage"] = usage.report()
+        summary_vector = self.vector_db.embeddings.embed_query(summary) if summary else None
+        self.stages["summarize"].record(start, time.perf_counter(), documents=1)
+        return summary, summary_vector
+
+    def _writer(self, write_queue: queue.Queue, results: Dict[str, Dict[str, Any]],
+                in_flight: threading.Semaphore) -> None:
+        """Consume prepared documents and write them to the vector store in batches."""
+        batch, batch_chunks = [], 0
+        while True:
+            # Flush early when the upstream stages are idle, so a partial batch never stalls the pipeline
+            try:
+                item = write_queue.get(timeout=0.05 if batch else None)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not self._DONE:
+                batch.append(item)
+                batch_chunks += len(item[0]["docs"])
+            if batch and (item is None or item is self._DONE or batch_chunks >= self.write_batch_size
+                          or len(batch) >= self.max_in_flight):
+                try:
+                    self._flush(batch, results)
+                except Exception as e:
+                    for plan, _, _ in batch:
+                        self._fail(results[plan["source"]], e)
+                finally:
+                    # Written or failed, the documents leave the pipeline
+                    for _ in batch:
+                        in_flight.release()
+                batch, batch_chunks = [], 0
+            if item is self._DONE:
+                return
+
+    def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[str], List[List[float]]]],
+               results: Dict[str, Dict[str, Any]]) -> None:
+        """Write a batch of prepared documents and record their results."""
+        start = time.perf_counter()
+        chunks = sum(len(plan["docs"]) for plan, _, _ in batch)
+        try:
+            outcomes = self.vector_db._apply_plans(batch, persist=False)
+        except Exception as e:
+            for plan, _, _ in batch:
+                self._fail(results[plan["source"]], e)
+            return
+        self.stages["write"].record(start, time.perf_counter(), documents=len(batch), chunks=chunks)
+        for (plan, _, _), has_chunks in zip(batch, outcomes):
+            result = results[plan["source"]]
+            result["status"] = "indexed" if has_chunks else "empty"
+            # Every chunk of the document, including the unchanged ones that were not rewritten (as `_stream` reports)
+            entry = self.vector_db.registry.get(plan["filename"]) if has_chunks else None
+            result["chunks"] = entry["chunk_count"] if entry else 0
+
+    @staticmethod
+    def _fail(result: Dict[str, Any], error: Exception) -> None:
+        logger.error("Error uploading document %s: %s", result["path"], error)
+        result["status"] = "failed"
+        result["error"] = str(error)
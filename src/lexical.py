@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import math
+import heapq
+import sqlite3
+import logging
+from collections import Counter
+from threading import Lock
+from typing import List, Dict, Tuple, Iterable, Set
+from .config import BM25_K1, BM25_B, RRF_K
+
+logger = logging.getLogger(__name__)
+
+# Words, numbers and codes in any script; separators inside codes ("504.00", "5Q0-129-620", "30,000") are kept in the match
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,\-/]\w+)*", re.UNICODE)
+CODE_SEPARATORS = re.compile(r"[.,\-/]")
+
+# Version of `tokenize` the persisted terms were built with; an index saved by another one is rebuilt
+TOKENIZER_VERSION = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms. Codes are indexed both compacted and by part
+    ("5Q0-129-620" -> "5q0129620", "5q0", "129", "620"; "30,000" -> "30000", "30", "000"),
+    and adjacent numbers are also joined ("504 00" -> "50400"), so a spec or part number
+    matches however it is written.
+
+    Args:
+        text (str): The text to tokenize
+
+    Returns:
+        List[str]: The terms, in order
+    """
+    terms = []
+    previous_number = None
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        compact = CODE_SEPARATORS.sub("", match)
+        terms.append(compact)
+        if compact != match:
+            terms.extend(part for part in CODE_SEPARATORS.split(match) if part)
+        if compact.isdigit():
+            if previous_number is not None:
+                terms.append(previous_number + compact)
+            previous_number = compact
+        else:
+            previous_number = None
+    return terms
+
+
+def is_identifier_query(query: str, max_terms: int = 4) -> bool:
+    """
+    Check if a query is only an identifier lookup (part numbers, codes) rather than a question:
+    a few tokens, each mixing letters and digits ("5Q0-129-620", "06L115562"). Queries with any
+    plain word or number ("golf 7 tyre pressure", "30,000 km service") go to hybrid search.
+
+    Args:
+        query (str): The user's query
+        max_terms (int): Maximum number of tokens of an identifier query
+
+    Returns:
+        bool: True if lexical search alone should answer it
+    """
+    words = TOKEN_PATTERN.findall(query.lower())
+    return 0 < len(words) <= max_terms and all(_is_identifier(word) for word in words)
+
+
+def _is_identifier(word: str) -> bool:
+    """Whether a token mixes letters and digits, like a part number or code."""
+    return any(char.isdigit() for char in word) and any(char.isalpha() for char in word)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked lists of ids with reciprocal rank fusion: score(id) = sum of 1 / (k + rank).
+
+    Args:
+        rankings (Iterable[List[str]]): Ranked ids, best first, one list per retriever
+        k (int): Rank constant damping the weight of the top ranks
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score), best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+# Persistent BM25 inverted index over the chunks of the vector store, keyed by chunk id.
+# Each chunk is one SQLite row, so a save only writes the chunks changed since the last one.
+class BM25Index:
+    def __init__(self, index_file: str, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Initialize the index, loading it from disk if it exists and was built by the current tokenizer.
+        Only the term frequencies of each chunk are persisted, the postings are rebuilt on load.
+
+        Args:
+            index_file (str): Path to the SQLite file backing the index
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 document length normalization
+        """
+        self.index_file = index_file
+        self.k1 = k1
+        self.b = b
+        self._lock = Lock()
+        self._chunk_terms: Dict[str, Dict[str, int]] = {}  # chunk id -> term -> frequency
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> chunk id -> frequency
+        self._lengths: Dict[str, int] = {}  # chunk id -> number of terms
+        self._total_length = 0
+        self._dirty: Set[str] = set()  # Chunk ids added, replaced or removed since the last save
+        self._cleared = False
+
+        os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(index_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, terms TEXT NOT NULL)")
+        self._conn.commit()
+
+        # user_version is set to the tokenizer version by the first save, so an interrupted
+        # first build, or terms from another tokenizer, are rebuilt
+        self.exists = self._conn.execute("PRAGMA user_version").fetchone()[0] == TOKENIZER_VERSION
+        if self.exists:
+            self._load()
+
+    def _load(self) -> None:
+        """Load the index from disk."""
+        try:
+            for chunk_id, terms in self._conn.execute("SELECT chunk_id, terms FROM chunks"):
+                self._add_terms(chunk_id, json.loads(terms))
+        except Exception as e:
+            logger.error("Error loading lexical index: %s", e)
+            self._chunk_terms, self._postings, self._lengths, self._total_length = {}, {}, {}, 0
+            self.exists = False
+
+    def save(self) -> None:
+        """Write the chunks added, replaced or removed since the last save, in one transaction."""
+        with self._lock:
+            dirty, cleared = self._dirty, self._cleared
+            if cleared:
+                dirty = dirty | set(self._chunk_terms)
+            rows = [(chunk_id, json.dumps(self._chunk_terms[chunk_id], separators=(",", ":")))
+                    for chunk_id in dirty if chunk_id in self._chunk_terms]
+            removed = [(chunk_id,) for chunk_id in dirty if chunk_id not in self._chunk_terms]
+            try:
+                with self._conn:
+                    if cleared:
+                        self._conn.execute("DELETE FROM chunks")
+                    self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", removed)
+                    self._conn.executemany("INSERT OR REPLACE INTO chunks (chunk_id, terms) VALUES (?, ?)", rows)
+                    self._conn.execute(f"PRAGMA user_version = {TOKENIZER_VERSION}")
+            except Exception as e:
+                logger.error("Error saving lexical index: %s", e)
+                return
+            self._dirty, self._cleared = set(), False
+        self.exists = True
+
+    def _add_terms(self, chunk_id: str, terms: Dict[str, int]) -> None:
+        self._chunk_terms[chunk_id] = terms
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[chunk_id] = frequency
+        length = sum(terms.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+
+    def _remove(self, chunk_id: str) -> None:
+        terms = self._chunk_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def add(self, chunk_ids: List[str], texts: List[str]) -> None:
+        """Index chunks, replacing the previous version of chunks already indexed."""
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                self._remove(chunk_id)
+                self._add_terms(chunk_id, dict(Counter(tokenize(text))))
+                self._dirty.add(chunk_id)
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        """Remove chunks from the index."""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+                self._dirty.add(chunk_id)
+
+    def clear(self) -> None:
+        """Remove every chunk."""
+        with self._lock:
+            self._chunk_terms, self._postings, self._lengths, self._total_length = {}, {}, {}, 0
+            self._dirty, self._cleared = set(), True
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Rank the chunks matching the query terms with BM25.
+
+        Args:
+            query (str): The search query
+            k (int): Number of chunks to return
+
+        Returns:
+            List[Tuple[str, float]]: (chunk id, BM25 score), best first
+        """
+        with self._lock:
+            count = len(self._lengths)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._chunk_terms)
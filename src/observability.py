@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .config import LOG_LEVEL, METRICS_HOST, METRICS_PORT, TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets, in seconds: from sub-millisecond searches to multi-second LLM calls and ingests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Send the application's log records (the "src" loggers) to stderr at the given level.
+    Only the first call has an effect, so scripts can pick the level before creating a GalteaChat.
+
+    Args:
+        level (str): Logging level name, e.g. "DEBUG", "INFO" or "WARNING"
+    """
+    package_logger = logging.getLogger(__name__.split(".")[0])
+    if package_logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    package_logger.addHandler(handler)
+    package_logger.setLevel(level.upper())
+    package_logger.propagate = False
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# Monotonic counter, one value per label combination
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+# Cumulative histogram of observed values, one series per label combination
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+# Process-wide set of metrics, rendered in the Prometheus text format
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+metrics = MetricsRegistry()
+REQUEST_STAGE_SECONDS = metrics.histogram(
+    "galtea_request_stage_seconds", "Seconds spent in each stage of a message", ["stage"]
+)
+MESSAGES_TOTAL = metrics.counter("galtea_messages_total", "Processed messages by outcome", ["outcome"])
+INGEST_STAGE_SECONDS = metrics.histogram(
+    "galtea_ingest_stage_seconds", "Seconds spent in each ingest stage, per document or batch", ["stage"]
+)
+INGEST_DOCUMENTS_TOTAL = metrics.counter("galtea_ingest_documents_total", "Documents through each ingest stage", ["stage"])
+INGEST_CHUNKS_TOTAL = metrics.counter("galtea_ingest_chunks_total", "Chunks through each ingest stage", ["stage"])
+
+
+# Optional JSONL trace: one line per processed message and per ingest stage run
+_trace_lock = threading.Lock()
+
+
+def trace(event: Dict[str, Any]) -> None:
+    """Append an event to TRACE_FILE, if it is set."""
+    if not TRACE_FILE:
+        return
+    line = json.dumps({"ts": time.time(), **event}, default=str)
+    try:
+        with _trace_lock:
+            directory = os.path.dirname(TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(TRACE_FILE, "a") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        logger.warning("Could not write trace event: %s", e)
+
+
+def record_request(timings: Dict[str, float], outcome: str, **attributes: Any) -> None:
+    """
+    Export the stage timings of one processed message.
+
+    Args:
+        timings (Dict[str, float]): Seconds spent in each stage
+        outcome (str): "answered", "cached" or "error"
+        **attributes: Extra fields written to the trace
+    """
+    for stage, seconds in timings.items():
+        REQUEST_STAGE_SECONDS.observe(seconds, stage=stage)
+    MESSAGES_TOTAL.inc(outcome=outcome)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Message %s in %.1f ms: %s", outcome, timings.get("total", 0.0) * 1000,
+                     ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()))
+    trace({
+        "type": "message",
+        "trace_id": uuid.uuid4().hex,
+        "outcome": outcome,
+        "stages_ms": {stage: seconds * 1000 for stage, seconds in timings.items()},
+        **attributes,
+    })
+
+
+def record_ingest_stage(stage: str, seconds: float, documents: int = 0, chunks: int = 0) -> None:
+    """
+    Export one run of an ingest stage (a document parsed, embedded or summarized, or a batch written).
+
+    Args:
+        stage (str): "parse", "summarize", "embed", "write" or "stream"
+        seconds (float): Seconds spent
+        documents (int): Documents processed
+        chunks (int): Chunks processed
+    """
+    INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+    if documents:
+        INGEST_DOCUMENTS_TOTAL.inc(documents, stage=stage)
+    if chunks:
+        INGEST_CHUNKS_TOTAL.inc(chunks, stage=stage)
+    trace({"type": "ingest_stage", "stage": stage, "seconds": seconds, "documents": documents, "chunks": chunks})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("Metrics request: " + format, *args)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: Optional[int] = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the metrics at http://host:port/metrics from a daemon thread. Only one server runs per process.
+
+    Args:
+        host (str): Interface to listen on
+        port (int, optional): Port to listen on, None disables the endpoint
+
+    Returns:
+        Optional[ThreadingHTTPServer]: The running server, or None if it is disabled or the port is taken
+    """
+    global _server
+    if port is None:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+        return _server
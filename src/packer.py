@@ -0,0 +1,129 @@
+from typing import List, Dict, Optional, Any
+from .tokens import count_tokens, truncate_tokens
+from .config import PROMPT_TOKEN_BUDGET, HISTORY_TOKEN_BUDGET
+
+# Separator between the spans of a retrieved context
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# Fits the context and chat history of a prompt into a token budget
+class ContextPacker:
+    def __init__(self, max_tokens: int = PROMPT_TOKEN_BUDGET, history_max_tokens: int = HISTORY_TOKEN_BUDGET):
+        """
+        Initialize the packer.
+
+        Args:
+            max_tokens (int): Maximum prompt tokens: system prompt, context, chat history and question
+            history_max_tokens (int): Maximum chat history tokens, the oldest messages are dropped first
+        """
+        self.max_tokens = max_tokens
+        self.history_max_tokens = history_max_tokens
+
+    def pack(self, system_prompt: str, message: str, context: Optional[str] = None,
+             sources: Optional[List[Dict[str, Any]]] = None, history: Optional[List[Dict[str, str]]] = None,
+             context_frame: str = "", context_messages: int = 2, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Fit a prompt into the budget. The system prompt and the question are always kept;
+        the most recent history is kept up to history_max_tokens, and the context gets the
+        rest: its spans are kept by relevance, so the least relevant ones are dropped first,
+        and the most relevant span is cut if even it alone does not fit.
+
+        Args:
+            system_prompt (str): The system prompt
+            message (str): The user's question
+            context (str, optional): Retrieved context, spans joined with CONTEXT_SEPARATOR
+            sources (List[Dict[str, Any]], optional): Sources of the context, with the "span" holding
+                each hit and its "score"
+            history (List[Dict[str, str]], optional): Chat history in format [{"role": "user/assistant", "content": "message"}]
+            context_frame (str): Text wrapped around the context in the prompt
+            context_messages (int): Number of messages the context takes in the prompt
+            max_tokens (int, optional): Lower budget than max_tokens for this prompt; the history budget
+                shrinks in proportion, so fewer spans and messages are kept
+
+        Returns:
+            Dict[str, Any]: The packed "context", "sources" and "history", the "tokens" of each
+            section (system, context, history, question, overhead, total, budget), and the number of
+            "dropped_spans" and "dropped_messages"
+        """
+        budget = self.max_tokens if max_tokens is None else max(min(max_tokens, self.max_tokens), 0)
+        history_max_tokens = self.history_max_tokens * budget // self.max_tokens if self.max_tokens else 0
+        system_tokens = count_tokens(system_prompt)
+        question_tokens = count_tokens(message)
+        available = budget - system_tokens - question_tokens - 2 * MESSAGE_OVERHEAD_TOKENS
+
+        # Keep the most recent history, never starting with an answer whose question was dropped
+        history = history or []
+        kept_history, history_tokens = [], 0
+        history_budget = min(history_max_tokens, max(available, 0))
+        for msg in reversed(history):
+            tokens = count_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if history_tokens + tokens > history_budget:
+                break
+            kept_history.append(msg)
+            history_tokens += tokens
+        kept_history.reverse()
+        while kept_history and kept_history[0]["role"] == "assistant":
+            history_tokens -= count_tokens(kept_history.pop(0)["content"]) + MESSAGE_OVERHEAD_TOKENS
+        available -= history_tokens
+
+        packed_context, packed_sources, dropped_spans, context_tokens = None, [], 0, 0
+        if context:
+            spans = context.split(CONTEXT_SEPARATOR)
+            frame_tokens = count_tokens(context_frame) + context_messages * MESSAGE_OVERHEAD_TOKENS
+            kept = self._pick_spans(spans, sources or [], available - frame_tokens)
+            dropped_spans = len(spans) - len(kept)
+            if kept:
+                packed_context = CONTEXT_SEPARATOR.join(kept[position] for position in sorted(kept))
+                context_tokens = count_tokens(context_frame) + count_tokens(packed_context)
+                packed_sources = [source for source in sources or [] if source.get("span") is None or source["span"] in kept]
+
+        tokens = {
+            "system": system_tokens,
+            "context": context_tokens,
+            "history": history_tokens - len(kept_history) * MESSAGE_OVERHEAD_TOKENS,
+            "question": question_tokens,
+            "overhead": (2 + len(kept_history) + (context_messages if packed_context else 0)) * MESSAGE_OVERHEAD_TOKENS,
+        }
+        tokens["total"] = sum(tokens.values())
+        tokens["budget"] = budget
+        return {
+            "context": packed_context,
+            "sources": packed_sources,
+            "history": kept_history,
+            "tokens": tokens,
+            "dropped_spans": dropped_spans,
+            "dropped_messages": len(history) - len(kept_history),
+        }
+
+    def _pick_spans(self, spans: List[str], sources: List[Dict[str, Any]], budget: int) -> Dict[int, str]:
+        """
+        Pick the spans to keep, most relevant first, while they fit in the budget.
+        A span is as relevant as its best hit; spans without a scored hit rank last, in context order.
+
+        Returns:
+            Dict[int, str]: Position of each kept span in the context -> its text
+        """
+        if budget <= 0:
+            return {}
+        relevance = {}
+        for source in sources:
+            position, score = source.get("span"), source.get("score")
+            if position is None or score is None:
+                continue
+            relevance[position] = max(relevance.get(position, score), score)
+        order = sorted(range(len(spans)), key=lambda position: (position not in relevance, -relevance.get(position, 0.0), position))
+
+        separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+        kept, used = {}, 0
+        for position in order:
+            tokens = count_tokens(spans[position]) + (separator_tokens if kept else 0)
+            if used + tokens <= budget:
+                kept[position] = spans[position]
+                used += tokens
+        if not kept and spans:
+            # Not even the most relevant span fits: keep its beginning
+            kept[order[0]] = truncate_tokens(spans[order[0]], budget)
+        return kept
@@ -0,0 +1,241 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import List, Dict, Optional, Any, Set
+
+logger = logging.getLogger(__name__)
+
+
+def file_content_hash(path: str) -> str:
+    """
+    Compute the SHA-256 hash of a file's content.
+    
+    Args:
+        path (str): Path to the file
+        
+    Returns:
+        str: Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """
+    Compute the SHA-256 hash of a text.
+    
+    Args:
+        text (str): The text to hash
+        
+    Returns:
+        str: Hex digest of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Chunk ids are derived from the document filename and the chunk_idx,
+# which is page * CHUNKS_PER_PAGE + position of the chunk in the page
+CHUNKS_PER_PAGE = 10000
+
+
+def make_document_id(filename: str) -> str:
+    """
+    Build the deterministic id of a document, referenced by its chunks' 'document_id' metadata.
+    
+    Args:
+        filename (str): Document filename
+        
+    Returns:
+        str: The document id
+    """
+    return text_hash(filename)[:16]
+
+
+def make_chunk_id(filename: str, chunk_idx: int) -> str:
+    """
+    Build the deterministic vector store id of a chunk.
+    
+    Args:
+        filename (str): Document filename
+        chunk_idx (int): Index of the chunk in the document
+        
+    Returns:
+        str: The chunk id
+    """
+    return f"{make_document_id(filename)}:{chunk_idx}"
+
+
+# Persistent metadata-only index of the documents stored in the vector database.
+# Each document is one SQLite row, so a save only writes the entries changed since the last one.
+class DocumentRegistry:
+    def __init__(self, registry_file: str):
+        """
+        Initialize the registry, loading it from disk if it exists.
+        Each entry maps a document filename to:
+        - document_id: id referenced by the chunks of the document
+        - source: path the document was ingested from
+        - chunk_ids: ids of its chunks in the vector store
+        - chunk_count: number of chunks
+        - content_hash: SHA-256 of the file content
+        - summary: document summary
+        - pages: page number -> hash of the page text and ids of its chunks
+        
+        Args:
+            registry_file (str): Path to the SQLite file backing the registry
+        """
+        self.registry_file = registry_file
+        self._lock = Lock()
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._filenames_by_id: Dict[str, str] = {}
+        self._dirty: Set[str] = set()  # Filenames added, changed or removed since the last save
+        self._cleared = False
+        
+        os.makedirs(os.path.dirname(registry_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(registry_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS documents (filename TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self._conn.commit()
+        
+        # user_version is set by the first save, so an interrupted first run still rebuilds the registry
+        self.exists = self._conn.execute("PRAGMA user_version").fetchone()[0] > 0
+        if self.exists:
+            self._load()
+
+    def _load(self) -> None:
+        """Load the registry from disk."""
+        try:
+            rows = self._conn.execute("SELECT filename, entry FROM documents").fetchall()
+            self._documents = {filename: self._expand(filename, json.loads(entry)) for filename, entry in rows}
+        except Exception as e:
+            logger.error("Error loading document registry: %s", e)
+            self._documents = {}
+            self.exists = False
+        self._filenames_by_id = {entry["document_id"]: filename for filename, entry in self._documents.items()}
+
+    @staticmethod
+    def _expand(filename: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in the fields that are not stored: the document id and, when the pages list them, the chunk ids."""
+        entry.setdefault("document_id", make_document_id(filename))
+        pages = entry.get("pages")
+        if pages is not None:
+            entry["chunk_ids"] = [chunk_id for page in sorted(pages, key=int) for chunk_id in pages[page]["chunk_ids"]]
+        entry["chunk_count"] = len(entry.get("chunk_ids", []))
+        return entry
+
+    @staticmethod
+    def _compact(entry: Dict[str, Any]) -> str:
+        """Serialize an entry, storing each chunk id once: in its page when the entry has pages."""
+        derived = ("chunk_ids", "chunk_count") if entry.get("pages") is not None else ("chunk_count",)
+        return json.dumps({key: value for key, value in entry.items() if key not in derived})
+
+    def save(self) -> None:
+        """Write the entries added, changed or removed since the last save, in one transaction."""
+        with self._lock:
+            dirty, cleared = self._dirty, self._cleared
+            if cleared:
+                dirty = dirty | set(self._documents)
+            rows = [(filename, self._compact(self._documents[filename])) for filename in dirty if filename in self._documents]
+            removed = [(filename,) for filename in dirty if filename not in self._documents]
+            try:
+                with self._conn:
+                    if cleared:
+                        self._conn.execute("DELETE FROM documents")
+                    self._conn.executemany("DELETE FROM documents WHERE filename = ?", removed)
+                    self._conn.executemany("INSERT OR REPLACE INTO documents (filename, entry) VALUES (?, ?)", rows)
+                    self._conn.execute("PRAGMA user_version = 1")
+            except Exception as e:
+                logger.error("Error saving document registry: %s", e)
+                return
+            self._dirty, self._cleared = set(), False
+        self.exists = True
+
+    def add(self, filename: str, source: str, chunk_ids: List[str],
+            content_hash: Optional[str] = None, summary: Optional[str] = None,
+            pages: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """
+        Register a document, replacing its previous entry if there is one.
+        
+        Args:
+            filename (str): Document filename
+            source (str): Path the document was ingested from
+            chunk_ids (List[str]): Ids of the chunks in the vector store, in document order
+            content_hash (str, optional): SHA-256 of the file content
+            summary (str, optional): Document summary
+            pages (Dict[str, Dict[str, Any]], optional): page number -> {"hash": page text hash, "chunk_ids": ids}
+        """
+        entry = {
+            "document_id": make_document_id(filename),
+            "source": source,
+            "chunk_ids": list(chunk_ids),
+            "chunk_count": len(chunk_ids),
+            "content_hash": content_hash,
+            "summary": summary,
+        }
+        if pages is not None:
+            entry["pages"] = pages
+        with self._lock:
+            self._documents[filename] = entry
+            self._filenames_by_id[entry["document_id"]] = filename
+            self._dirty.add(filename)
+
+    def set_summary(self, filename: str, summary: str) -> None:
+        """Set the summary of a registered document."""
+        with self._lock:
+            if filename in self._documents:
+                self._documents[filename]["summary"] = summary
+                self._dirty.add(filename)
+
+    def remove(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Remove a document and return its entry, or None if it is not registered."""
+        with self._lock:
+            self._filenames_by_id.pop(make_document_id(filename), None)
+            self._dirty.add(filename)
+            return self._documents.pop(filename, None)
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Return the entry of a document, or None if it is not registered."""
+        with self._lock:
+            return self._documents.get(filename)
+
+    def summary_for(self, document_id: str) -> Optional[str]:
+        """Return the summary of the document with the given id, or None if it has none."""
+        with self._lock:
+            filename = self._filenames_by_id.get(document_id)
+            return self._documents[filename].get("summary") if filename else None
+
+    def filenames(self) -> List[str]:
+        """Return the filenames of all registered documents."""
+        with self._lock:
+            return list(self._documents)
+
+    def summaries(self) -> Dict[str, str]:
+        """Return filename -> summary for every document that has one."""
+        with self._lock:
+            return {name: entry["summary"] for name, entry in self._documents.items() if entry.get("summary")}
+
+    def chunk_count(self) -> int:
+        """Return the total number of chunks across all documents."""
+        with self._lock:
+            return sum(entry.get("chunk_count", 0) for entry in self._documents.values())
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._documents = {}
+            self._filenames_by_id = {}
+            self._dirty = set()
+            self._cleared = True
+
+    def __contains__(self, filename: str) -> bool:
+        with self._lock:
+            return filename in self._documents
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._documents)
@@ -0,0 +1,323 @@
+import os
+import re
+import json
+import time
+import atexit
+import asyncio
+import hashlib
+import logging
+import tempfile
+import weakref
+from threading import Lock, Timer
+from typing import Any, Dict, List, Optional, NamedTuple
+import numpy as np
+from .cache import LRUCache
+from .config import (
+    RAG_DECISION_MODEL_NAME,
+    ROUTER_SKIP_THRESHOLD,
+    ROUTER_USE_THRESHOLD,
+    ROUTER_CACHE_SIZE,
+    ROUTER_CACHE_TTL,
+    ROUTER_CACHE_FILE,
+    ROUTER_CACHE_SAVE_DELAY,
+)
+from .utils import rag_decision, arag_decision, is_summary_request
+
+logger = logging.getLogger(__name__)
+
+# One lock per cache file, so routers of different sessions never write the same file at once
+_file_locks: Dict[str, Lock] = {}
+_file_locks_lock = Lock()
+
+# Routers with a pending save, flushed when the interpreter exits
+_routers: "weakref.WeakSet[RAGRouter]" = weakref.WeakSet()
+
+
+def _file_lock(path: str) -> Lock:
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), Lock())
+
+
+@atexit.register
+def _flush_routers() -> None:
+    for router in list(_routers):
+        router.flush_cache()
+
+
+# Outcome of a routing decision
+class RoutingDecision(NamedTuple):
+    use_rag: bool
+    path: str  # "no_documents", "keyword", "embedding", "llm" or "cache"
+    similarity: Optional[float] = None  # Best cosine similarity between the query and the documents
+    confidence: Optional[int] = None  # Confidence score (0-100) given by the LLM, if it was asked
+    elapsed: float = 0.0  # Seconds spent deciding (excluding the query embedding)
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a message for cache lookups: lowercase, collapse whitespace
+    and strip surrounding punctuation.
+    
+    Args:
+        message (str): The user's message
+        
+    Returns:
+        str: The normalized message
+    """
+    return re.sub(r"\s+", " ", message.lower()).strip(" ?!.,;:")
+
+
+# Decides whether a message should use RAG, asking the LLM only when the embeddings are inconclusive
+class RAGRouter:
+    def __init__(self, vector_db, skip_threshold: float = ROUTER_SKIP_THRESHOLD,
+                 use_threshold: float = ROUTER_USE_THRESHOLD, cache_file: Optional[str] = ROUTER_CACHE_FILE):
+        """
+        Initialize the router.
+        
+        Args:
+            vector_db: The vector database instance providing the document vectors
+            skip_threshold (float): Similarity at or below which RAG is skipped locally
+            use_threshold (float): Similarity at or above which RAG is used locally
+            cache_file (str, optional): JSON file persisting the decision cache. If None, the cache is in memory only.
+        """
+        self.vector_db = vector_db
+        self.skip_threshold = skip_threshold
+        self.use_threshold = use_threshold
+        
+        # Decisions keyed by (model, summaries hash, normalized message), dropped when the corpus version changes
+        self.cache_file = os.path.abspath(cache_file) if cache_file else None  # Saves run later, maybe from another directory
+        self._cache = LRUCache(max_size=ROUTER_CACHE_SIZE, ttl=ROUTER_CACHE_TTL)
+        self._cache_lock = Lock()
+        self._summaries_hash = None
+        self._corpus_version = vector_db.version
+        self._save_timer: Optional[Timer] = None
+        self._load_cache()
+        _routers.add(self)
+
+    def _load_cache(self) -> None:
+        """Load the persisted decision cache from disk."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            self._summaries_hash = data["summaries_hash"]
+            for key, decision, expires_at in data["entries"]:
+                self._cache.put(key, RoutingDecision(*decision), expires_at=expires_at)
+        except Exception as e:
+            logger.error("Error loading routing cache: %s", e)
+
+    def _save_cache(self) -> None:
+        """Persist the decision cache to disk through a unique temporary file."""
+        with self._cache_lock:
+            self._save_timer = None
+            data = {
+                "summaries_hash": self._summaries_hash,
+                "entries": [[key, list(decision), expires_at] for key, decision, expires_at in self._cache.items()],
+            }
+        tmp_file = None
+        try:
+            with _file_lock(self.cache_file):
+                with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(self.cache_file) or ".",
+                                                 prefix=os.path.basename(self.cache_file), suffix=".tmp",
+                                                 delete=False) as f:
+                    tmp_file = f.name
+                    json.dump(data, f)
+                os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.error("Error saving routing cache: %s", e)
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _schedule_save(self) -> None:
+        """Save the cache from a timer thread, batching the decisions made until it fires."""
+        if not self.cache_file:
+            return
+        with self._cache_lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = Timer(ROUTER_CACHE_SAVE_DELAY, self._save_cache)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush_cache(self) -> None:
+        """Save the pending decisions now instead of waiting for the timer."""
+        with self._cache_lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._save_cache()
+
+    def _cache_key(self, message: str, summaries: str, model_name: Optional[str]) -> str:
+        """
+        Build the cache key of a message, clearing the cache when the summaries
+        or the document corpus (its version) changed since the last lookup.
+        """
+        summaries_hash = hashlib.sha256(summaries.encode("utf-8")).hexdigest()
+        corpus_version = self.vector_db.version
+        with self._cache_lock:
+            if summaries_hash != self._summaries_hash or corpus_version != self._corpus_version:
+                self._cache.clear()
+                self._summaries_hash = summaries_hash
+                self._corpus_version = corpus_version
+        return f"{model_name or RAG_DECISION_MODEL_NAME}|{summaries_hash}|{normalize_message(message)}"
+
+    def cached_decision(self, message: str, summaries: str, model_name: Optional[str] = None) -> Optional[RoutingDecision]:
+        """
+        Look up a previous decision for the message against the current documents.
+        
+        Args:
+            message (str): The user's message
+            summaries (str): Concatenated summaries of all documents
+            model_name (str, optional): Model used for the LLM fallback. If None, uses default from config.
+            
+        Returns:
+            Optional[RoutingDecision]: The cached decision, or None on a miss
+        """
+        if not summaries:
+            return None
+        start = time.perf_counter()
+        decision = self._cache.get(self._cache_key(message, summaries, model_name))
+        if decision is None:
+            return None
+        return decision._replace(path="cache", elapsed=time.perf_counter() - start)
+
+    def clear_cache(self) -> None:
+        """Drop every cached decision."""
+        self._cache.clear()
+        self._schedule_save()
+
+    def similarity(self, query_embedding: List[float]) -> Optional[float]:
+        """
+        Compute the best cosine similarity between the query and the documents'
+        summary embeddings and chunk centroids.
+        
+        Args:
+            query_embedding (List[float]): Embedding of the query
+            
+        Returns:
+            Optional[float]: The best similarity, or None if there are no document vectors
+        """
+        matrix = self.vector_db.get_document_vectors()
+        if matrix.size == 0:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        return float(np.max(matrix @ (query / norm)))
+
+    def route(self, message: str, summaries: str, query_embedding: Optional[List[float]] = None,
+              model_name: Optional[str] = None) -> RoutingDecision:
+        """
+        Decide whether the message should use RAG.
+        
+        Args:
+            message (str): The user's message
+            summaries (str): Concatenated summaries of all documents
+            query_embedding (List[float], optional): Embedding of the message, computed if not given
+            model_name (str, optional): Model used for the LLM fallback. If None, uses default from config.
+            
+        Returns:
+            RoutingDecision: The decision and the path that produced it
+        """
+        if not summaries:
+            return RoutingDecision(False, "no_documents")
+        
+        start = time.perf_counter()
+        if is_summary_request(message):
+            return RoutingDecision(True, "keyword", elapsed=time.perf_counter() - start)
+        
+        cached = self.cached_decision(message, summaries, model_name=model_name)
+        if cached is not None:
+            return cached
+        
+        if query_embedding is None:
+            query_embedding = self.vector_db.embed_query(message)
+            start = time.perf_counter()
+        
+        similarity = self.similarity(query_embedding)
+        decision = self._embedding_decision(similarity, start)
+        if decision is None:
+            # Grey zone: ask the LLM
+            use_rag, confidence = rag_decision(message, summaries, model_name=model_name)
+            decision = RoutingDecision(use_rag, "llm", similarity, confidence, time.perf_counter() - start)
+        
+        self._store(message, summaries, model_name, decision)
+        return decision
+
+    async def aroute(self, message: str, summaries: str, query_embedding: Optional[List[float]] = None,
+                     model_name: Optional[str] = None) -> RoutingDecision:
+        """
+        Async version of `route`.
+        
+        Args:
+            message (str): The user's message
+            summaries (str): Concatenated summaries of all documents
+            query_embedding (List[float], optional): Embedding of the message, computed if not given
+            model_name (str, optional): Model used for the LLM fallback. If None, uses default from config.
+            
+        Returns:
+            RoutingDecision: The decision and the path that produced it
+        """
+        if not summaries:
+            return RoutingDecision(False, "no_documents")
+        
+        start = time.perf_counter()
+        if is_summary_request(message):
+            return RoutingDecision(True, "keyword", elapsed=time.perf_counter() - start)
+        
+        cached = self.cached_decision(message, summaries, model_name=model_name)
+        if cached is not None:
+            return cached
+        
+        if query_embedding is None:
+            query_embedding = await self.vector_db.aembed_query(message)
+            start = time.perf_counter()
+        
+        # Computing missing document vectors embeds them, so keep it off the event loop
+        similarity = await asyncio.to_thread(self.similarity, query_embedding)
+        decision = self._embedding_decision(similarity, start)
+        if decision is None:
+            # Grey zone: ask the LLM
+            use_rag, confidence = await arag_decision(message, summaries, model_name=model_name)
+            decision = RoutingDecision(use_rag, "llm", similarity, confidence, time.perf_counter() - start)
+        
+        self._store(message, summaries, model_name, decision)
+        return decision
+
+    def _embedding_decision(self, similarity: Optional[float], start: float) -> Optional[RoutingDecision]:
+        """Return the decision if the similarity is outside the grey zone, None otherwise."""
+        if similarity is not None and similarity >= self.use_threshold:
+            return RoutingDecision(True, "embedding", similarity, elapsed=time.perf_counter() - start)
+        if similarity is not None and similarity <= self.skip_threshold:
+            return RoutingDecision(False, "embedding", similarity, elapsed=time.perf_counter() - start)
+        return None
+
+    def _store(self, message: str, summaries: str, model_name: Optional[str], decision: RoutingDecision) -> None:
+        """Cache a decision and schedule saving the cache."""
+        self._cache.put(self._cache_key(message, summaries, model_name), decision)
+        self._schedule_save()
+
+
+# One router per VectorDB, shared by every GalteaChat (e.g. every Streamlit session) on it, so they
+# share one decision cache and a save never replaces the cache file with a single session's entries
+_shared_routers: "weakref.WeakKeyDictionary[Any, RAGRouter]" = weakref.WeakKeyDictionary()
+_shared_routers_lock = Lock()
+
+
+def get_router(vector_db) -> RAGRouter:
+    """
+    Return the router shared by the users of a vector database, creating it on first use.
+    
+    Args:
+        vector_db: The vector database instance providing the document vectors
+        
+    Returns:
+        RAGRouter: The shared router
+    """
+    with _shared_routers_lock:
+        router = _shared_routers.get(vector_db)
+        if router is None:
+            router = _shared_routers[vector_db] = RAGRouter(vector_db)
+        return router
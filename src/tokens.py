@@ -0,0 +1,65 @@
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by the gpt-4o / gpt-4.1 family
+TOKEN_ENCODING_NAME = "o200k_base"
+
+# Average characters per token, used when the tokenizer is not available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> Optional[Any]:
+    """
+    Load the local tokenizer once.
+    
+    Returns:
+        Optional[Any]: The tiktoken encoding, or None if it cannot be loaded (e.g. offline without a cached BPE file)
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKEN_ENCODING_NAME)
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, estimating token counts: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the local tokenizer.
+    
+    Args:
+        text (str): The text to measure
+        
+    Returns:
+        int: Number of tokens (estimated from the length if the tokenizer is unavailable)
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text to its first tokens.
+    
+    Args:
+        text (str): The text to cut
+        max_tokens (int): Maximum number of tokens to keep
+        
+    Returns:
+        str: The text, cut to at most max_tokens tokens
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,129 @@
+import contextvars
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from .observability import metrics
+from .config import MODEL_PRICES
+
+LLM_TOKENS_TOTAL = metrics.counter(
+    "galtea_llm_tokens_total", "Tokens sent to (prompt) and generated by (completion) the chat models", ["stage", "model", "type"]
+)
+LLM_CALLS_TOTAL = metrics.counter("galtea_llm_calls_total", "Chat model calls", ["stage", "model"])
+LLM_COST_TOTAL = metrics.counter("galtea_llm_cost_usd_total", "Estimated chat model cost in US dollars", ["stage", "model"])
+
+# Usage trackers the current message or ingest reports to; copied into worker threads by `in_current_context`
+_trackers: contextvars.ContextVar[Tuple["Usage", ...]] = contextvars.ContextVar("usage_trackers", default=())
+
+
+# Prompt and completion tokens, calls and estimated cost, per stage, against an optional token budget
+class Usage:
+    def __init__(self, budget: Optional[int] = None):
+        """
+        Initialize the tracker.
+
+        Args:
+            budget (int, optional): Tokens (prompt and completion) the tracked work may use, None for no limit
+        """
+        self.budget = budget
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int, cost: float) -> None:
+        with self._lock:
+            totals = self._stages.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += cost
+
+    @property
+    def total_tokens(self) -> int:
+        """Prompt and completion tokens of every stage."""
+        with self._lock:
+            return int(sum(totals["prompt_tokens"] + totals["completion_tokens"] for totals in self._stages.values()))
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """Tokens left in the budget (negative once it is exceeded), None without a budget."""
+        return None if self.budget is None else self.budget - self.total_tokens
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Totals over every stage and per stage.
+
+        Returns:
+            Dict[str, Any]: calls, prompt_tokens, completion_tokens, total_tokens, cost_usd, budget and "stages"
+        """
+        with self._lock:
+            stages = {stage: dict(totals) for stage, totals in self._stages.items()}
+        report = {key: sum(totals[key] for totals in stages.values()) for key in ("calls", "prompt_tokens", "completion_tokens", "cost_usd")}
+        report["total_tokens"] = report["prompt_tokens"] + report["completion_tokens"]
+        report["budget"] = self.budget
+        report["stages"] = stages
+        return report
+
+
+@contextmanager
+def track_usage(*usages: Usage) -> Iterator[None]:
+    """Add the usage of every chat model call made inside the block (and its `in_current_context` workers) to usages."""
+    token = _trackers.set(_trackers.get() + usages)
+    try:
+        yield
+    finally:
+        _trackers.reset(token)
+
+
+def budget_exhausted() -> bool:
+    """Whether an active usage tracker has used up its budget."""
+    return any(usage.remaining is not None and usage.remaining <= 0 for usage in _trackers.get())
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """Wrap fn to run, from any thread, with the usage trackers active where it was wrapped."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def model_price(model: Optional[str]) -> Tuple[float, float]:
+    """USD per million prompt and completion tokens of a model: an exact MODEL_PRICES entry or its longest prefix."""
+    if not model:
+        return 0.0, 0.0
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    prefixes = [name for name in MODEL_PRICES if model.startswith(name)]
+    return MODEL_PRICES[max(prefixes, key=len)] if prefixes else (0.0, 0.0)
+
+
+def token_counts(response: Any) -> Tuple[int, int]:
+    """Prompt and completion tokens reported on a chat model response (0, 0 if it has none)."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def record_usage(stage: str, model: Optional[str], response: Any) -> Tuple[int, int]:
+    """
+    Record the tokens of a chat model response in the metrics and the active usage trackers.
+
+    Args:
+        stage (str): Stage that made the call, e.g. "answer", "rag_decision" or "summarize"
+        model (str, optional): Model called, used when the response does not name it
+        response (Any): The response message (or the last chunk of a stream that carries the usage)
+
+    Returns:
+        Tuple[int, int]: (prompt tokens, completion tokens)
+    """
+    prompt_tokens, completion_tokens = token_counts(response)
+    model = (getattr(response, "response_metadata", None) or {}).get("model_name") or model or "unknown"
+    prompt_price, completion_price = model_price(model)
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    LLM_CALLS_TOTAL.inc(stage=stage, model=model)
+    LLM_TOKENS_TOTAL.inc(prompt_tokens, stage=stage, model=model, type="prompt")
+    LLM_TOKENS_TOTAL.inc(completion_tokens, stage=stage, model=model, type="completion")
+    LLM_COST_TOTAL.inc(cost, stage=stage, model=model)
+    for usage in _trackers.get():
+        usage.add(stage, prompt_tokens, completion_tokens, cost)
+    return prompt_tokens, completion_tokens
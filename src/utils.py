@@ -1,24 +1,34 @@
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage
-from .config import OPENAI_API_KEY, RAG_DECISION_MODEL_NAME, SUMMARY_MODEL_NAME
-from typing import Optional
+from langchain.schema import BaseMessage, SystemMessage, HumanMessage
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from .cache import LRUCache
+from .clients import get_chat_model
+from .registry import text_hash
+from .tokens import count_tokens, truncate_tokens
+from .usage import record_usage, budget_exhausted, in_current_context
+from .config import (
+    RAG_DECISION_MODEL_NAME,
+    SUMMARY_MODEL_NAME,
+    MEMORY_SUMMARY_MODEL_NAME,
+    MEMORY_SUMMARY_TOKENS,
+    SUMMARY_SECTION_TOKENS,
+    SUMMARY_MAX_WORKERS,
+    SUMMARY_CACHE_PATH,
+    SUMMARY_CACHE_SIZE,
+    DEGRADED_SUMMARY_TOKENS,
+)
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Dict, Optional, Tuple
+import os
+import re
+import json
+import asyncio
+import logging
 
-def summarize_document(text: str) -> str:
-    """
-    Summarizes the given text using OpenAI's API.
-    
-    Args:
-        text (str): The text to summarize
-        
-    Returns:
-        str: The summary
-    """
-    # Initialize OpenAI chat model
-    chat_model = ChatOpenAI(
-        model_name=SUMMARY_MODEL_NAME,
-        api_key=OPENAI_API_KEY
-    )
-    
+logger = logging.getLogger(__name__)
+
+def _summary_messages(text: str) -> List[BaseMessage]:
+    """Build the messages asking the model to summarize a document."""
     # System prompt for summarization
     system_prompt = (
         "You are an AI assistant that summarizes documents."
@@ -31,12 +41,260 @@ def summarize_document(text: str) -> str:
     # Prepare messages
     messages = [SystemMessage(content=system_prompt)]
     messages.append(SystemMessage(content=text))
+    return messages
+
+def _section_summary_messages(section: str) -> List[BaseMessage]:
+    """Build the messages asking the model to summarize one section of a large document."""
+    system_prompt = (
+        "You are an AI assistant that summarizes documents. "
+        "You will be given one section of a larger document and you need to summarize it in a few sentences. "
+        "Keep the key topics, names, figures and procedures it covers, so the summaries of all sections "
+        "can later be combined into a summary of the whole document. "
+        "Whatever the language the section is in, summarize it in English."
+    )
+    return [SystemMessage(content=system_prompt), SystemMessage(content=section)]
+
+# Section summaries keyed by hash(model, section text), loaded lazily from SUMMARY_CACHE_PATH
+_section_cache: Optional[LRUCache] = None
+_section_cache_lock = Lock()
+
+def _get_section_cache() -> LRUCache:
+    """Return the section summary cache, loading it from disk on first use."""
+    global _section_cache
+    with _section_cache_lock:
+        if _section_cache is None:
+            _section_cache = LRUCache(max_size=SUMMARY_CACHE_SIZE)
+            if SUMMARY_CACHE_PATH and os.path.exists(SUMMARY_CACHE_PATH):
+                try:
+                    with open(SUMMARY_CACHE_PATH, 'r') as f:
+                        for key, summary in json.load(f).items():
+                            _section_cache.put(key, summary)
+                except Exception as e:
+                    logger.error("Error loading section summaries: %s", e)
+        return _section_cache
+
+def _save_section_cache() -> None:
+    """Persist the section summary cache to disk."""
+    if not SUMMARY_CACHE_PATH:
+        return
+    try:
+        with _section_cache_lock:
+            os.makedirs(os.path.dirname(SUMMARY_CACHE_PATH) or ".", exist_ok=True)
+            tmp_file = f"{SUMMARY_CACHE_PATH}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({key: summary for key, summary, _ in _section_cache.items()}, f)
+            os.replace(tmp_file, SUMMARY_CACHE_PATH)
+    except Exception as e:
+        logger.error("Error saving section summaries: %s", e)
+
+def _split_sections(text: str) -> List[str]:
+    """Split a document into sections of at most SUMMARY_SECTION_TOKENS tokens."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=SUMMARY_SECTION_TOKENS,
+        chunk_overlap=0,
+        length_function=count_tokens
+    )
+    return splitter.split_text(text)
+
+def _summarize_section(section: str) -> str:
+    """Summarize one section of a document, reusing the cached summary if the section is unchanged."""
+    cache = _get_section_cache()
+    key = text_hash(f"{SUMMARY_MODEL_NAME}\0{section}")
+    summary = cache.get(key)
+    if summary is None:
+        if budget_exhausted():
+            return truncate_tokens(section, DEGRADED_SUMMARY_TOKENS)
+        response = get_chat_model(SUMMARY_MODEL_NAME).invoke(_section_summary_messages(section))
+        record_usage("summarize", SUMMARY_MODEL_NAME, response)
+        summary = response.content
+        cache.put(key, summary)
+    return summary
+
+async def _asummarize_section(section: str, semaphore: asyncio.Semaphore) -> str:
+    """Async version of `_summarize_section`, bounded by the semaphore."""
+    cache = _get_section_cache()
+    key = text_hash(f"{SUMMARY_MODEL_NAME}\0{section}")
+    summary = cache.get(key)
+    if summary is None:
+        if budget_exhausted():
+            return truncate_tokens(section, DEGRADED_SUMMARY_TOKENS)
+        async with semaphore:
+            response = await get_chat_model(SUMMARY_MODEL_NAME).ainvoke(_section_summary_messages(section))
+        record_usage("summarize", SUMMARY_MODEL_NAME, response)
+        summary = response.content
+        cache.put(key, summary)
+    return summary
+
+def summarize_document(text: str) -> str:
+    """
+    Summarizes the given text using OpenAI's API.
+    Text longer than SUMMARY_SECTION_TOKENS is summarized map-reduce style: its sections
+    are summarized concurrently (reusing cached section summaries) and the section
+    summaries are then summarized together. Once the token budget of the current ingest
+    is used up, the beginning of the text is returned instead.
+    
+    Args:
+        text (str): The text to summarize
+        
+    Returns:
+        str: The summary
+    """
+    if budget_exhausted():
+        logger.warning("Token budget used up, summarizing by the beginning of the text")
+        return truncate_tokens(text, DEGRADED_SUMMARY_TOKENS)
+    sections = _split_sections(text)
+    if len(sections) > 1:
+        # Map: summarize the sections with a bounded worker pool
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_MAX_WORKERS, len(sections))) as pool:
+            section_summaries = list(pool.map(in_current_context(_summarize_section), sections))
+        _save_section_cache()
+        
+        # Reduce: summarize the section summaries (recursively if they are still too long)
+        return summarize_document("\n\n".join(section_summaries))
+    
+    # Get the shared OpenAI chat model
+    chat_model = get_chat_model(SUMMARY_MODEL_NAME)
     
     # Get response from OpenAI
-    response = chat_model.invoke(messages)
+    response = chat_model.invoke(_summary_messages(text))
+    record_usage("summarize", SUMMARY_MODEL_NAME, response)
+    
+    return response.content
+
+async def asummarize_document(text: str) -> str:
+    """
+    Async version of `summarize_document`.
+    
+    Args:
+        text (str): The text to summarize
+        
+    Returns:
+        str: The summary
+    """
+    if budget_exhausted():
+        logger.warning("Token budget used up, summarizing by the beginning of the text")
+        return truncate_tokens(text, DEGRADED_SUMMARY_TOKENS)
+    sections = await asyncio.to_thread(_split_sections, text)
+    if len(sections) > 1:
+        semaphore = asyncio.Semaphore(SUMMARY_MAX_WORKERS)
+        section_summaries = await asyncio.gather(*[_asummarize_section(section, semaphore) for section in sections])
+        await asyncio.to_thread(_save_section_cache)
+        return await asummarize_document("\n\n".join(section_summaries))
     
+    chat_model = get_chat_model(SUMMARY_MODEL_NAME)
+    response = await chat_model.ainvoke(_summary_messages(text))
+    record_usage("summarize", SUMMARY_MODEL_NAME, response)
     return response.content
 
+# Map-reduce summary of a document fed page by page: only the unfinished section
+# and the section summaries are held in memory, never the whole text
+class StreamingSummarizer:
+    def __init__(self, max_workers: int = SUMMARY_MAX_WORKERS):
+        """
+        Initialize the summarizer.
+        
+        Args:
+            max_workers (int): Sections summarized concurrently
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+        self._max_pending = 2 * max_workers
+        self._buffer: List[str] = []
+        self._buffer_tokens = 0
+        self._futures = []
+
+    def add(self, text: str) -> None:
+        """
+        Feed the next part of the document. Full sections are summarized in the background.
+        
+        Args:
+            text (str): The next page or part of the document
+        """
+        self._buffer.append(text)
+        self._buffer_tokens += count_tokens(text)
+        if self._buffer_tokens < SUMMARY_SECTION_TOKENS:
+            return
+        
+        # Submit the full sections and keep the remainder buffered
+        sections = _split_sections(" ".join(self._buffer))
+        for section in sections[:-1]:
+            # Bound the section texts waiting for a worker
+            if len(self._futures) >= self._max_pending:
+                self._futures[-self._max_pending].result()
+            self._futures.append(self._pool.submit(in_current_context(_summarize_section), section))
+        self._buffer = [sections[-1]] if sections else []
+        self._buffer_tokens = count_tokens(sections[-1]) if sections else 0
+
+    def summary(self) -> str:
+        """
+        Summarize the document fed so far.
+        
+        Returns:
+            str: The summary, empty if the document has no text
+        """
+        try:
+            rest = " ".join(self._buffer)
+            if not self._futures:
+                return summarize_document(rest) if rest.strip() else ""
+            
+            section_summaries = [future.result() for future in self._futures]
+            if rest.strip():
+                section_summaries.append(_summarize_section(rest))
+            _save_section_cache()
+            return summarize_document("\n\n".join(section_summaries))
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the summary workers."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def _conversation_summary_messages(summary: str, turns: List[Dict[str, str]]) -> List[BaseMessage]:
+    """Build the messages asking the model to fold conversation turns into the running summary."""
+    system_prompt = (
+        "You are an AI assistant that keeps a running summary of a conversation between a user and an assistant. "
+        "You will be given the current summary (possibly empty) and the next messages of the conversation. "
+        "Update the summary so it also covers these messages: keep the topics, questions, facts, figures and "
+        "decisions the rest of the conversation may refer to, and drop greetings and repetitions. "
+        f"Be concise, the summary must stay under {MEMORY_SUMMARY_TOKENS} tokens. "
+        "Write the summary in English."
+    )
+    transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in turns)
+    return [
+        SystemMessage(content=system_prompt),
+        SystemMessage(content=f"Current summary:\n{summary or '(empty)'}"),
+        SystemMessage(content=f"Messages:\n{transcript}"),
+    ]
+
+def summarize_conversation(summary: str, turns: List[Dict[str, str]]) -> str:
+    """
+    Fold conversation turns into the running summary of a conversation.
+    
+    Args:
+        summary (str): The current summary, empty at first
+        turns (List[Dict[str, str]]): The messages to add, in format [{"role": "user/assistant", "content": "message"}]
+        
+    Returns:
+        str: The updated summary, at most MEMORY_SUMMARY_TOKENS tokens
+    """
+    chat_model = get_chat_model(MEMORY_SUMMARY_MODEL_NAME)
+    response = chat_model.invoke(_conversation_summary_messages(summary, turns))
+    record_usage("memory_summary", MEMORY_SUMMARY_MODEL_NAME, response)
+    return truncate_tokens(response.content, MEMORY_SUMMARY_TOKENS)
+
+SUMMARY_REQUEST_PHRASES = ["summary", "summarize", "summarise", "overview"]
+
+def is_summary_request(message: str) -> bool:
+    """
+    Check if the message asks for a summary or overview of the documents.
+    
+    Args:
+        message (str): The user's message
+        
+    Returns:
+        bool: True if the message is a summary request
+    """
+    return any(phrase in message.lower() for phrase in SUMMARY_REQUEST_PHRASES)
+
 def should_use_rag(message: str, summaries: str, model_name: Optional[str] = None) -> bool:
     """
     Determine if a message should be processed using RAG by comparing it against document summaries.
@@ -49,78 +307,138 @@ def should_use_rag(message: str, summaries: str, model_name: Optional[str] = Non
     Returns:
         bool: True if the message should use RAG, False otherwise
     """
+    return rag_decision(message, summaries, model_name=model_name)[0]
+
+async def ashould_use_rag(message: str, summaries: str, model_name: Optional[str] = None) -> bool:
+    """
+    Async version of `should_use_rag`.
+    
+    Args:
+        message (str): The user's message
+        summaries (str): Concatenated summaries of all documents
+        model_name (str, optional): Name of the model to use. If None, uses default from config.
+        
+    Returns:
+        bool: True if the message should use RAG, False otherwise
+    """
+    return (await arag_decision(message, summaries, model_name=model_name))[0]
+
+def _rag_decision_precheck(message: str, summaries: str, model_name: Optional[str]) -> Optional[Tuple[bool, Optional[int]]]:
+    """Return the decision if it can be made without asking the model, None otherwise."""
+    logger.debug("RAG decision check with %s for %r (%d characters of summaries)",
+                 model_name or RAG_DECISION_MODEL_NAME, message, len(summaries))
+    
+    if not summaries:
+        logger.debug("No documents available, skipping RAG")
+        return False, None  # No documents available, can't do RAG
+    
+    # Quick check for summary requests, no need to ask the model
+    if is_summary_request(message):
+        return True, None
+    return None
+
+def _rag_decision_messages(message: str, summaries: str) -> List[BaseMessage]:
+    """Build the messages asking the model whether the message is RAG-worthy."""
+    # System prompt for RAG decision
+    system_prompt = (
+        "You are an AI assistant that determines if a user's question is related to the content of provided documents. "
+        "You will be given a user's question and summaries of available documents. "
+        "Your task is to determine if the question is likely to be answered using the document content. "
+        "Consider the following:\n"
+        "1. Is the question about topics covered in the documents?\n"
+        "2. Would the documents contain information needed to answer the question?\n"
+        "3. Is the question general knowledge or specific to the document content?\n"
+        "Respond with a confidence score (0-100) indicating how likely it is that the question "
+        "can be answered using the document content. "
+        "If the score is above 70, the question is RAG-worthy.\n\n"
+        "Example responses:\n"
+        "85 - The question is clearly about topics covered in the documents\n"
+        "45 - The question might be partially related but likely needs general knowledge\n"
+        "20 - The question appears to be about general knowledge or unrelated topics"
+    )
+    
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=f"User question: {message}\n\nDocument summaries:\n{summaries}")
+    ]
+
+def _parse_rag_decision(response_content: str) -> Tuple[bool, Optional[int]]:
+    """Extract the decision and confidence score from the model's response."""
+    content = response_content.lower()
+    logger.debug("RAG decision model response: %r", response_content)
+    
+    # Try to extract confidence score
+    try:
+        # Look for a number between 0-100 in the response
+        score_match = re.search(r'\b([0-9]{1,2}|100)\b', content)
+        if score_match:
+            confidence = int(score_match.group(1))
+            logger.debug("RAG decision confidence %d: %s", confidence, "use RAG" if confidence > 70 else "skip RAG")
+            return confidence > 70, confidence
+    except (ValueError, AttributeError) as e:
+        logger.warning("Error extracting confidence score, falling back to phrase matching: %s", e)
+    
+    # Fallback to phrase matching if confidence score parsing fails
+    pos_decision_phrases = ["true", "yes", "correct", "rag worthy", "high confidence"]
+    neg_decision_phrases = ["false", "no", "incorrect", "not rag worthy", "low confidence"]
+    
+    decision = any(phrase in content for phrase in pos_decision_phrases)
+    logger.debug("RAG decision by phrase matching: %s", "use RAG" if decision else "skip RAG")
+    
+    return decision, None
+
+def rag_decision(message: str, summaries: str, model_name: Optional[str] = None) -> Tuple[bool, Optional[int]]:
+    """
+    Ask the LLM whether a message should be processed using RAG, returning the
+    decision together with the confidence score (0-100) given by the model.
+    
+    Args:
+        message (str): The user's message
+        summaries (str): Concatenated summaries of all documents
+        model_name (str, optional): Name of the model to use. If None, uses default from config.
+        
+    Returns:
+        Tuple[bool, Optional[int]]: (use RAG, confidence score or None if it could not be extracted)
+    """
     try:
-        print("\n=== RAG Decision Check Debug ===")
-        print(f"Using model: {model_name or RAG_DECISION_MODEL_NAME}")
-        print(f"\nUser message: {message}")
-        print(f"\nAvailable document summaries:\n{summaries}")
-        
-        if not summaries:
-            print("No documents available, skipping RAG")
-            return False  # No documents available, can't do RAG
+        decision = _rag_decision_precheck(message, summaries, model_name)
+        if decision is not None:
+            return decision
             
-        # Initialize OpenAI chat model with optional custom model
-        chat_model = ChatOpenAI(
-            model_name=model_name or RAG_DECISION_MODEL_NAME,
-            api_key=OPENAI_API_KEY
-        )
-        
-        # System prompt for RAG decision
-        system_prompt = (
-            "You are an AI assistant that determines if a user's question is related to the content of provided documents. "
-            "You will be given a user's question and summaries of available documents. "
-            "Your task is to determine if the question is likely to be answered using the document content. "
-            "Consider the following:\n"
-            "1. Is the question about topics covered in the documents?\n"
-            "2. Would the documents contain information needed to answer the question?\n"
-            "3. Is the question general knowledge or specific to the document content?\n"
-            "Respond with a confidence score (0-100) indicating how likely it is that the question "
-            "can be answered using the document content. "
-            "If the score is above 70, the question is RAG-worthy.\n\n"
-            "Example responses:\n"
-            "85 - The question is clearly about topics covered in the documents\n"
-            "45 - The question might be partially related but likely needs general knowledge\n"
-            "20 - The question appears to be about general knowledge or unrelated topics"
-        )
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"User question: {message}\n\nDocument summaries:\n{summaries}")
-        ]
-        
-        response = chat_model.invoke(messages)
-        content = response.content.lower()
-        print(f"\nModel response: {response.content}")
-        
-        # Quick check for summary requests
-        if any(phrase in message.lower() for phrase in ["summary", "summarize", "summarise", "overview"]):
-            return True
-        
-        # Try to extract confidence score
-        try:
-            # Look for a number between 0-100 in the response
-            import re
-            score_match = re.search(r'\b([0-9]{1,2}|100)\b', content)
-            if score_match:
-                confidence = int(score_match.group(1))
-                print(f"Extracted confidence score: {confidence}")
-                print(f"Decision: {'Use RAG' if confidence > 70 else 'Skip RAG'}")
-                return confidence > 70
-        except (ValueError, AttributeError) as e:
-            print(f"Error extracting confidence score: {str(e)}")
-            print("Falling back to phrase matching")
-        
-        # Fallback to phrase matching if confidence score parsing fails
-        pos_decision_phrases = ["true", "yes", "correct", "rag worthy", "high confidence"]
-        neg_decision_phrases = ["false", "no", "incorrect", "not rag worthy", "low confidence"]
-        
-        decision = any(phrase in content for phrase in pos_decision_phrases)
-        print(f"Phrase matching decision: {'Use RAG' if decision else 'Skip RAG'}")
-        print("=== End RAG Decision Check ===\n")
-        
-        return decision
+        # Get the shared OpenAI chat model, with optional custom model
+        chat_model = get_chat_model(model_name or RAG_DECISION_MODEL_NAME)
+        
+        response = chat_model.invoke(_rag_decision_messages(message, summaries))
+        record_usage("rag_decision", model_name or RAG_DECISION_MODEL_NAME, response)
+        return _parse_rag_decision(response.content)
+        
+    except Exception as e:
+        logger.error("Error in RAG decision check, defaulting to use RAG: %s", e)
+        return True, None
+
+async def arag_decision(message: str, summaries: str, model_name: Optional[str] = None) -> Tuple[bool, Optional[int]]:
+    """
+    Async version of `rag_decision`.
+    
+    Args:
+        message (str): The user's message
+        summaries (str): Concatenated summaries of all documents
+        model_name (str, optional): Name of the model to use. If None, uses default from config.
+        
+    Returns:
+        Tuple[bool, Optional[int]]: (use RAG, confidence score or None if it could not be extracted)
+    """
+    try:
+        decision = _rag_decision_precheck(message, summaries, model_name)
+        if decision is not None:
+            return decision
+        
+        chat_model = get_chat_model(model_name or RAG_DECISION_MODEL_NAME)
+        
+        response = await chat_model.ainvoke(_rag_decision_messages(message, summaries))
+        record_usage("rag_decision", model_name or RAG_DECISION_MODEL_NAME, response)
+        return _parse_rag_decision(response.content)
         
     except Exception as e:
-        print(f"Error in RAG decision check: {str(e)}")
-        print("Defaulting to use RAG due to error")
-        return True 
\ No newline at end of file
+        logger.error("Error in RAG decision check, defaulting to use RAG: %s", e)
+        return True, None
@@ -51,18 +51,19 @@ def render_chat_tab():
     # Place chat input below messages for follow-ups
     prompt = st.chat_input("Type your question here...")
     if prompt:
-        # Append user message
+        # Append and show the user message
         st.session_state.messages.append({"role": "user", "content": prompt})
+        display_message(st.session_state.messages[-1])
 
-        # Process message using GalteaChat
-        with st.spinner("Processing..."):
+        # Process message using GalteaChat, streaming the answer as it is generated
+        with st.chat_message("assistant", avatar="🤖"):
             try:
-                response, sources = st.session_state.chat.process_message(
-                    prompt,
-                    history=st.session_state.messages[:-1]  # Exclude the current message
-                )
+                with st.spinner("Processing..."):
+                    # The chat's memory holds the conversation: recent turns verbatim, older ones summarized
+                    tokens, sources = st.session_state.chat.stream_message(prompt)
+                response = st.write_stream(tokens)
 
-                # Append assistant response
+                # Append assistant response once it is complete
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": response,